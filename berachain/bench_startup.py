@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 冷启动基准测试
+# 在本地启动一个假的 JSON-RPC 节点，运行 bera_auto.py（--step 5），
+# 测量从启动进程到节点收到第一个 RPC 请求的时间（导入模块、解析参数、加载账户、建立连接），
+# 多次运行取中位数，超过预算时退出码为 1，可放在 CI 或发布前检查中防止启动时间退化
+
+STARTUP_BUDGET = 2.0  # 秒
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bera_auto.py")
+
+
+class _FirstRequestServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.first_request = threading.Event()
+        self.first_request_at = None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if not self.server.first_request.is_set():
+            self.server.first_request_at = time.perf_counter()
+            self.server.first_request.set()
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        response = json.dumps({"jsonrpc": "2.0", "id": body.get("id"), "result": "bench"}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure_once(config_path, timeout):
+    """运行一次 bera_auto.py，返回到第一个 RPC 请求的秒数，超时返回 None"""
+    server = _FirstRequestServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, SCRIPT, config_path, '--step', '5', '--rpc-url', url, '--no-tx-journal'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not server.first_request.wait(timeout):
+            return None
+        return server.first_request_at - started
+    finally:
+        process.kill()
+        process.wait()
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='bera_auto.py 冷启动基准测试（到第一个 RPC 请求的时间）')
+    parser.add_argument('--runs', type=int, default=5, help='运行次数，默认 5')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET,
+                        help=f'中位数预算（秒），超过时退出码为 1，默认 {STARTUP_BUDGET}')
+    parser.add_argument('--timeout', type=float, default=30, help='单次运行的超时时间（秒）')
+    args = parser.parse_args()
+
+    # 一个格式合法的占位账户，进程在发出第一个请求后即被终止，不会发送交易
+    with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+        f.write(json.dumps({"name": "bench", "address": "0x" + "11" * 20, "private_key": "22" * 32}) + "\n")
+        config_path = f.name
+
+    try:
+        results = []
+        for run in range(args.runs):
+            elapsed = measure_once(config_path, args.timeout)
+            if elapsed is None:
+                print(f"第 {run + 1} 次运行: {args.timeout} 秒内没有收到 RPC 请求")
+                sys.exit(1)
+            results.append(elapsed)
+            print(f"第 {run + 1} 次运行: {elapsed:.3f} 秒")
+    finally:
+        os.remove(config_path)
+
+    median = statistics.median(results)
+    print(f"到第一个 RPC 请求: 中位数 {median:.3f} 秒，最小 {min(results):.3f} 秒，最大 {max(results):.3f} 秒，"
+          f"预算 {args.budget:.3f} 秒")
+    if median > args.budget:
+        print("冷启动时间超出预算！")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,110 +1,306 @@
-from web3 import Web3
-import yaml
-import time
-import random
+import logging
 import os
 import argparse
+import threading
+import time
+from collections.abc import Mapping
 
-# 导入所有子脚本中的函数
-from bera_swap import setup_web3, swap_bera_to_stgusdc
-from bera_mint_honey import mint_honey
-from bera_bend_supply import supply_honey
-from bera_berps_deposit import deposit_honey
-from bera_berps_stake import stake_bhoney
+import repo_path  # noqa: F401  仓库根目录加入模块搜索路径（共享包 common）
+from bera_rpc import RPC_URL, setup_web3
+from common.shard import add_shard_arguments, filter_shard, open_lease_store, lease_key, default_lease_scope
+from common.account_source import add_source_arguments, iter_accounts
+from common.pacing import add_pacing_arguments, run_concurrently
+from common.step_dag import StepNode, run_dag
+from bera_ledger import BalanceLedger
+from bera_quote import add_quote_arguments, configure_quote_history
+from common.task_runtime import TaskContext, chain_tasks
+from bera_tasks import CHAIN
+from common.rate_limit import add_rate_limit_arguments, print_limiter_stats, start_stats_reporter
+from common.ws_heads import add_ws_arguments, start_head_watcher
+from common.tx_journal import add_journal_arguments, open_journal, reconcile
+from common.daemon import RunDaemon, add_daemon_arguments
+from common.rpc_cassette import add_cassette_arguments, configure_cassette
+from common.broadcast import add_broadcast_arguments, configure_broadcast
+from common.quarantine import add_quarantine_arguments, open_quarantine
+from common.structured_log import ACCOUNT_DONE, add_logging_arguments, log_context, setup_logging
 
-def load_account(config_path):
-    """从配置文件加载账户信息"""
+log = logging.getLogger('bera_auto')
+
+def load_accounts(args):
+    """
+    从账户文件逐条加载账户（生成器）
+    支持 YAML（顶层 accounts 列表或单账户的 berachain 配置）、JSONL、CSV、编译后的 .acct 缓存以及 keystore 目录
+    """
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-            if 'berachain' not in config:
-                raise ValueError("配置文件中缺少 berachain 配置")
-            return {
-                "private_key": config['berachain']['private_key'],
-                "address": config['berachain']['address']
-            }
+        return iter_accounts(args.config, args.account_cache,
+                             args.keystore_password_file, args.keystore_agent)
     except Exception as e:
-        print(f"加载配置文件失败: {str(e)}")
+        log.error(f"加载配置文件失败: {str(e)}")
         return None
 
-def random_delay(min_sec, max_sec):
-    """随机延时"""
-    delay = random.uniform(min_sec, max_sec)
-    print(f"\n等待 {delay:.2f} 秒...")
-    time.sleep(delay)
+class CycleStats:
+    """
+    多轮模式的统计：每轮的开始 / 结束时间、成功的步骤数和主交易 gas 费
+    steps_per_cycle: 每轮实际执行的编号步骤数，成功步骤数达到该值的轮次记为完成
+    """
+
+    def __init__(self, cycles, steps_per_cycle):
+        self.steps_per_cycle = steps_per_cycle
+        self.cycles = {cycle: {"started": None, "finished": None, "steps": 0, "fee": 0, "failed": False}
+                       for cycle in range(1, cycles + 1)}
+        self._lock = threading.Lock()
+
+    def start(self, cycle):
+        with self._lock:
+            if self.cycles[cycle]["started"] is None:
+                self.cycles[cycle]["started"] = time.monotonic()
+
+    def finish(self, cycle, result):
+        with self._lock:
+            stats = self.cycles[cycle]
+            stats["finished"] = time.monotonic()
+            if not result:
+                stats["failed"] = True
+                return
+            stats["steps"] += 1
+            if isinstance(result, Mapping):
+                stats["fee"] += result['gasUsed'] * result.get('effectiveGasPrice', 0)
+
+    def report(self, w3):
+        """输出每轮和汇总统计"""
+        log.info("=== 多轮执行统计 ===")
+        completed = 0
+        total_fee = 0
+        started = [stats["started"] for stats in self.cycles.values() if stats["started"] is not None]
+        finished = [stats["finished"] for stats in self.cycles.values() if stats["finished"] is not None]
+        for cycle, stats in self.cycles.items():
+            total_fee += stats["fee"]
+            if stats["started"] is None:
+                log.info(f"第 {cycle} 轮: 未开始")
+                continue
+            done = not stats["failed"] and stats["steps"] == self.steps_per_cycle
+            completed += done
+            elapsed = (stats["finished"] or stats["started"]) - stats["started"]
+            log.info(f"第 {cycle} 轮: {'完成' if done else '未完成'}，步骤 {stats['steps']}/{self.steps_per_cycle}，"
+                  f"用时 {elapsed:.1f} 秒，gas 费 {w3.from_wei(stats['fee'], 'ether')} BERA")
+        if started and finished:
+            wall = max(finished) - min(started)
+            log.info(f"汇总: 完成 {completed}/{len(self.cycles)} 轮，总用时 {wall:.1f} 秒，"
+                  f"平均每轮 {wall / max(completed, 1):.1f} 秒，gas 费合计 {w3.from_wei(total_fee, 'ether')} BERA")
+
+def build_steps(w3, account, ledger, cycle=None, stats=None):
+    """
+    声明式步骤依赖图
+    Bend（步骤3）和 BERPS（步骤4）都只依赖步骤2产出的 HONEY，预先拆分数量后并发执行；
+    步骤5只依赖步骤4产出的 bHONEY；所有步骤共享同一个余额账本
+    cycle: 多轮模式下的轮次（从 1 开始），None 表示单轮。多轮模式下：
+        - 每个步骤还依赖上一轮的同一步骤，同一步骤跨轮次按顺序执行，本轮 Swap 确认后下一轮 Swap 即可开始
+        - 每一步使用的数量取自本轮上一步回执中实际收到的代币，不会用掉其他轮次的余额
+    stats: 多轮统计（可选）
+    """
+    ctx = TaskContext(CHAIN, w3, account, state={'ledger': ledger, 'amounts': {}}, cycle=cycle)
+
+    def tag(name):
+        return name if cycle is None else f"{name}#{cycle}"
+
+    def node(task):
+        number, title = task.number, task.title
+        inputs = [tag(name) for name in task.inputs]
+        outputs = [tag(name) for name in task.outputs]
+        if cycle is not None:
+            title = f"[第 {cycle} 轮] {title}"
+            if number is not None:
+                outputs.append(f"step{number}#{cycle}")
+                if cycle > 1:
+                    inputs.append(f"step{number}#{cycle - 1}")
 
-def execute_all_steps(w3, account, start_step=1):
+        def run(pacer):
+            if stats:
+                stats.start(cycle)
+            with log_context(cycle=cycle):
+                result = task.func(ctx, pacer)
+            ctx.receipts[task.name] = result
+            if stats and number is not None:
+                stats.finish(cycle, result)
+            return result
+
+        return StepNode(number, title, run, inputs, outputs)
+
+    # 步骤定义见 bera_tasks（与跨链调度器共用）
+    return [node(task) for task in chain_tasks(CHAIN)]
+
+def execute_all_steps(w3, account, start_step=1, confirmations=1, jitter=None, cycles=1):
     """
     执行所有步骤
     start_step: 从第几步开始执行（1-5）
+    confirmations / jitter: 每个步骤发送交易前等待前置步骤交易的确认数，以及独立的随机抖动分布
+    cycles: 重复执行的轮数，相邻轮次流水线式重叠执行
+    互不依赖的步骤并发执行，nonce 由本地统一分配
     """
     try:
-        print("\n=== 开始执行 Berachain 自动操作 ===")
-        print(f"从第 {start_step} 步开始执行")
+        log.info("=== 开始执行 Berachain 自动操作 ===")
+        log.info(f"从第 {start_step} 步开始执行" + (f"，共 {cycles} 轮" if cycles > 1 else ""))
         
-        steps = [
-            ("Swap BERA 到 stgUSDC", lambda: swap_bera_to_stgusdc(w3, account)),
-            ("将 stgUSDC 换成 HONEY", lambda: mint_honey(w3, account)),
-            ("向 Bend 协议质押 HONEY", lambda: supply_honey(w3, account)),
-            ("向 BERPS 协议质押 HONEY", lambda: deposit_honey(w3, account)),
-            ("质押 bHONEY", lambda: stake_bhoney(w3, account))
-        ]
+        # 流水线开始时一次批量读取全部余额和授权额度，之后由回执日志增量更新
+        ledger = BalanceLedger(w3, account['address']).snapshot()
         
-        # 从指定步骤开始执行
-        for i, (step_name, step_func) in enumerate(steps[start_step-1:], start=start_step):
-            print(f"\n--- 步骤{i}: {step_name} ---")
-            if not step_func():
-                print(f"步骤{i} 失败，终止执行")
-                return False
-                
-            # 最后一步不需要延时
-            if i < len(steps):
-                if i == 4:  # 最后一步之前
-                    random_delay(1, 5)
-                else:
-                    random_delay(5, 10)
+        if cycles > 1:
+            # 每轮的步骤数按实际构建的依赖图计算，编号小于 start_step 的步骤会被 run_dag 跳过
+            steps_per_cycle = sum(1 for task in chain_tasks(CHAIN) if task.number is not None and task.number >= start_step)
+            stats = CycleStats(cycles, steps_per_cycle)
+            nodes = []
+            for cycle in range(1, cycles + 1):
+                nodes.extend(build_steps(w3, account, ledger, cycle, stats))
+            success = run_dag(w3, nodes, start_step, confirmations, jitter)
+            stats.report(w3)
+        else:
+            success = run_dag(w3, build_steps(w3, account, ledger), start_step, confirmations, jitter)
+        if not success:
+            return False
         
-        print("\n=== 所有操作执行完成 ===")
+        log.info("=== 所有操作执行完成 ===")
         return True
         
     except Exception as e:
-        print(f"\n执行过程中发生错误: {str(e)}")
+        log.error(f"执行过程中发生错误: {str(e)}")
         return False
 
 def parse_args():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='Berachain 自动操作脚本')
-    parser.add_argument('config', help='配置文件路径')
+    parser.add_argument('config', help='配置文件路径（.yaml / .jsonl / .csv / .acct）或 keystore 目录')
     parser.add_argument('--step', type=int, choices=range(1, 6), default=1,
                       help='从第几步开始执行 (1-5): 1=Swap, 2=Mint, 3=Bend, 4=BERPS, 5=Stake')
+    parser.add_argument('--cycles', type=int, default=1,
+                      help='每个账户重复执行整条流水线的轮数，相邻轮次重叠执行（需从第 1 步开始），默认 1')
+    add_shard_arguments(parser)
+    add_source_arguments(parser)
+    add_pacing_arguments(parser, default_jitter='uniform:5:10')
+    add_rate_limit_arguments(parser)
+    add_ws_arguments(parser)
+    add_journal_arguments(parser, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tx_journal.jsonl'))
+    add_daemon_arguments(parser)
+    add_cassette_arguments(parser)
+    add_broadcast_arguments(parser)
+    add_quarantine_arguments(parser, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quarantine.json'))
+    add_quote_arguments(parser)
+    add_logging_arguments(parser, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'bera_auto.jsonl'))
+    parser.add_argument('--rpc-url', default=RPC_URL, help=f'HTTP RPC 地址，默认 {RPC_URL}')
     return parser.parse_args()
 
 def main():
     # 解析命令行参数
     args = parse_args()
     
+    # 日志由后台线程写出，工作线程不会阻塞在控制台 / 文件输出上
+    setup_logging(args.log_file, args.log_level, args.console)
+    
     if not os.path.exists(args.config):
-        print(f"找不到配置文件: {args.config}")
+        log.error(f"找不到配置文件: {args.config}")
+        return
+    if args.cycles < 1 or (args.cycles > 1 and args.step != 1):
+        log.error("--cycles 必须大于 0，且多轮模式需要从第 1 步开始执行")
         return
     
     # 加载账户配置
-    account = load_account(args.config)
-    if not account:
+    accounts = load_accounts(args)
+    if accounts is None:
         return
     
-    # 设置 Web3
-    w3 = setup_web3()
+    # RPC 录制 / 回放（可选），离线回归测试和基准测试使用
+    configure_cassette(args)
+    
+    # 报价历史（录制 / 回放时已由 configure_cassette 改写）
+    configure_quote_history(args.quote_history)
+    
+    # 多节点广播（可选），已签名的交易同时提交给主节点和 --broadcast-rpc 指定的节点
+    configure_broadcast(args)
+    
+    # 设置 Web3（所有账户、所有线程共享同一个端点限流器）
+    w3 = setup_web3(args.rpc_read_rate, args.rpc_write_rate, args.ws_url, args.ws_transport, args.rpc_url)
     if not w3.is_connected():
-        print("无法连接到 Berachain 网络！")
+        log.error("无法连接到 Berachain 网络！")
         return
+    start_stats_reporter(args.rate_stats_interval)
     
-    # 执行所有步骤
-    success = execute_all_steps(w3, account, args.step)
+    # 订阅新区块（可选），回执查询、确认数等待和 gas 价格更新由新区块驱动
+    start_head_watcher(args.ws_url)
     
-    if success:
-        print("\n所有操作已成功完成！")
-    else:
-        print("\n操作执行失败！")
+    # 交易预写日志（可选）：先核对上次崩溃时未完成的交易，再开始新的流水线
+    journal = open_journal(args.tx_journal)
+    if journal:
+        reconcile(w3, journal)
+    
+    # 租约存储（可选），保证多个进程/机器不会同时操作同一账户
+    lease_store = open_lease_store(args.lease_db, args.lease_dir, args.lease_ttl)
+    
+    # 失败隔离（默认开启）：反复失败的账户按指数退避跳过，不占用本轮的 RPC 配额和时间
+    quarantine = open_quarantine(args)
+    
+    def run_accounts(accounts, progress=None):
+        """执行一轮：处理属于当前分片的所有账户；progress 为常驻模式下的进度记录"""
+        # 每轮重新计算租约作用域，常驻模式下跨天后使用新的日期
+        lease_scope = args.lease_scope or default_lease_scope()
+        
+        def process(account):
+            # 本线程内的日志记录（包括各步骤线程）都带上账户字段
+            with log_context(account=account['address']):
+                process_account(account)
+        
+        def process_account(account):
+            key = lease_key(lease_scope, account['address'])
+            if progress:
+                progress.start(account['address'])
+            if lease_store and not lease_store.acquire(key):
+                log.info(f"账户 {account['address']} 已被其他进程处理，跳过")
+                if progress:
+                    progress.finish(account['address'], None)
+                return
+            
+            success = False
+            started = time.monotonic()
+            if quarantine:
+                quarantine.watch(account['address'])
+            try:
+                # 执行所有步骤，每个账户各自等待确认和抖动，不会阻塞其他账户
+                log.info(f"开始处理账户 {account['address']}")
+                success = execute_all_steps(w3, account, args.step, args.confirmations, args.jitter, args.cycles)
+            finally:
+                if lease_store:
+                    lease_store.release(key, done=success)
+                if quarantine:
+                    quarantine.record(account['address'], success)
+                if progress:
+                    progress.finish(account['address'], success)
+            
+            done = {"event": ACCOUNT_DONE, "success": success, "duration": round(time.monotonic() - started, 3)}
+            if success:
+                log.info(f"账户 {account['address']} 所有操作已成功完成！", extra=done)
+            else:
+                log.error(f"账户 {account['address']} 操作执行失败！", extra=done)
+        
+        selected = filter_shard(accounts, args.shard)
+        if quarantine:
+            selected = quarantine.filter(selected)
+        run_concurrently(selected, process, args.workers)
+        if quarantine:
+            quarantine.report()
+        if progress:
+            print_limiter_stats()
+    
+    try:
+        if args.daemon:
+            # 常驻模式：连接、账户列表等保持在内存中，由控制 socket 触发每一轮执行
+            def reload_accounts():
+                return iter_accounts(args.config, args.account_cache,
+                                     args.keystore_password_file, args.keystore_agent)
+            RunDaemon(reload_accounts, run_accounts, accounts).serve(args.daemon)
+        else:
+            run_accounts(accounts)
+    finally:
+        if lease_store:
+            lease_store.close()
+        print_limiter_stats()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,193 +1,160 @@
 from web3 import Web3
-import json
-import time
 import random
+import logging
+
+import repo_path  # noqa: F401  仓库根目录加入模块搜索路径（共享包 common）
+from common.abi_loader import load_abi
+from bera_ledger import HONEY_ADDRESS, BEND_CONTRACT
+from bera_permit import sign_permit
+from bera_tx import sign_and_send, wait_for_receipt
+from common.tx_builder import assemble
+from common.ws_heads import gas_price
+from common.quarantine import REVERTED, failure_fields
+from common.structured_log import setup_logging
+
+log = logging.getLogger(__name__)
 
 # 固定配置
 RPC_URL = "https://bartio.rpc.berachain.com/"
-HONEY_ADDRESS = "0x0E4aaF1351de4c0264C5c7056Ef3777b41BD8e03"
-BEND_CONTRACT = "0x30A3039675E5b5cbEA49d9a5eacbc11f9199B86D"
 
-# Honey Token ABI
-HONEY_ABI = [
-    {
-        "inputs": [
-            {"name": "spender", "type": "address"},
-            {"name": "amount", "type": "uint256"}
-        ],
-        "name": "approve",
-        "outputs": [{"name": "", "type": "bool"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [{"name": "owner", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"name": "result", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"name": "owner", "type": "address"},
-            {"name": "spender", "type": "address"}
-        ],
-        "name": "allowance",
-        "outputs": [{"name": "result", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    }
-]
+def get_honey_balance(w3, account, honey_contract, ledger=None):
+    """获取账户的 Honey 余额（提供余额账本时直接读取账本）"""
+    if ledger:
+        balance = ledger.balance_of(HONEY_ADDRESS)
+    else:
+        balance = honey_contract.functions.balanceOf(account['address']).call()
+    log.debug(f"Honey 余额: {w3.from_wei(balance, 'ether')} HONEY")
+    return balance
 
-# Bend 借贷合约 ABI
-BEND_ABI = [
-    {
-        "inputs": [
-            {"name": "asset", "type": "address"},
-            {"name": "amount", "type": "uint256"},
-            {"name": "onBehalfOf", "type": "address"},
-            {"name": "referralCode", "type": "uint16"}
-        ],
-        "name": "supply",
-        "outputs": [],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    }
-]
+def pick_supply_amount(balance_in_honey):
+    """根据 Honey 余额随机生成质押金额（余额不超过 2 时质押一半，否则 2 到 min(余额一半, 10) 之间随机）"""
+    if balance_in_honey <= 2:
+        return round(balance_in_honey / 2, 2)
+    return round(random.uniform(2, min(balance_in_honey / 2, 10)), 2)
 
-def get_honey_balance(w3, account, honey_contract):
-    """获取账户的 Honey 余额"""
-    balance = honey_contract.functions.balanceOf(account['address']).call()
-    print(f"Honey 余额: {w3.from_wei(balance, 'ether')} HONEY")
-    return balance
+def get_honey_allowance(account, honey_contract, ledger=None):
+    """Bend 合约当前的 Honey 授权额度（提供余额账本时直接读取账本）"""
+    if ledger:
+        return ledger.allowance(HONEY_ADDRESS, BEND_CONTRACT)
+    return honey_contract.functions.allowance(account['address'], BEND_CONTRACT).call()
 
-def check_and_approve_honey(w3, account, honey_contract, amount):
-    """检查并授权 Honey"""
+def check_and_approve_honey(w3, account, honey_contract, amount, pacer=None, ledger=None):
+    """检查并授权 Honey（提供余额账本时直接读取账本中的授权额度）"""
     try:
         # 检查当前授权额度
-        current_allowance = honey_contract.functions.allowance(
-            account['address'],
-            BEND_CONTRACT
-        ).call()
+        current_allowance = get_honey_allowance(account, honey_contract, ledger)
         
-        print(f"当前授权额度: {w3.from_wei(current_allowance, 'ether')} HONEY")
+        log.debug(f"当前授权额度: {w3.from_wei(current_allowance, 'ether')} HONEY")
         
         if current_allowance < amount:
-            print("需要授权 Honey...")
+            log.info("需要授权 Honey...")
             # 构建授权交易
-            approve_txn = honey_contract.functions.approve(
-                BEND_CONTRACT,
-                amount
-            ).build_transaction({
-                'from': account['address'],
-                'nonce': w3.eth.get_transaction_count(account['address']),
-                'gas': 100000,
-                'gasPrice': w3.eth.gas_price
-            })
+            approve_txn = assemble(w3, honey_contract, 'approve', [BEND_CONTRACT, amount],
+                                   gas=100000, gas_price=gas_price(w3))
             
             # 签名并发送交易
-            signed_txn = w3.eth.account.sign_transaction(
-                approve_txn,
-                account['private_key']
-            )
-            tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            tx_hash = sign_and_send(w3, account, approve_txn, pacer, label='bend-approve')
             
             # 等待交易确认
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = wait_for_receipt(w3, tx_hash, ledger)
             if receipt['status'] == 1:
-                print(f"授权成功！交易哈希: {tx_hash.hex()}")
+                log.info(f"授权成功！交易哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
                 return True
             else:
-                print("授权失败！")
+                log.error("授权失败！", extra=failure_fields(reason=REVERTED))
                 return False
         else:
-            print("已有足够的授权额度")
+            log.debug("已有足够的授权额度")
             return True
             
     except Exception as e:
-        print(f"授权过程出错: {str(e)}")
+        log.error(f"授权过程出错: {str(e)}", extra=failure_fields(e))
         return False
 
-def supply_honey(w3, account, amount_in_honey=None):
+def supply_honey(w3, account, amount_in_honey=None, pacer=None, ledger=None):
     """
     向 Bend 协议质押 Honey
     w3: Web3 实例
     account: 账户信息 dict，包含 private_key 和 address
     amount_in_honey: 质押的 Honey 数量，如果不指定则随机生成
+    pacer: 步骤节奏器（可选），发送交易前等待上一步确认和抖动窗口
+    ledger: 余额账本（可选），提供时余额和授权额度从账本读取，回执到达后更新账本
+    成功返回交易回执，失败返回 False
     """
     try:
         # 创建合约实例
-        honey_contract = w3.eth.contract(address=HONEY_ADDRESS, abi=HONEY_ABI)
-        bend_contract = w3.eth.contract(address=BEND_CONTRACT, abi=BEND_ABI)
+        honey_contract = w3.eth.contract(address=HONEY_ADDRESS, abi=load_abi('erc20'))
+        bend_contract = w3.eth.contract(address=BEND_CONTRACT, abi=load_abi('bend_pool'))
         
         # 获取账户余额
-        balance = get_honey_balance(w3, account, honey_contract)
+        balance = get_honey_balance(w3, account, honey_contract, ledger)
         
         # 如果没有指定金额，则根据余额生成随机金额
         if amount_in_honey is None:
             balance_in_honey = float(w3.from_wei(balance, 'ether'))  # 转换为 float
-            if balance_in_honey <= 2:
-                amount_in_honey = round(balance_in_honey / 2, 2)
-            else:
-                amount_in_honey = round(random.uniform(2, min(balance_in_honey / 2, 10)), 2)
-            print(f"随机生成质押金额: {amount_in_honey} HONEY")
+            amount_in_honey = pick_supply_amount(balance_in_honey)
+            log.info(f"随机生成质押金额: {amount_in_honey} HONEY")
         
         # 转换为 Wei
         amount = w3.to_wei(amount_in_honey, 'ether')
         
-        # 检查并授权
-        if not check_and_approve_honey(w3, account, honey_contract, amount):
+        # 授权不足时优先离线签名 permit，随 supplyWithPermit 一起提交，省掉单独的 approve 交易；
+        # HONEY 不支持 permit 或签名失败时退回 approve + supply
+        permit = None
+        if get_honey_allowance(account, honey_contract, ledger) < amount:
+            try:
+                permit = sign_permit(w3, account, HONEY_ADDRESS, BEND_CONTRACT, amount)
+            except Exception as e:
+                log.warning(f"permit 签名失败，改用 approve 授权: {str(e)}")
+        if permit is None and not check_and_approve_honey(w3, account, honey_contract, amount, pacer, ledger):
             return False
             
-        print(f"\n开始质押 {amount_in_honey} HONEY...")
-        
-        # 构建质押交易
-        supply_txn = bend_contract.functions.supply(
-            HONEY_ADDRESS,
-            amount,
-            account['address'],
-            18  # referralCode，参考成功交易
-        ).build_transaction({
-            'from': account['address'],
-            'nonce': w3.eth.get_transaction_count(account['address']),
-            'gas': 300000,
-            'gasPrice': w3.eth.gas_price
-        })
+        log.info(f"开始质押 {amount_in_honey} HONEY{'（permit 授权）' if permit else ''}...")
         
-        # 签名交易
-        signed_txn = w3.eth.account.sign_transaction(
-            supply_txn,
-            account['private_key']
-        )
+        # 构建质押交易（referralCode 参考成功交易）
+        if permit:
+            deadline, v, r, s = permit
+            supply_txn = assemble(w3, bend_contract, 'supplyWithPermit',
+                                  [HONEY_ADDRESS, amount, account['address'], 18, deadline, v, r, s],
+                                  gas=350000, gas_price=gas_price(w3))
+        else:
+            supply_txn = assemble(w3, bend_contract, 'supply', [HONEY_ADDRESS, amount, account['address'], 18],
+                                  gas=300000, gas_price=gas_price(w3))
         
-        # 发送交易
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-        print(f"质押交易已发送，哈希: {tx_hash.hex()}")
+        # 签名并发送交易
+        tx_hash = sign_and_send(w3, account, supply_txn, pacer, label='bend-supply')
+        log.info(f"质押交易已发送，哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
         
         # 等待交易确认
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = wait_for_receipt(w3, tx_hash, ledger)
         if receipt['status'] == 1:
-            print(f"质押成功！交易哈希: {tx_hash.hex()}")
-            print(f"Gas 使用: {receipt['gasUsed']}")
-            return True
+            if permit and ledger:
+                # permit 授权的额度恰好被本次质押用完
+                ledger.set_allowance(HONEY_ADDRESS, BEND_CONTRACT, 0)
+            log.info(f"质押成功！交易哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
+            log.debug(f"Gas 使用: {receipt['gasUsed']}")
+            return receipt
         else:
-            print("质押失败！")
+            log.error("质押失败！", extra=failure_fields(reason=REVERTED))
             return False
             
     except Exception as e:
-        print(f"质押过程出错: {str(e)}")
+        log.error(f"质押过程出错: {str(e)}", extra=failure_fields(e))
         return False
 
 def main():
+    # 单独运行时只输出到控制台
+    setup_logging(console='lines')
+    
     # 设置 Web3
     w3 = Web3(Web3.HTTPProvider(RPC_URL))
     
     # 检查连接
     if not w3.is_connected():
-        print("无法连接到 Berachain 网络！")
+        log.error("无法连接到 Berachain 网络！")
         return
 
-    print("开始执行质押...")
+    log.info("开始执行质押...")
     # 这里仅作为单独测试使用
     test_account = {
         "private_key": "YOUR_PRIVATE_KEY",
@@ -196,9 +163,9 @@ def main():
     success = supply_honey(w3, test_account)
     
     if success:
-        print("质押执行完成！")
+        log.info("质押执行完成！")
     else:
-        print("质押执行失败！")
+        log.error("质押执行失败！")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
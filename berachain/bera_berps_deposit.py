@@ -1,190 +1,144 @@
 from web3 import Web3
-import json
-import time
 import random
+import logging
 
-# 固定配置
-RPC_URL = "https://bartio.rpc.berachain.com/"
-HONEY_ADDRESS = "0x0E4aaF1351de4c0264C5c7056Ef3777b41BD8e03"
-BERPS_CONTRACT = "0x1306D3c36eC7E38dd2c128fBe3097C2C2449af64"
+import repo_path  # noqa: F401  仓库根目录加入模块搜索路径（共享包 common）
+from common.abi_loader import load_abi
+from bera_ledger import HONEY_ADDRESS, BERPS_CONTRACT
+from bera_tx import sign_and_send, wait_for_receipt
+from common.tx_builder import assemble
+from common.ws_heads import gas_price
+from common.quarantine import REVERTED, failure_fields
+from common.structured_log import setup_logging
 
-# Honey Token ABI
-HONEY_ABI = [
-    {
-        "inputs": [
-            {"name": "spender", "type": "address"},
-            {"name": "amount", "type": "uint256"}
-        ],
-        "name": "approve",
-        "outputs": [{"name": "", "type": "bool"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [{"name": "owner", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"name": "result", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"name": "owner", "type": "address"},
-            {"name": "spender", "type": "address"}
-        ],
-        "name": "allowance",
-        "outputs": [{"name": "result", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    }
-]
+log = logging.getLogger(__name__)
 
-# BERPS 合约 ABI
-BERPS_ABI = [
-    {
-        "inputs": [
-            {"name": "assets", "type": "uint256"},
-            {"name": "receiver", "type": "address"}
-        ],
-        "name": "deposit",
-        "outputs": [{"name": "", "type": "uint256"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    }
-]
+# 固定配置
+RPC_URL = "https://bartio.rpc.berachain.com/"
 
-def get_honey_balance(w3, account, honey_contract):
-    """获取账户的 Honey 余额"""
-    balance = honey_contract.functions.balanceOf(account['address']).call()
-    print(f"Honey 余额: {w3.from_wei(balance, 'ether')} HONEY")
+def get_honey_balance(w3, account, honey_contract, ledger=None):
+    """获取账户的 Honey 余额（提供余额账本时直接读取账本）"""
+    if ledger:
+        balance = ledger.balance_of(HONEY_ADDRESS)
+    else:
+        balance = honey_contract.functions.balanceOf(account['address']).call()
+    log.debug(f"Honey 余额: {w3.from_wei(balance, 'ether')} HONEY")
     return balance
 
-def check_and_approve_honey(w3, account, honey_contract, amount):
-    """检查并授权 Honey"""
+def pick_deposit_amount(balance_in_honey):
+    """根据 Honey 余额随机生成质押金额（2-余额的一半，余额不足时固定 1）"""
+    max_amount = min(balance_in_honey / 2, 2)
+    if max_amount < 1:
+        return 1
+    return round(random.uniform(2, max_amount), 2)
+
+def check_and_approve_honey(w3, account, honey_contract, amount, pacer=None, ledger=None):
+    """检查并授权 Honey（提供余额账本时直接读取账本中的授权额度）"""
     try:
         # 检查当前授权额度
-        current_allowance = honey_contract.functions.allowance(
-            account['address'],
-            BERPS_CONTRACT
-        ).call()
+        if ledger:
+            current_allowance = ledger.allowance(HONEY_ADDRESS, BERPS_CONTRACT)
+        else:
+            current_allowance = honey_contract.functions.allowance(
+                account['address'],
+                BERPS_CONTRACT
+            ).call()
         
-        print(f"当前授权额度: {w3.from_wei(current_allowance, 'ether')} HONEY")
+        log.debug(f"当前授权额度: {w3.from_wei(current_allowance, 'ether')} HONEY")
         
         if current_allowance < amount:
-            print("需要授权 Honey...")
+            log.info("需要授权 Honey...")
             # 构建授权交易
-            approve_txn = honey_contract.functions.approve(
-                BERPS_CONTRACT,
-                amount
-            ).build_transaction({
-                'from': account['address'],
-                'nonce': w3.eth.get_transaction_count(account['address']),
-                'gas': 100000,
-                'gasPrice': w3.eth.gas_price
-            })
+            approve_txn = assemble(w3, honey_contract, 'approve', [BERPS_CONTRACT, amount],
+                                   gas=100000, gas_price=gas_price(w3))
             
             # 签名并发送交易
-            signed_txn = w3.eth.account.sign_transaction(
-                approve_txn,
-                account['private_key']
-            )
-            tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            tx_hash = sign_and_send(w3, account, approve_txn, pacer, label='berps-approve')
             
             # 等待交易确认
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = wait_for_receipt(w3, tx_hash, ledger)
             if receipt['status'] == 1:
-                print(f"授权成功！交易哈希: {tx_hash.hex()}")
+                log.info(f"授权成功！交易哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
                 return True
             else:
-                print("授权失败！")
+                log.error("授权失败！", extra=failure_fields(reason=REVERTED))
                 return False
         else:
-            print("已有足够的授权额度")
+            log.debug("已有足够的授权额度")
             return True
             
     except Exception as e:
-        print(f"授权过程出错: {str(e)}")
+        log.error(f"授权过程出错: {str(e)}", extra=failure_fields(e))
         return False
 
-def deposit_honey(w3, account, amount_in_honey=None):
+def deposit_honey(w3, account, amount_in_honey=None, pacer=None, ledger=None):
     """
     向 BERPS 协议质押 Honey
     w3: Web3 实例
     account: 账户信息 dict，包含 private_key 和 address
     amount_in_honey: 质押的 Honey 数量，如果不指定则随机生成
+    pacer: 步骤节奏器（可选），发送交易前等待上一步确认和抖动窗口
+    ledger: 余额账本（可选），提供时余额和授权额度从账本读取，回执到达后更新账本
+    成功返回交易回执，失败返回 False
     """
     try:
         # 创建合约实例
-        honey_contract = w3.eth.contract(address=HONEY_ADDRESS, abi=HONEY_ABI)
-        berps_contract = w3.eth.contract(address=BERPS_CONTRACT, abi=BERPS_ABI)
+        honey_contract = w3.eth.contract(address=HONEY_ADDRESS, abi=load_abi('erc20'))
+        berps_contract = w3.eth.contract(address=BERPS_CONTRACT, abi=load_abi('berps_vault'))
         
         # 获取账户余额
-        balance = get_honey_balance(w3, account, honey_contract)
+        balance = get_honey_balance(w3, account, honey_contract, ledger)
         balance_in_eth = float(w3.from_wei(balance, 'ether'))  # 转换为 float
         
         # 如果没有指定金额，则随机生成（2-余额的一半）
         if amount_in_honey is None:
-            max_amount = min(balance_in_eth / 2, 2)
-            if max_amount < 1:
-                amount_in_honey = 1
-            else:
-                amount_in_honey = round(random.uniform(2, max_amount), 2)
-            print(f"随机生成质押金额: {amount_in_honey} HONEY")
+            amount_in_honey = pick_deposit_amount(balance_in_eth)
+            log.info(f"随机生成质押金额: {amount_in_honey} HONEY")
         
         # 转换为 Wei
         amount = w3.to_wei(amount_in_honey, 'ether')
         
         # 检查并授权
-        if not check_and_approve_honey(w3, account, honey_contract, amount):
+        if not check_and_approve_honey(w3, account, honey_contract, amount, pacer, ledger):
             return False
             
-        print(f"\n开始质押 {amount_in_honey} HONEY...")
+        log.info(f"开始质押 {amount_in_honey} HONEY...")
         
         # 构建质押交易
-        deposit_txn = berps_contract.functions.deposit(
-            amount,
-            account['address']
-        ).build_transaction({
-            'from': account['address'],
-            'nonce': w3.eth.get_transaction_count(account['address']),
-            'gas': 300000,
-            'gasPrice': w3.eth.gas_price
-        })
+        deposit_txn = assemble(w3, berps_contract, 'deposit', [amount, account['address']],
+                               gas=300000, gas_price=gas_price(w3))
         
-        # 签名交易
-        signed_txn = w3.eth.account.sign_transaction(
-            deposit_txn,
-            account['private_key']
-        )
-        
-        # 发送交易
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-        print(f"质押交易已发送，哈希: {tx_hash.hex()}")
+        # 签名并发送交易
+        tx_hash = sign_and_send(w3, account, deposit_txn, pacer, label='berps-deposit')
+        log.info(f"质押交易已发送，哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
         
         # 等待交易确认
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = wait_for_receipt(w3, tx_hash, ledger)
         if receipt['status'] == 1:
-            print(f"质押成功！交易哈希: {tx_hash.hex()}")
-            print(f"Gas 使用: {receipt['gasUsed']}")
-            return True
+            log.info(f"质押成功！交易哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
+            log.debug(f"Gas 使用: {receipt['gasUsed']}")
+            return receipt
         else:
-            print("质押失败！")
+            log.error("质押失败！", extra=failure_fields(reason=REVERTED))
             return False
             
     except Exception as e:
-        print(f"质押过程出错: {str(e)}")
+        log.error(f"质押过程出错: {str(e)}", extra=failure_fields(e))
         return False
 
 def main():
+    # 单独运行时只输出到控制台
+    setup_logging(console='lines')
+    
     # 设置 Web3
     w3 = Web3(Web3.HTTPProvider(RPC_URL))
     
     # 检查连接
     if not w3.is_connected():
-        print("无法连接到 Berachain 网络！")
+        log.error("无法连接到 Berachain 网络！")
         return
 
-    print("开始执行质押...")
+    log.info("开始执行质押...")
     # 这里仅作为单独测试使用
     test_account = {
         "private_key": "YOUR_PRIVATE_KEY",
@@ -193,9 +147,9 @@ def main():
     success = deposit_honey(w3, test_account)
     
     if success:
-        print("质押执行完成！")
+        log.info("质押执行完成！")
     else:
-        print("质押执行失败！")
+        log.error("质押执行失败！")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,183 +1,135 @@
 from web3 import Web3
-import json
-import time
-import random
+import logging
 
-# 固定配置
-RPC_URL = "https://bartio.rpc.berachain.com/"
-BHONEY_ADDRESS = "0x1306D3c36eC7E38dd2c128fBe3097C2C2449af64"  # bHONEY 合约地址
-STAKE_CONTRACT = "0xC5Cb3459723B828B3974f7E58899249C2be3B33d"  # 质押合约地址
+import repo_path  # noqa: F401  仓库根目录加入模块搜索路径（共享包 common）
+from common.abi_loader import load_abi
+from bera_ledger import BHONEY_ADDRESS, STAKE_CONTRACT
+from bera_tx import sign_and_send, wait_for_receipt
+from common.tx_builder import assemble
+from common.ws_heads import gas_price
+from common.quarantine import REVERTED, failure_fields
+from common.structured_log import setup_logging
 
-# bHONEY Token ABI
-BHONEY_ABI = [
-    {
-        "inputs": [
-            {"name": "spender", "type": "address"},
-            {"name": "amount", "type": "uint256"}
-        ],
-        "name": "approve",
-        "outputs": [{"name": "", "type": "bool"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [{"name": "owner", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"name": "result", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"name": "owner", "type": "address"},
-            {"name": "spender", "type": "address"}
-        ],
-        "name": "allowance",
-        "outputs": [{"name": "result", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    }
-]
+log = logging.getLogger(__name__)
 
-# 质押合约 ABI
-STAKE_ABI = [
-    {
-        "inputs": [
-            {"name": "amount", "type": "uint256"}
-        ],
-        "name": "stake",
-        "outputs": [],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    }
-]
+# 固定配置
+RPC_URL = "https://bartio.rpc.berachain.com/"
 
-def get_bhoney_balance(w3, account, bhoney_contract):
-    """获取账户的 bHONEY 余额"""
-    balance = bhoney_contract.functions.balanceOf(account['address']).call()
-    print(f"bHONEY 余额: {w3.from_wei(balance, 'ether')} bHONEY")
+def get_bhoney_balance(w3, account, bhoney_contract, ledger=None):
+    """获取账户的 bHONEY 余额（提供余额账本时直接读取账本）"""
+    if ledger:
+        balance = ledger.balance_of(BHONEY_ADDRESS)
+    else:
+        balance = bhoney_contract.functions.balanceOf(account['address']).call()
+    log.debug(f"bHONEY 余额: {w3.from_wei(balance, 'ether')} bHONEY")
     return balance
 
-def check_and_approve_bhoney(w3, account, bhoney_contract, amount):
-    """检查并授权 bHONEY"""
+def check_and_approve_bhoney(w3, account, bhoney_contract, amount, pacer=None, ledger=None):
+    """检查并授权 bHONEY（提供余额账本时直接读取账本中的授权额度）"""
     try:
         # 检查当前授权额度
-        current_allowance = bhoney_contract.functions.allowance(
-            account['address'],
-            STAKE_CONTRACT
-        ).call()
+        if ledger:
+            current_allowance = ledger.allowance(BHONEY_ADDRESS, STAKE_CONTRACT)
+        else:
+            current_allowance = bhoney_contract.functions.allowance(
+                account['address'],
+                STAKE_CONTRACT
+            ).call()
         
-        print(f"当前授权额度: {w3.from_wei(current_allowance, 'ether')} bHONEY")
+        log.debug(f"当前授权额度: {w3.from_wei(current_allowance, 'ether')} bHONEY")
         
         if current_allowance < amount:
-            print("需要授权 bHONEY...")
+            log.info("需要授权 bHONEY...")
             # 构建授权交易
-            approve_txn = bhoney_contract.functions.approve(
-                STAKE_CONTRACT,
-                amount
-            ).build_transaction({
-                'from': account['address'],
-                'nonce': w3.eth.get_transaction_count(account['address']),
-                'gas': 100000,
-                'gasPrice': w3.eth.gas_price
-            })
+            approve_txn = assemble(w3, bhoney_contract, 'approve', [STAKE_CONTRACT, amount],
+                                   gas=100000, gas_price=gas_price(w3))
             
             # 签名并发送交易
-            signed_txn = w3.eth.account.sign_transaction(
-                approve_txn,
-                account['private_key']
-            )
-            tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            tx_hash = sign_and_send(w3, account, approve_txn, pacer, label='stake-approve')
             
             # 等待交易确认
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = wait_for_receipt(w3, tx_hash, ledger)
             if receipt['status'] == 1:
-                print(f"授权成功！交易哈希: {tx_hash.hex()}")
+                log.info(f"授权成功！交易哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
                 return True
             else:
-                print("授权失败！")
+                log.error("授权失败！", extra=failure_fields(reason=REVERTED))
                 return False
         else:
-            print("已有足够的授权额度")
+            log.debug("已有足够的授权额度")
             return True
             
     except Exception as e:
-        print(f"授权过程出错: {str(e)}")
+        log.error(f"授权过程出错: {str(e)}", extra=failure_fields(e))
         return False
 
-def stake_bhoney(w3, account, amount_in_bhoney=None):
+def stake_bhoney(w3, account, amount_in_bhoney=None, pacer=None, ledger=None):
     """
     质押 bHONEY
     w3: Web3 实例
     account: 账户信息 dict，包含 private_key 和 address
     amount_in_bhoney: 质押的 bHONEY 数量，如果不指定则使用全部余额
+    pacer: 步骤节奏器（可选），发送交易前等待上一步确认和抖动窗口
+    ledger: 余额账本（可选），提供时余额和授权额度从账本读取，回执到达后更新账本
+    成功返回交易回执，失败返回 False
     """
     try:
         # 创建合约实例
-        bhoney_contract = w3.eth.contract(address=BHONEY_ADDRESS, abi=BHONEY_ABI)
-        stake_contract = w3.eth.contract(address=STAKE_CONTRACT, abi=STAKE_ABI)
+        bhoney_contract = w3.eth.contract(address=BHONEY_ADDRESS, abi=load_abi('erc20'))
+        stake_contract = w3.eth.contract(address=STAKE_CONTRACT, abi=load_abi('berps_stake'))
         
         # 获取账户余额
-        balance = get_bhoney_balance(w3, account, bhoney_contract)
+        balance = get_bhoney_balance(w3, account, bhoney_contract, ledger)
         
         # 如果没有指定金额，则使用全部余额
         if amount_in_bhoney is None:
             amount = balance
             amount_in_bhoney = w3.from_wei(balance, 'ether')
-            print(f"使用全部余额质押: {amount_in_bhoney} bHONEY")
+            log.info(f"使用全部余额质押: {amount_in_bhoney} bHONEY")
         else:
             amount = w3.to_wei(amount_in_bhoney, 'ether')
         
         # 检查并授权
-        if not check_and_approve_bhoney(w3, account, bhoney_contract, amount):
+        if not check_and_approve_bhoney(w3, account, bhoney_contract, amount, pacer, ledger):
             return False
             
-        print(f"\n开始质押 {amount_in_bhoney} bHONEY...")
+        log.info(f"开始质押 {amount_in_bhoney} bHONEY...")
         
         # 构建质押交易
-        stake_txn = stake_contract.functions.stake(
-            amount
-        ).build_transaction({
-            'from': account['address'],
-            'nonce': w3.eth.get_transaction_count(account['address']),
-            'gas': 300000,
-            'gasPrice': w3.eth.gas_price
-        })
-        
-        # 签名交易
-        signed_txn = w3.eth.account.sign_transaction(
-            stake_txn,
-            account['private_key']
-        )
+        stake_txn = assemble(w3, stake_contract, 'stake', [amount],
+                             gas=300000, gas_price=gas_price(w3))
         
-        # 发送交易
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-        print(f"质押交易已发送，哈希: {tx_hash.hex()}")
+        # 签名并发送交易
+        tx_hash = sign_and_send(w3, account, stake_txn, pacer, label='stake')
+        log.info(f"质押交易已发送，哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
         
         # 等待交易确认
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = wait_for_receipt(w3, tx_hash, ledger)
         if receipt['status'] == 1:
-            print(f"质押成功！交易哈希: {tx_hash.hex()}")
-            print(f"Gas 使用: {receipt['gasUsed']}")
-            return True
+            log.info(f"质押成功！交易哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
+            log.debug(f"Gas 使用: {receipt['gasUsed']}")
+            return receipt
         else:
-            print("质押失败！")
+            log.error("质押失败！", extra=failure_fields(reason=REVERTED))
             return False
             
     except Exception as e:
-        print(f"质押过程出错: {str(e)}")
+        log.error(f"质押过程出错: {str(e)}", extra=failure_fields(e))
         return False
 
 def main():
+    # 单独运行时只输出到控制台
+    setup_logging(console='lines')
+    
     # 设置 Web3
     w3 = Web3(Web3.HTTPProvider(RPC_URL))
     
     # 检查连接
     if not w3.is_connected():
-        print("无法连接到 Berachain 网络！")
+        log.error("无法连接到 Berachain 网络！")
         return
 
-    print("开始执行质押...")
+    log.info("开始执行质押...")
     # 这里仅作为单独测试使用
     test_account = {
         "private_key": "YOUR_PRIVATE_KEY",
@@ -186,9 +138,9 @@ def main():
     success = stake_bhoney(w3, test_account)
     
     if success:
-        print("质押执行完成！")
+        log.info("质押执行完成！")
     else:
-        print("质押执行失败！")
+        log.error("质押执行失败！")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,148 @@
+import logging
+import threading
+
+from web3 import Web3
+
+from common.abi_loader import load_abi
+from common.multicall import batch_call, eth_balance_call
+
+log = logging.getLogger(__name__)
+
+# 流水线余额账本
+# 流水线开始时一次批量查询原生 BERA、stgUSDC、HONEY、bHONEY 余额和所有相关授权额度，
+# 之后每笔交易的回执按 ERC-20 Transfer / Approval 日志增量更新，后续步骤直接读取本地数值，不再逐个查询
+
+# 代币和合约地址（各步骤脚本、报价引擎和快照工具统一从这里导入）
+BERA_ADDRESS = "0x0000000000000000000000000000000000000000"  # 原生 BERA
+STGUSDC_ADDRESS = "0xd6D83aF58a19Cd14eF3CF6fe848C9A4d21e5727c"
+HONEY_ADDRESS = "0x0E4aaF1351de4c0264C5c7056Ef3777b41BD8e03"
+BHONEY_ADDRESS = "0x1306D3c36eC7E38dd2c128fBe3097C2C2449af64"
+HONEY_MINT_CONTRACT = "0xAd1782b2a7020631249031618fB1Bd09CD926b31"
+BEND_CONTRACT = "0x30A3039675E5b5cbEA49d9a5eacbc11f9199B86D"
+BERPS_CONTRACT = "0x1306D3c36eC7E38dd2c128fBe3097C2C2449af64"
+STAKE_CONTRACT = "0xC5Cb3459723B828B3974f7E58899249C2be3B33d"
+
+TOKENS = [STGUSDC_ADDRESS, HONEY_ADDRESS, BHONEY_ADDRESS]
+# 流水线用到的 (代币, 被授权合约)
+ALLOWANCES = [
+    (STGUSDC_ADDRESS, HONEY_MINT_CONTRACT),
+    (HONEY_ADDRESS, BEND_CONTRACT),
+    (HONEY_ADDRESS, BERPS_CONTRACT),
+    (BHONEY_ADDRESS, STAKE_CONTRACT),
+]
+
+
+def _hex(value):
+    """统一为带 0x 前缀的小写十六进制字符串（兼容 HexBytes 和 str）"""
+    if isinstance(value, (bytes, bytearray)):
+        value = value.hex()
+    value = value.lower()
+    return value if value.startswith('0x') else f"0x{value}"
+
+
+TRANSFER_TOPIC = _hex(Web3.keccak(text="Transfer(address,address,uint256)"))
+APPROVAL_TOPIC = _hex(Web3.keccak(text="Approval(address,address,uint256)"))
+MAX_UINT256 = 2 ** 256 - 1
+
+
+def _topic_address(topic):
+    return f"0x{_hex(topic)[-40:]}"
+
+
+class BalanceLedger:
+    """
+    单个账户的余额账本
+    所有金额为最小单位整数；地址一律按小写存储
+    """
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address.lower()
+        self.native = 0
+        self.balances = {}
+        self.allowances = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """一次批量调用读取全部余额和授权额度（同一区块）"""
+        owner = Web3.to_checksum_address(self.address)
+        calls = [eth_balance_call(self.w3, owner)]
+        for token in TOKENS:
+            calls.append((self.w3.eth.contract(address=token, abi=load_abi('erc20')), 'balanceOf', [owner]))
+        for token, spender in ALLOWANCES:
+            calls.append((self.w3.eth.contract(address=token, abi=load_abi('erc20')), 'allowance', [owner, spender]))
+
+        results = batch_call(self.w3, calls)
+        if any(result is None for result in results):
+            raise RuntimeError("余额快照查询失败")
+
+        with self._lock:
+            self.native = results[0]
+            for token, balance in zip(TOKENS, results[1:1 + len(TOKENS)]):
+                self.balances[token.lower()] = balance
+            for (token, spender), allowance in zip(ALLOWANCES, results[1 + len(TOKENS):]):
+                self.allowances[(token.lower(), spender.lower())] = allowance
+        log.debug(f"余额快照: BERA {self.w3.from_wei(self.native, 'ether')}, "
+              + ", ".join(f"{token[:8]} {self.balances[token.lower()]}" for token in TOKENS))
+        return self
+
+    def balance_of(self, token):
+        with self._lock:
+            return self.balances[token.lower()]
+
+    def allowance(self, token, spender):
+        with self._lock:
+            return self.allowances[(token.lower(), spender.lower())]
+
+    def set_allowance(self, token, spender, value):
+        """直接设置授权额度（permit 授权在同一笔交易中被完全消耗时，回执日志无法反映最终额度）"""
+        with self._lock:
+            self.allowances[(token.lower(), spender.lower())] = value
+
+    def received(self, receipt, token):
+        """回执中转入本账户的 token 数量（多轮模式下每轮只使用本轮实际收到的代币）"""
+        token = token.lower()
+        total = 0
+        for log in receipt['logs']:
+            topics = log['topics']
+            if log['address'].lower() != token or len(topics) < 3 or _hex(topics[0]) != TRANSFER_TOPIC:
+                continue
+            if _topic_address(topics[2]) == self.address:
+                total += int(_hex(log['data'])[2:] or '0', 16)
+        return total
+
+    def apply_receipt(self, receipt, value=0):
+        """
+        根据交易回执更新账本
+        value: 交易附带的原生代币数量（回执中没有该字段，需要调用方传入）
+        失败的交易只扣除 gas 费
+        """
+        with self._lock:
+            gas_cost = receipt['gasUsed'] * receipt.get('effectiveGasPrice', 0)
+            self.native -= gas_cost + (value if receipt['status'] == 1 else 0)
+            if receipt['status'] != 1:
+                return
+
+            tx_to = (receipt.get('to') or '').lower()
+            approved = set()
+            for log in receipt['logs']:
+                token = log['address'].lower()
+                topics = log['topics']
+                if token not in self.balances or len(topics) < 3:
+                    continue
+                topic0 = _hex(topics[0])
+                amount = int(_hex(log['data'])[2:] or '0', 16)
+                if topic0 == APPROVAL_TOPIC and _topic_address(topics[1]) == self.address:
+                    spender = _topic_address(topics[2])
+                    self.allowances[(token, spender)] = amount
+                    approved.add((token, spender))
+                elif topic0 == TRANSFER_TOPIC:
+                    sender, recipient = _topic_address(topics[1]), _topic_address(topics[2])
+                    if sender == self.address:
+                        self.balances[token] -= amount
+                        # 被授权合约通过 transferFrom 转走代币时消耗授权额度（部分代币实现不会为此发出 Approval）
+                        key = (token, tx_to)
+                        if key in self.allowances and key not in approved and self.allowances[key] != MAX_UINT256:
+                            self.allowances[key] = max(0, self.allowances[key] - amount)
+                    if recipient == self.address:
+                        self.balances[token] += amount
@@ -1,138 +1,87 @@
 from web3 import Web3
-import json
-import time
-import random
+import logging
 
-# 固定配置
-RPC_URL = "https://bartio.rpc.berachain.com/"
-STGUSDC_ADDRESS = "0xd6D83aF58a19Cd14eF3CF6fe848C9A4d21e5727c"
-HONEY_MINT_CONTRACT = "0xAd1782b2a7020631249031618fB1Bd09CD926b31"
+import repo_path  # noqa: F401  仓库根目录加入模块搜索路径（共享包 common）
+from common.abi_loader import load_abi
+from bera_ledger import STGUSDC_ADDRESS, HONEY_MINT_CONTRACT
+from bera_tx import sign_and_send, wait_for_receipt
+from common.tx_builder import assemble
+from common.ws_heads import gas_price
+from common.quarantine import REVERTED, failure_fields
+from common.structured_log import setup_logging
 
-# STGUSDC 的 ABI
-STGUSDC_ABI = [
-    {
-        "inputs": [
-            {"name": "spender", "type": "address"},
-            {"name": "amount", "type": "uint256"}
-        ],
-        "name": "approve",
-        "outputs": [{"name": "", "type": "bool"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"name": "owner", "type": "address"},
-            {"name": "spender", "type": "address"}
-        ],
-        "name": "allowance",
-        "outputs": [{"name": "result", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    },
-    {
-        "inputs": [{"name": "owner", "type": "address"}],
-        "name": "balanceOf",
-        "outputs": [{"name": "result", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    }
-]
+log = logging.getLogger(__name__)
 
-# Honey Mint 合约 ABI
-HONEY_MINT_ABI = [
-    {
-        "inputs": [
-            {"name": "asset", "type": "address"},
-            {"name": "amount", "type": "uint256"},
-            {"name": "receiver", "type": "address"}
-        ],
-        "name": "mint",
-        "outputs": [{"name": "", "type": "uint256"}],
-        "stateMutability": "nonpayable",
-        "type": "function"
-    },
-    {
-        "inputs": [
-            {"name": "asset", "type": "address"},
-            {"name": "amount", "type": "uint256"}
-        ],
-        "name": "previewMint",
-        "outputs": [{"name": "honeyAmount", "type": "uint256"}],
-        "stateMutability": "view",
-        "type": "function"
-    }
-]
+# 固定配置
+RPC_URL = "https://bartio.rpc.berachain.com/"
 
-def check_and_approve_stgusdc(w3, account, stgusdc_contract, amount):
-    """检查并授权 stgUSDC"""
+def check_and_approve_stgusdc(w3, account, stgusdc_contract, amount, pacer=None, ledger=None):
+    """检查并授权 stgUSDC（提供余额账本时直接读取账本中的授权额度）"""
     try:
         # 检查当前授权额度
-        current_allowance = stgusdc_contract.functions.allowance(
-            account['address'],
-            HONEY_MINT_CONTRACT
-        ).call()
+        if ledger:
+            current_allowance = ledger.allowance(STGUSDC_ADDRESS, HONEY_MINT_CONTRACT)
+        else:
+            current_allowance = stgusdc_contract.functions.allowance(
+                account['address'],
+                HONEY_MINT_CONTRACT
+            ).call()
         
-        print(f"当前授权额度: {current_allowance}")
+        log.debug(f"当前授权额度: {current_allowance}")
         
         if current_allowance < amount:
-            print("需要授权 stgUSDC...")
+            log.info("需要授权 stgUSDC...")
             # 构建授权交易
-            approve_txn = stgusdc_contract.functions.approve(
-                HONEY_MINT_CONTRACT,
-                amount
-            ).build_transaction({
-                'from': account['address'],
-                'nonce': w3.eth.get_transaction_count(account['address']),
-                'gas': 100000,
-                'gasPrice': w3.eth.gas_price
-            })
+            approve_txn = assemble(w3, stgusdc_contract, 'approve', [HONEY_MINT_CONTRACT, amount],
+                                   gas=100000, gas_price=gas_price(w3))
             
             # 签名并发送交易
-            signed_txn = w3.eth.account.sign_transaction(
-                approve_txn,
-                account['private_key']
-            )
-            tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
+            tx_hash = sign_and_send(w3, account, approve_txn, pacer, label='mint-approve')
             
             # 等待交易确认
-            receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+            receipt = wait_for_receipt(w3, tx_hash, ledger)
             if receipt['status'] == 1:
-                print(f"授权成功！交易哈希: {tx_hash.hex()}")
+                log.info(f"授权成功！交易哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
                 return True
             else:
-                print("授权失败！")
+                log.error("授权失败！", extra=failure_fields(reason=REVERTED))
                 return False
         else:
-            print("已有足够的授权额度")
+            log.debug("已有足够的授权额度")
             return True
             
     except Exception as e:
-        print(f"授权过程出错: {str(e)}")
+        log.error(f"授权过程出错: {str(e)}", extra=failure_fields(e))
         return False
 
-def mint_honey(w3, account, amount_in_usdc=None):
+def mint_honey(w3, account, amount_in_usdc=None, pacer=None, ledger=None):
     """
     将 stgUSDC 换成 honey
     w3: Web3 实例
     account: 账户信息 dict，包含 private_key 和 address
     amount_in_usdc: 输入的 stgUSDC 数量，如果不指定则使用全部余额
+    pacer: 步骤节奏器（可选），发送交易前等待上一步确认和抖动窗口
+    ledger: 余额账本（可选），提供时余额和授权额度从账本读取，回执到达后更新账本
+    成功返回交易回执，失败返回 False
     """
     try:
         # 创建合约实例
-        stgusdc_contract = w3.eth.contract(address=STGUSDC_ADDRESS, abi=STGUSDC_ABI)
-        honey_contract = w3.eth.contract(address=HONEY_MINT_CONTRACT, abi=HONEY_MINT_ABI)
+        stgusdc_contract = w3.eth.contract(address=STGUSDC_ADDRESS, abi=load_abi('erc20'))
+        honey_contract = w3.eth.contract(address=HONEY_MINT_CONTRACT, abi=load_abi('honey_factory'))
         
-        # 获取 stgUSDC 余额
-        balance = stgusdc_contract.functions.balanceOf(account['address']).call()
-        print(f"stgUSDC 余额: {balance}")
+        # 获取 stgUSDC 余额（提供余额账本时直接读取账本）
+        if ledger:
+            balance = ledger.balance_of(STGUSDC_ADDRESS)
+        else:
+            balance = stgusdc_contract.functions.balanceOf(account['address']).call()
+        log.debug(f"stgUSDC 余额: {balance}")
         
         # 如果没有指定金额，使用全部余额
         amount = amount_in_usdc if amount_in_usdc is not None else balance
-        print(f"将要使用的 stgUSDC 数量: {amount}")
+        log.info(f"将要使用的 stgUSDC 数量: {amount}")
         
         # 检查并授权
-        if not check_and_approve_stgusdc(w3, account, stgusdc_contract, amount):
+        if not check_and_approve_stgusdc(w3, account, stgusdc_contract, amount, pacer, ledger):
             return False
             
         try:
@@ -141,56 +90,45 @@ def mint_honey(w3, account, amount_in_usdc=None):
                 STGUSDC_ADDRESS,
                 amount
             ).call()
-            print(f"预计可以获得的 honey 数量: {honey_amount}")
+            log.debug(f"预计可以获得的 honey 数量: {honey_amount}")
         except Exception as e:
-            print(f"预览 mint 数量失败: {str(e)}")
+            log.warning(f"预览 mint 数量失败: {str(e)}")
         
         # 构建 mint 交易
-        mint_txn = honey_contract.functions.mint(
-            STGUSDC_ADDRESS,
-            amount,
-            account['address']
-        ).build_transaction({
-            'from': account['address'],
-            'nonce': w3.eth.get_transaction_count(account['address']),
-            'gas': 300000,
-            'gasPrice': w3.eth.gas_price
-        })
+        mint_txn = assemble(w3, honey_contract, 'mint', [STGUSDC_ADDRESS, amount, account['address']],
+                            gas=300000, gas_price=gas_price(w3))
         
-        # 签名交易
-        signed_txn = w3.eth.account.sign_transaction(
-            mint_txn,
-            account['private_key']
-        )
-        
-        # 发送交易
-        tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-        print(f"Mint 交易已发送，哈希: {tx_hash.hex()}")
+        # 签名并发送交易
+        tx_hash = sign_and_send(w3, account, mint_txn, pacer, label='mint')
+        log.info(f"Mint 交易已发送，哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
         
         # 等待交易确认
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = wait_for_receipt(w3, tx_hash, ledger)
         if receipt['status'] == 1:
-            print(f"Mint 成功！交易哈希: {tx_hash.hex()}")
-            print(f"Gas 使用: {receipt['gasUsed']}")
-            return True
+            log.info(f"Mint 成功！交易哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
+            log.debug(f"Gas 使用: {receipt['gasUsed']}")
+            return receipt
         else:
-            print("Mint 失败！")
+            log.error("Mint 失败！", extra=failure_fields(reason=REVERTED))
             return False
             
     except Exception as e:
-        print(f"Mint 过程出错: {str(e)}")
+        log.error(f"Mint 过程出错: {str(e)}", extra=failure_fields(e))
         return False
 
 def main():
+    # 单独运行时只输出到控制台
+    setup_logging(console='lines')
+    
     # 设置 Web3
     w3 = Web3(Web3.HTTPProvider(RPC_URL))
     
     # 检查连接
     if not w3.is_connected():
-        print("无法连接到 Berachain 网络！")
+        log.error("无法连接到 Berachain 网络！")
         return
 
-    print("开始执行 Mint...")
+    log.info("开始执行 Mint...")
     # 这里仅作为单独测试使用
     test_account = {
         "private_key": "YOUR_PRIVATE_KEY",
@@ -199,9 +137,9 @@ def main():
     success = mint_honey(w3, test_account)
     
     if success:
-        print("Mint 执行完成！")
+        log.info("Mint 执行完成！")
     else:
-        print("Mint 执行失败！")
+        log.error("Mint 执行失败！")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+from eth_abi import encode as abi_encode
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+from web3 import Web3
+
+from common.abi_loader import load_abi
+from common.multicall import batch_call
+from common.tx_builder import chain_id
+
+log = logging.getLogger(__name__)
+
+# EIP-2612 permit 授权
+# 代币支持 permit 且目标合约提供接收签名授权的入口（如 Bend 的 supplyWithPermit）时，
+# 授权在本地离线签名，随主交易一起提交，每个步骤只需一笔交易，不再先发一笔 approve；
+# 每个代币是否支持 permit 只检测一次：读取 DOMAIN_SEPARATOR / nonces / name（以及 EIP-5267 的 eip712Domain），
+# 用本地计算的域分隔符与链上值比对，确认签名域（name、version）无误后缓存结果
+
+DOMAIN_TYPEHASH = Web3.keccak(
+    text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)")
+PERMIT_TYPES = {
+    "EIP712Domain": [
+        {"name": "name", "type": "string"},
+        {"name": "version", "type": "string"},
+        {"name": "chainId", "type": "uint256"},
+        {"name": "verifyingContract", "type": "address"},
+    ],
+    "Permit": [
+        {"name": "owner", "type": "address"},
+        {"name": "spender", "type": "address"},
+        {"name": "value", "type": "uint256"},
+        {"name": "nonce", "type": "uint256"},
+        {"name": "deadline", "type": "uint256"},
+    ],
+}
+# 签名授权的有效期（秒）
+PERMIT_TTL = 30 * 60
+# 未提供 eip712Domain 时尝试的版本号
+VERSION_CANDIDATES = ("1", "2")
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+_DOMAINS = {}
+_lock = threading.Lock()
+
+
+def domain_separator(name, version, chain, token):
+    """本地计算 EIP-712 域分隔符"""
+    return Web3.keccak(abi_encode(
+        ['bytes32', 'bytes32', 'bytes32', 'uint256', 'address'],
+        [DOMAIN_TYPEHASH, Web3.keccak(text=name), Web3.keccak(text=version), chain, Web3.to_checksum_address(token)]
+    ))
+
+
+def _detect(w3, token):
+    contract = w3.eth.contract(address=token, abi=load_abi('erc20_permit'))
+    name, separator, nonce, domain = batch_call(w3, [
+        (contract, 'name', []),
+        (contract, 'DOMAIN_SEPARATOR', []),
+        (contract, 'nonces', [ZERO_ADDRESS]),
+        (contract, 'eip712Domain', []),
+    ])
+    if separator is None or nonce is None:
+        return None
+    chain = chain_id(w3)
+    candidates = []
+    if domain is not None:
+        candidates.append((domain[1], domain[2]))
+    if name is not None:
+        candidates.extend((name, version) for version in VERSION_CANDIDATES)
+    for candidate_name, version in candidates:
+        if domain_separator(candidate_name, version, chain, token) == bytes(separator):
+            return {"name": candidate_name, "version": version, "chainId": chain, "verifyingContract": token}
+    log.debug(f"代币 {token} 的 DOMAIN_SEPARATOR 与本地计算不一致，不使用 permit")
+    return None
+
+
+def permit_domain(w3, token):
+    """
+    代币的 EIP-712 签名域，不支持 permit 时返回 None
+    每个代币只检测一次，结果缓存（检测出错时不缓存，下次重试）
+    """
+    key = token.lower()
+    with _lock:
+        if key in _DOMAINS:
+            return _DOMAINS[key]
+    try:
+        domain = _detect(w3, Web3.to_checksum_address(token))
+    except Exception as e:
+        log.debug(f"检测代币 {token} 的 permit 支持失败: {str(e)}")
+        return None
+    with _lock:
+        _DOMAINS[key] = domain
+    log.info(f"代币 {token} {'支持' if domain else '不支持'} EIP-2612 permit")
+    return domain
+
+
+def sign_permit(w3, account, token, spender, value, deadline=None):
+    """
+    离线签名 permit 授权，返回 (deadline, v, r, s)；代币不支持 permit 时返回 None
+    nonce 从代币合约读取（一次 eth_call）
+    """
+    domain = permit_domain(w3, token)
+    if domain is None:
+        return None
+    owner = Web3.to_checksum_address(account['address'])
+    contract = w3.eth.contract(address=domain['verifyingContract'], abi=load_abi('erc20_permit'))
+    nonce = contract.functions.nonces(owner).call()
+    if deadline is None:
+        deadline = int(time.time()) + PERMIT_TTL
+    message = encode_typed_data(full_message={
+        "types": PERMIT_TYPES,
+        "primaryType": "Permit",
+        "domain": domain,
+        "message": {"owner": owner, "spender": Web3.to_checksum_address(spender),
+                    "value": value, "nonce": nonce, "deadline": deadline},
+    })
+    signed = Account.sign_message(message, account['private_key'])
+    return deadline, signed.v, signed.r.to_bytes(32, 'big'), signed.s.to_bytes(32, 'big')
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from common.multicall import batch_call
+from common.rpc_cassette import isolated_path
+from bera_ledger import BERA_ADDRESS, HONEY_ADDRESS, STGUSDC_ADDRESS
+
+log = logging.getLogger(__name__)
+
+# BERA -> stgUSDC 报价引擎
+# 一次 Multicall 批量对所有候选池子 / 多跳路径调用 previewMultiSwap，选择输出最多的路径；
+# previewMultiSwap 失败时用最近成功报价的兑换比例推算保底 min_out，不再使用固定常量
+
+SLIPPAGE = 0.05           # 滑点容忍度 5%
+HISTORY_SIZE = 20         # 每条路径保留的最近成功报价数
+HISTORY_MAX_AGE = 3600    # 超过该时间（秒）的历史报价不用于推算保底值
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quote_history.json")
+
+
+def _step(pool_idx, base, quote, is_buy=True):
+    return {"poolIdx": pool_idx, "base": base, "quote": quote, "isBuy": is_buy}
+
+
+# 候选路径：不同池子模板的直连池，以及经 HONEY 中转的两跳路径
+# base 为地址较小的代币，isBuy=True 表示支付 base 换取 quote
+CANDIDATE_ROUTES = {
+    "direct-36000": [_step(36000, BERA_ADDRESS, STGUSDC_ADDRESS)],
+    "direct-36001": [_step(36001, BERA_ADDRESS, STGUSDC_ADDRESS)],
+    "direct-36002": [_step(36002, BERA_ADDRESS, STGUSDC_ADDRESS)],
+    "via-honey-36000": [
+        _step(36000, BERA_ADDRESS, HONEY_ADDRESS),
+        _step(36000, HONEY_ADDRESS, STGUSDC_ADDRESS)
+    ],
+}
+
+
+class QuoteEngine:
+    """
+    多路径报价引擎
+    swap_contract: 含 previewMultiSwap 的 Swap 合约实例
+    routes: {路径名: steps}，默认使用 CANDIDATE_ROUTES
+    history_file: 报价历史文件，为 None 时只在内存中保留（RPC 回放时使用）
+    """
+
+    def __init__(self, w3, swap_contract, routes=None, history_file=HISTORY_FILE):
+        self.w3 = w3
+        self.contract = swap_contract
+        self.routes = routes or CANDIDATE_ROUTES
+        self.history_file = history_file
+        self._lock = threading.Lock()
+        self._history = self._load_history()
+
+    def _load_history(self):
+        if not self.history_file:
+            return {}
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_history(self):
+        if not self.history_file:
+            return
+        try:
+            tmp_path = f"{self.history_file}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._history, f)
+            os.replace(tmp_path, self.history_file)
+        except OSError as e:
+            log.warning(f"保存报价历史失败: {str(e)}")
+
+    def quote_all(self, amount):
+        """
+        对全部候选路径报价（一次批量调用），返回 {路径名: out}，报价失败的路径不包含在内
+        每次 Swap 的金额都是随机的，报价不做缓存（输出与金额不成线性关系，不能按比例换算）
+        """
+        names = list(self.routes)
+        calls = [(self.contract, 'previewMultiSwap', [self.routes[name], amount]) for name in names]
+        results = batch_call(self.w3, calls)
+        quotes = {name: result[0] for name, result in zip(names, results) if result and result[0] > 0}
+
+        with self._lock:
+            now = time.time()
+            for name, out in quotes.items():
+                entries = self._history.setdefault(name, [])
+                entries.append([now, out / amount])
+                del entries[:-HISTORY_SIZE]
+            if quotes:
+                self._save_history()
+        return quotes
+
+    def fallback_quote(self):
+        """
+        用最近成功报价推算：返回 (路径名, 兑换比例)，按最近报价中比例中位数最高的路径；没有可用历史时返回 (None, None)
+        """
+        cutoff = time.time() - HISTORY_MAX_AGE
+        best_name, best_ratio = None, None
+        with self._lock:
+            for name, entries in self._history.items():
+                if name not in self.routes:
+                    continue
+                ratios = sorted(ratio for ts, ratio in entries if ts >= cutoff)
+                if not ratios:
+                    continue
+                median = ratios[len(ratios) // 2]
+                if best_ratio is None or median > best_ratio:
+                    best_name, best_ratio = name, median
+        return best_name, best_ratio
+
+    def best_route(self, amount):
+        """
+        选择输出最多的路径
+        返回 (路径名, steps, 预期输出, 考虑滑点后的 min_out)；报价和历史都不可用时返回 None
+        """
+        try:
+            quotes = self.quote_all(amount)
+        except Exception as e:
+            log.warning(f"批量报价失败：{str(e)}")
+            quotes = {}
+
+        if quotes:
+            for name, out in sorted(quotes.items(), key=lambda item: -item[1]):
+                log.debug(f"路径 {name} 预期输出: {out}")
+            name = max(quotes, key=quotes.get)
+            out = quotes[name]
+            return name, self.routes[name], out, int(out * (1 - SLIPPAGE))
+
+        name, ratio = self.fallback_quote()
+        if name is None:
+            log.warning("所有路径报价失败，且没有最近的成功报价可供参考")
+            return None
+        out = int(amount * ratio)
+        log.warning(f"所有路径报价失败，按最近成功报价推算路径 {name} 预期输出: {out}")
+        return name, self.routes[name], out, int(out * (1 - SLIPPAGE))
+
+
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
+_HISTORY_FILE = {"path": None, "configured": False}
+
+
+def configure_quote_history(path):
+    """设置报价历史文件（--quote-history），需在第一次报价之前调用；None 表示只在内存中保留"""
+    with _ENGINES_LOCK:
+        _HISTORY_FILE.update(path=path, configured=True)
+
+
+def get_quote_engine(w3, swap_contract):
+    """
+    获取 Swap 合约对应的共享报价引擎（同一进程内所有账户共享报价历史）
+    没有调用 configure_quote_history 时（例如跨链运行器）使用默认文件，录制 / 回放时同样与正式运行隔离
+    """
+    with _ENGINES_LOCK:
+        engine = _ENGINES.get(swap_contract.address)
+        if engine is None:
+            history_file = (_HISTORY_FILE["path"] if _HISTORY_FILE["configured"]
+                            else isolated_path(HISTORY_FILE, 'quote_history.json'))
+            engine = QuoteEngine(w3, swap_contract, history_file=history_file)
+            _ENGINES[swap_contract.address] = engine
+        return engine
+
+
+def add_quote_arguments(parser):
+    """向命令行解析器添加报价相关参数"""
+    parser.add_argument('--quote-history', default=HISTORY_FILE,
+                        help=f'最近成功报价的历史文件，报价失败时用于推算保底 min_out，默认 {HISTORY_FILE}')
@@ -0,0 +1,22 @@
+from web3 import Web3
+
+from common.rate_limit import install_rate_limiter
+from common.rpc_cassette import wrap_provider
+from common.ws_heads import create_provider
+
+# RPC 连接
+# 单独成模块，入口脚本建立连接时不需要导入任何步骤模块
+
+RPC_URL = "https://bartio.rpc.berachain.com/"
+
+
+def setup_web3(read_rate=None, write_rate=None, ws_url=None, ws_transport=False, rpc_url=RPC_URL):
+    """
+    初始化 Web3，并安装端点共享的 RPC 限流器
+    ws_url / ws_transport: 指定 WebSocket 地址且开启 ws_transport 时 RPC 请求改走 WebSocket
+    rpc_url: HTTP RPC 地址，默认 bArtio 公共节点
+    开启 --record-rpc / --replay-rpc 时 provider 被替换为录制 / 回放 provider
+    """
+    w3 = Web3(wrap_provider(create_provider(rpc_url, ws_url, ws_transport)))
+    install_rate_limiter(w3, ws_url if ws_url and ws_transport else rpc_url, read_rate, write_rate)
+    return w3
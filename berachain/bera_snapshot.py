@@ -0,0 +1,191 @@
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from web3 import Web3
+
+import repo_path  # noqa: F401  仓库根目录加入模块搜索路径（共享包 common）
+from common.abi_loader import load_abi
+from common.account_source import add_source_arguments, iter_accounts
+from bera_ledger import STGUSDC_ADDRESS, HONEY_ADDRESS, BHONEY_ADDRESS, BEND_CONTRACT, STAKE_CONTRACT
+from bera_rpc import RPC_URL, setup_web3
+from common.multicall import MAX_CALLS_PER_BATCH, batch_call, eth_balance_call
+from common.rate_limit import add_rate_limit_arguments, print_limiter_stats
+from common.structured_log import add_logging_arguments, setup_logging
+
+log = logging.getLogger('bera_snapshot')
+
+# 账户群资产快照
+# 按批次通过 Multicall3 读取全部账户的原生 BERA、stgUSDC、HONEY、bHONEY、已质押 bHONEY、Bend 存款，
+# 以及（可选）Humanity 合约中的 userBuffer；所有批次固定在同一区块读取，多个批次并发请求；
+# 结果放入 NumPy 数组统一汇总（合计、均值、gas 不足的账户），可以导出为 CSV 或 Parquet
+
+# Bend（Aave v3）getUserAccountData 的金额以 8 位小数的美元计价
+BEND_BASE_DECIMALS = 8
+WEI = 10 ** 18
+
+# 每个账户在 Berachain 上的调用：(列名, 合约地址, ABI 名, 函数名)
+TOKEN_COLUMNS = [
+    ('stgusdc', STGUSDC_ADDRESS, 'erc20', 'balanceOf'),
+    ('honey', HONEY_ADDRESS, 'erc20', 'balanceOf'),
+    ('bhoney', BHONEY_ADDRESS, 'erc20', 'balanceOf'),
+    ('staked_bhoney', STAKE_CONTRACT, 'berps_stake', 'balanceOf'),
+]
+COLUMNS = ['bera'] + [name for name, _, _, _ in TOKEN_COLUMNS] + ['bend_supplied_usd', 'humanity_buffer']
+
+
+def _account_calls(w3, contracts, address):
+    owner = Web3.to_checksum_address(address)
+    calls = [eth_balance_call(w3, owner)]
+    calls.extend((contracts[name], fn_name, [owner]) for name, _, _, fn_name in TOKEN_COLUMNS)
+    calls.append((contracts['bend'], 'getUserAccountData', [owner]))
+    return calls
+
+
+def _to_float(value, decimals=18):
+    """最小单位整数转换为浮点数，调用失败（None）记为 NaN"""
+    return np.nan if value is None else value / 10 ** decimals
+
+
+def read_berachain(w3, addresses, block, workers):
+    """
+    读取 Berachain 上的余额，返回 {列名: float64 数组}（以代币为单位，调用失败的位置为 NaN）
+    每批包含 MAX_CALLS_PER_BATCH 个调用，批次之间并发，全部在同一区块执行
+    """
+    contracts = {name: w3.eth.contract(address=address, abi=load_abi(abi_name))
+                 for name, address, abi_name, _ in TOKEN_COLUMNS}
+    contracts['bend'] = w3.eth.contract(address=BEND_CONTRACT, abi=load_abi('bend_pool'))
+
+    per_account = 2 + len(TOKEN_COLUMNS)
+    batch_size = max(1, MAX_CALLS_PER_BATCH // per_account)
+    batches = [addresses[start:start + batch_size] for start in range(0, len(addresses), batch_size)]
+
+    def read(batch):
+        calls = [call for address in batch for call in _account_calls(w3, contracts, address)]
+        try:
+            return batch_call(w3, calls, block_identifier=block)
+        except Exception as e:
+            log.warning(f"批量读取失败（{len(batch)} 个账户）: {str(e)}")
+            return [None] * len(calls)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = [value for batch_results in pool.map(read, batches) for value in batch_results]
+
+    rows = [results[i:i + per_account] for i in range(0, len(results), per_account)]
+    columns = {'bera': np.array([_to_float(row[0]) for row in rows], dtype=np.float64)}
+    for offset, (name, _, _, _) in enumerate(TOKEN_COLUMNS, start=1):
+        columns[name] = np.array([_to_float(row[offset]) for row in rows], dtype=np.float64)
+    columns['bend_supplied_usd'] = np.array(
+        [_to_float(row[-1][0] if row[-1] is not None else None, BEND_BASE_DECIMALS) for row in rows],
+        dtype=np.float64)
+    return columns
+
+
+def read_humanity_buffer(addresses, read_rate, write_rate):
+    """读取 Humanity 合约中每个账户的 userBuffer（HUM），通过 Humanity 的任务模块建立连接"""
+    from common.task_runtime import load_chain
+    from humanity_preflight import Preflight
+
+    spec = load_chain('humanity')
+    w3 = spec.connect(read_rate, write_rate)
+    contract = spec.setup(w3)['contract']
+    preflight = Preflight(w3, contract, None)
+    values = []
+    for start in range(0, len(addresses), MAX_CALLS_PER_BATCH):
+        calls = [(contract, 'userBuffer', [Web3.to_checksum_address(address)])
+                 for address in addresses[start:start + MAX_CALLS_PER_BATCH]]
+        values.extend(preflight.read_calls(calls))
+    return np.array([_to_float(value) for value in values], dtype=np.float64)
+
+
+def summarize(addresses, columns, min_gas, top=20):
+    """汇总全部账户：各列合计 / 均值 / 读取失败数，以及原生 BERA 低于 min_gas 的账户"""
+    log.info(f"账户数: {len(addresses)}")
+    for name in COLUMNS:
+        values = columns[name]
+        log.info(f"{name:>18}: 合计 {np.nansum(values):.4f}，均值 {np.nanmean(values) if np.isfinite(values).any() else 0:.4f}，"
+                 f"非零 {int((values > 0).sum())}，读取失败 {int(np.isnan(values).sum())}")
+
+    underfunded = np.flatnonzero(columns['bera'] < min_gas)
+    if len(underfunded):
+        log.warning(f"{len(underfunded)} 个账户的 BERA 低于 {min_gas}，不足以支付 gas")
+        for i in underfunded[np.argsort(columns['bera'][underfunded])][:top]:
+            log.warning(f"  {addresses[i]}  BERA {columns['bera'][i]:.6f}")
+    return underfunded
+
+
+def export(path, addresses, columns, min_gas):
+    """按扩展名导出为 CSV 或 Parquet（Parquet 需要安装 pyarrow）"""
+    underfunded = columns['bera'] < min_gas
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+        table = pa.table({'address': addresses, **{name: columns[name] for name in COLUMNS},
+                          'underfunded': underfunded})
+        pq.write_table(table, path)
+        return
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['address'] + COLUMNS + ['underfunded'])
+        for i, address in enumerate(addresses):
+            writer.writerow([address] + ['' if np.isnan(columns[name][i]) else repr(float(columns[name][i]))
+                                         for name in COLUMNS] + [bool(underfunded[i])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='账户群资产快照')
+    parser.add_argument('config', help='账户文件（.yaml / .jsonl / .csv / .acct）或 keystore 目录')
+    parser.add_argument('--output', default=None, help='导出文件，扩展名为 .csv 或 .parquet')
+    parser.add_argument('--min-gas', type=float, default=0.05,
+                        help='BERA 低于该值的账户标记为 gas 不足，默认 0.05')
+    parser.add_argument('--humanity', action='store_true', help='同时读取 Humanity 合约中的 userBuffer')
+    parser.add_argument('--workers', type=int, default=8, help='并发请求的批次数，默认 8')
+    parser.add_argument('--top', type=int, default=20, help='最多列出多少个 gas 不足的账户，默认 20')
+    parser.add_argument('--rpc-url', default=RPC_URL, help=f'HTTP RPC 地址，默认 {RPC_URL}')
+    add_source_arguments(parser)
+    add_rate_limit_arguments(parser)
+    add_logging_arguments(parser, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'snapshot.jsonl'))
+    args = parser.parse_args()
+
+    setup_logging(args.log_file, args.log_level, args.console)
+
+    try:
+        addresses = [account['address'] for account in iter_accounts(
+            args.config, args.account_cache, args.keystore_password_file, args.keystore_agent)]
+    except Exception as e:
+        log.error(f"加载账户失败: {str(e)}")
+        sys.exit(1)
+
+    w3 = setup_web3(args.rpc_read_rate, args.rpc_write_rate, rpc_url=args.rpc_url)
+    started = time.monotonic()
+    block = w3.eth.block_number
+    columns = read_berachain(w3, addresses, block, args.workers)
+    log.info(f"Berachain 区块 {block}：读取 {len(addresses)} 个账户用时 {time.monotonic() - started:.1f} 秒")
+    if args.humanity:
+        try:
+            columns['humanity_buffer'] = read_humanity_buffer(addresses, args.rpc_read_rate, args.rpc_write_rate)
+        except Exception as e:
+            log.error(f"读取 Humanity buffer 失败: {str(e)}")
+    columns.setdefault('humanity_buffer', np.full(len(addresses), np.nan))
+
+    summarize(addresses, columns, args.min_gas, args.top)
+    if args.output:
+        try:
+            export(args.output, addresses, columns, args.min_gas)
+            log.info(f"已导出 {args.output}")
+        except Exception as e:
+            log.error(f"导出失败: {str(e)}")
+    print_limiter_stats()
+
+
+if __name__ == "__main__":
+    # 用法: python berachain/bera_snapshot.py accounts.jsonl --output snapshot.parquet --humanity
+    main()
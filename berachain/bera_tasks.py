@@ -0,0 +1,95 @@
+import importlib
+import logging
+
+from bera_rpc import setup_web3
+from bera_ledger import BalanceLedger, STGUSDC_ADDRESS, HONEY_ADDRESS, BHONEY_ADDRESS
+from common.task_runtime import register_chain, register_task
+
+log = logging.getLogger(__name__)
+
+# Berachain 任务注册
+# 把 Swap / Mint / Bend / BERPS / Stake 注册到统一任务运行时，bera_auto 和跨链调度器共用同一份任务定义；
+# 每个账户的任务共享同一个余额账本，HONEY 在 Bend 和 BERPS 之间的分配由辅助任务 split 预先确定
+
+CHAIN = 'berachain'
+
+
+def lazy_step(module_name, func_name):
+    """步骤函数第一次被调用时才导入所在模块，只执行部分步骤（例如 --step 5）时不加载其余步骤模块"""
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module_name), func_name)(*args, **kwargs)
+    return call
+
+# 子脚本中的步骤函数（按需导入）
+swap_bera_to_stgusdc = lazy_step('bera_swap', 'swap_bera_to_stgusdc')
+mint_honey = lazy_step('bera_mint_honey', 'mint_honey')
+supply_honey = lazy_step('bera_bend_supply', 'supply_honey')
+pick_supply_amount = lazy_step('bera_bend_supply', 'pick_supply_amount')
+deposit_honey = lazy_step('bera_berps_deposit', 'deposit_honey')
+pick_deposit_amount = lazy_step('bera_berps_deposit', 'pick_deposit_amount')
+stake_bhoney = lazy_step('bera_berps_stake', 'stake_bhoney')
+
+
+def split_honey(w3, ledger, amounts, available=None):
+    """
+    按账本中的 HONEY 余额预先分配 Bend 和 BERPS 两个并发分支各自使用的数量
+    分配规则与顺序执行时一致：先按余额确定 Bend 数量，BERPS 数量按剩余余额确定
+    available: 可分配的 HONEY 数量（最小单位），多轮模式下为本轮 Mint 实际收到的数量，默认使用全部余额
+    """
+    if available is None:
+        available = ledger.balance_of(HONEY_ADDRESS)
+    balance_in_honey = float(w3.from_wei(available, 'ether'))
+    amounts['bend'] = pick_supply_amount(balance_in_honey)
+    amounts['berps'] = pick_deposit_amount(balance_in_honey - amounts['bend'])
+    log.info(f"HONEY 分配: Bend {amounts['bend']}，BERPS {amounts['berps']}")
+    return True
+
+
+def stake_amount(w3, received_bhoney):
+    """多轮模式下本轮要质押的 bHONEY（以 ether 为单位），单轮模式返回 None 表示使用全部余额"""
+    return None if received_bhoney is None else w3.from_wei(received_bhoney, 'ether')
+
+
+def received(ctx, key, token):
+    """多轮模式下本轮任务 key 的回执中实际收到的 token 数量；单轮模式沿用原有逻辑（使用全部余额），返回 None"""
+    return ctx.state['ledger'].received(ctx.receipts[key], token) if ctx.cycle is not None else None
+
+
+def prepare(ctx):
+    """流水线开始时一次批量读取全部余额和授权额度，之后由回执日志增量更新"""
+    ctx.state['ledger'] = BalanceLedger(ctx.w3, ctx.account['address']).snapshot()
+    ctx.state['amounts'] = {}
+
+
+register_chain(CHAIN, setup_web3, prepare=prepare)
+
+
+@register_task(CHAIN, 'swap', "Swap BERA 到 stgUSDC", 1, outputs=["stgUSDC"])
+def swap_task(ctx, pacer):
+    return swap_bera_to_stgusdc(ctx.w3, ctx.account, pacer=pacer, ledger=ctx.state['ledger'])
+
+
+@register_task(CHAIN, 'mint', "将 stgUSDC 换成 HONEY", 2, inputs=["stgUSDC"], outputs=["HONEY"])
+def mint_task(ctx, pacer):
+    return mint_honey(ctx.w3, ctx.account, received(ctx, 'swap', STGUSDC_ADDRESS), pacer, ctx.state['ledger'])
+
+
+@register_task(CHAIN, 'split', "拆分 HONEY", inputs=["HONEY"], outputs=["HONEY:bend", "HONEY:berps"])
+def split_task(ctx, pacer):
+    return split_honey(ctx.w3, ctx.state['ledger'], ctx.state['amounts'], received(ctx, 'mint', HONEY_ADDRESS))
+
+
+@register_task(CHAIN, 'bend', "向 Bend 协议质押 HONEY", 3, inputs=["HONEY:bend"])
+def bend_task(ctx, pacer):
+    return supply_honey(ctx.w3, ctx.account, ctx.state['amounts']['bend'], pacer, ctx.state['ledger'])
+
+
+@register_task(CHAIN, 'berps', "向 BERPS 协议质押 HONEY", 4, inputs=["HONEY:berps"], outputs=["bHONEY"])
+def berps_task(ctx, pacer):
+    return deposit_honey(ctx.w3, ctx.account, ctx.state['amounts']['berps'], pacer, ctx.state['ledger'])
+
+
+@register_task(CHAIN, 'stake', "质押 bHONEY", 5, inputs=["bHONEY"])
+def stake_task(ctx, pacer):
+    amount = stake_amount(ctx.w3, received(ctx, 'berps', BHONEY_ADDRESS))
+    return stake_bhoney(ctx.w3, ctx.account, amount, pacer, ctx.state['ledger'])
@@ -0,0 +1,53 @@
+from common.broadcast import record_inclusion, send_raw_transaction
+from common.nonce import NONCES
+from common.tx_builder import sign
+from common.ws_heads import wait_for_transaction_receipt
+from common.tx_journal import current_journal, REJECTED
+
+# 交易发送
+# 所有步骤统一通过 sign_and_send 签名和发送交易：
+# 交易在调用前已由 tx_builder.assemble 在本地组装好（不含 nonce），这里等待节奏器后再分配本地 nonce、签名，写入交易日志后发送
+# （配置了 --broadcast-rpc 时同时提交给多个节点）；
+# 回执统一通过 wait_for_receipt 获取（配置了 WebSocket 时由新区块驱动），同时更新余额账本
+
+
+def sign_and_send(w3, account, transaction, pacer=None, label=None):
+    """
+    签名并发送交易，返回交易哈希
+    w3: Web3 实例
+    account: 账户信息 dict，包含 private_key 和 address
+    transaction: tx_builder.assemble 组装好的交易（不需要 nonce）
+    pacer: 步骤节奏器（可选），发送前等待上一步确认和抖动窗口
+    label: 写入交易日志的说明（可选）
+    发送失败时抛出异常，已分配的 nonce 会被归还
+    """
+    if pacer:
+        pacer.wait()
+    journal = current_journal()
+    with NONCES.reserve(w3, account['address']) as nonce:
+        transaction = dict(transaction, nonce=nonce)
+        signed_txn = sign(account, transaction)
+        if journal:
+            journal.record(account['address'], nonce, signed_txn.hash, signed_txn.rawTransaction, label)
+        try:
+            return send_raw_transaction(w3, signed_txn.rawTransaction, signed_txn.hash)
+        except Exception as e:
+            if journal and 'already known' not in str(e):
+                journal.finish(signed_txn.hash, REJECTED)
+            raise
+
+
+def wait_for_receipt(w3, tx_hash, ledger=None, value=0):
+    """
+    等待交易回执
+    ledger: 余额账本（可选），拿到回执后按 Transfer / Approval 日志更新
+    value: 交易附带的原生代币数量，用于更新账本中的 BERA 余额
+    """
+    receipt = wait_for_transaction_receipt(w3, tx_hash)
+    record_inclusion(receipt)
+    journal = current_journal()
+    if journal:
+        journal.finish_receipt(receipt)
+    if ledger:
+        ledger.apply_receipt(receipt, value)
+    return receipt
@@ -0,0 +1,2 @@
+# Berachain 与 Humanity 脚本共用的模块：账户加载、分片与租约、限流、节奏、nonce、交易组装 / 日志 / 广播、
+# 依赖图执行、统一任务运行时、RPC 录制回放、失败隔离和结构化日志等
@@ -0,0 +1,16 @@
+import json
+import os
+from functools import lru_cache
+
+# 合约 ABI 数据文件
+# ABI 以 JSON 文件存放在 abi/ 目录，第一次用到某个合约时才读取，之后复用同一份解析结果；
+# 导入模块时不再构建大段 ABI 字面量，本次运行用不到的 ABI 不会被加载
+
+ABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "abi")
+
+
+@lru_cache(maxsize=None)
+def load_abi(name):
+    """读取 abi/<name>.json（结果缓存，调用方不要修改返回的列表）"""
+    with open(os.path.join(ABI_DIR, f"{name}.json"), 'r', encoding='utf-8') as f:
+        return json.load(f)
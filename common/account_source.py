@@ -0,0 +1,189 @@
+import csv
+import json
+import logging
+import marshal
+import os
+import re
+import struct
+import sys
+
+# 账户来源
+# 账户很多时一次性解析整个 YAML 既慢又占内存，这里提供可插拔的账户来源，全部以生成器的方式逐条产出：
+# - .yaml / .yml：原有配置格式（顶层 accounts 列表，或单账户的 berachain 配置）
+# - .jsonl：每行一个 JSON 账户对象，流式读取
+# - .csv：首行为表头（address,private_key[,name]），流式读取
+# - .acct：由 compile_accounts 生成的二进制缓存，记录已经校验过，按条读取
+# - 目录：以太坊标准 keystore 目录，并行解密（见 keystore.py），私钥不落盘
+
+CACHE_MAGIC = b'ACCTCACHE1\n'
+_RECORD_HEADER = struct.Struct('>I')
+
+_ADDRESS_RE = re.compile(r'^0x[0-9a-fA-F]{40}$')
+_PRIVATE_KEY_RE = re.compile(r'^(0x)?[0-9a-fA-F]{64}$')
+
+log = logging.getLogger(__name__)
+
+
+def validate_account(raw):
+    """
+    校验并规范化单个账户记录
+    返回只包含已知字段的新 dict，校验失败抛出 ValueError
+    """
+    if not isinstance(raw, dict):
+        raise ValueError(f"账户记录必须是对象: {raw!r}")
+    address = str(raw.get('address') or '').strip()
+    private_key = str(raw.get('private_key') or '').strip()
+    if not _ADDRESS_RE.match(address):
+        raise ValueError(f"地址格式不正确: {address!r}")
+    if not _PRIVATE_KEY_RE.match(private_key):
+        raise ValueError(f"账户 {address} 的私钥格式不正确")
+    return {
+        "name": str(raw.get('name') or address),
+        "address": address,
+        "private_key": private_key
+    }
+
+
+def _yaml_records(path):
+    # YAML 无法逐条解析，这里整体读入（优先使用 libyaml 的 C 实现），大批量账户建议使用 JSONL 或缓存
+    # 只有 YAML 来源才需要 pyyaml，其他来源启动时不导入
+    import yaml
+
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path, 'r', encoding='utf-8') as f:
+        config = yaml.load(f, Loader=loader) or {}
+    if 'accounts' in config:
+        return config['accounts']
+    if 'berachain' in config:
+        return [config['berachain']]
+    raise ValueError("配置文件中缺少 accounts 配置")
+
+
+def _jsonl_records(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                log.warning(f"第 {line_no} 行 JSON 解析失败，跳过: {str(e)}")
+
+
+def _csv_records(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def _cache_records(path):
+    with open(path, 'rb') as f:
+        if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+            raise ValueError(f"不是有效的账户缓存文件: {path}")
+        while True:
+            header = f.read(_RECORD_HEADER.size)
+            if not header:
+                return
+            (size,) = _RECORD_HEADER.unpack(header)
+            yield marshal.loads(f.read(size))
+
+
+_READERS = {
+    '.yaml': _yaml_records,
+    '.yml': _yaml_records,
+    '.jsonl': _jsonl_records,
+    '.csv': _csv_records,
+    '.acct': _cache_records,
+}
+
+
+def _reader_for(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _READERS:
+        raise ValueError(f"不支持的账户文件格式: {ext}")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到账户文件: {path}")
+    return _READERS[ext]
+
+
+def iter_accounts(path, cache_path=None, password_file=None, agent_socket=None):
+    """
+    按需逐条读取账户
+    path: 账户文件路径，格式由扩展名决定；为目录时按 keystore 目录处理
+    cache_path: 二进制缓存路径（可选），缓存比源文件新时直接读取缓存，否则先重新编译缓存
+    password_file / agent_socket: 仅 keystore 目录使用，分别为密码文件和常驻 agent 的 socket 路径
+    文件不存在或格式不支持时立即抛出异常；返回的生成器遇到无效记录会记录原因并跳过，不会中断整个批次
+    """
+    if os.path.isdir(path):
+        # 延迟导入，不使用 keystore 时不需要 eth_account 和进程池
+        from .keystore import load_keystore_accounts, resolve_password
+
+        if cache_path:
+            log.warning("keystore 目录不支持账户缓存（缓存会以明文保存私钥），已忽略 --account-cache")
+        password = resolve_password(password_file)
+        return _validated(load_keystore_accounts(path, password, agent_socket))
+
+    reader = _reader_for(path)
+    if cache_path:
+        if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(path):
+            count = compile_accounts(path, cache_path)
+            log.info(f"已重新生成账户缓存 {cache_path}（{count} 个账户）")
+        return _cache_records(cache_path)
+    if reader is _cache_records:
+        return _cache_records(path)
+    return _validated(reader(path))
+
+
+def _validated(records):
+    for raw in records:
+        try:
+            yield validate_account(raw)
+        except ValueError as e:
+            log.warning(f"跳过无效账户: {str(e)}")
+
+
+def compile_accounts(path, cache_path):
+    """
+    把账户文件校验后编译为二进制缓存
+    缓存以明文保存私钥，文件权限为 0600（仅当前用户可读写）；先写临时文件再原子替换，返回写入的账户数量
+    """
+    reader = _reader_for(path)
+    tmp_path = f"{cache_path}.tmp"
+    count = 0
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # 临时文件可能是上次中断时留下的，mode 参数只对新建文件生效
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, 'wb') as out:
+        out.write(CACHE_MAGIC)
+        for raw in reader(path):
+            try:
+                account = validate_account(raw)
+            except ValueError as e:
+                log.warning(f"跳过无效账户: {str(e)}")
+                continue
+            data = marshal.dumps(account)
+            out.write(_RECORD_HEADER.pack(len(data)))
+            out.write(data)
+            count += 1
+    os.replace(tmp_path, cache_path)
+    return count
+
+
+def add_source_arguments(parser):
+    """向命令行解析器添加账户来源相关参数"""
+    parser.add_argument('--account-cache', default=None,
+                        help='账户二进制缓存路径（.acct），源文件未变化时跳过解析和校验')
+    parser.add_argument('--keystore-password-file', default=None,
+                        help='keystore 密码文件（账户来源为 keystore 目录时使用，也可用环境变量 KEYSTORE_PASSWORD）')
+    parser.add_argument('--keystore-agent', default=None,
+                        help='常驻 keystore agent 的 Unix socket 路径，可用时直接获取已解密账户')
+
+
+if __name__ == "__main__":
+    # 用法（在仓库根目录执行）: python -m common.account_source accounts.yaml accounts.acct
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if len(sys.argv) != 3:
+        log.error("用法: python -m common.account_source <账户文件> <缓存文件.acct>")
+        sys.exit(1)
+    total = compile_accounts(sys.argv[1], sys.argv[2])
+    log.info(f"已编译 {total} 个账户到 {sys.argv[2]}")
@@ -0,0 +1,173 @@
+import atexit
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from web3 import Web3
+
+from .rate_limit import install_rate_limiter
+from .rpc_cassette import wrap_provider
+from .ws_heads import create_provider
+
+log = logging.getLogger(__name__)
+
+# 多节点广播
+# send_raw_transaction 只把交易发给一个节点，该节点传播慢时交易上链延迟，容易进入超时后提价重发的流程；
+# 配置了额外的广播节点时，已签名的交易同时提交给主节点和全部广播节点，任一节点接受（含 already known）即视为发送成功，
+# 其余节点的提交在后台继续完成；交易上链后记在最先接受该交易的节点名下，结束时按上链数和接受耗时对节点排序
+
+# 视为节点已持有该交易的错误信息
+KNOWN_MESSAGES = ('already known', 'known transaction', 'already imported', 'alreadyknown')
+# 等待上链的交易最多记录多少笔
+MAX_PENDING = 10000
+
+
+def _is_known(error):
+    message = str(error).lower()
+    return any(text in message for text in KNOWN_MESSAGES)
+
+
+def _hex(tx_hash):
+    return tx_hash.lower() if isinstance(tx_hash, str) else Web3.to_hex(tx_hash)
+
+
+def _endpoint(w3):
+    return getattr(w3.provider, 'endpoint_uri', None) or 'primary'
+
+
+class EndpointStats:
+    def __init__(self):
+        self.submitted = 0
+        self.accepted = 0
+        self.errors = 0
+        self.first = 0
+        self.included = 0
+        self.accept_seconds = 0.0
+        self.inclusion_seconds = 0.0
+
+
+class Broadcaster:
+    """
+    把已签名的交易同时提交给多个节点
+    endpoints: 额外的广播节点 Web3 实例（主节点由调用方传入）
+    """
+
+    def __init__(self, endpoints):
+        self.endpoints = list(endpoints)
+        self._pool = ThreadPoolExecutor(max_workers=max(4, 4 * (len(self.endpoints) + 1)),
+                                        thread_name_prefix='broadcast')
+        self._stats = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _stat(self, endpoint):
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = EndpointStats()
+        return stats
+
+    def _submit(self, w3, raw_transaction, started):
+        endpoint = _endpoint(w3)
+        try:
+            w3.eth.send_raw_transaction(raw_transaction)
+            error = None
+        except Exception as e:
+            error = None if _is_known(e) else e
+        elapsed = time.monotonic() - started
+        with self._lock:
+            stats = self._stat(endpoint)
+            stats.submitted += 1
+            if error is None:
+                stats.accepted += 1
+                stats.accept_seconds += elapsed
+            else:
+                stats.errors += 1
+        if error is not None:
+            log.debug(f"广播到 {endpoint} 失败: {str(error)}")
+        return endpoint, error
+
+    def send(self, w3, raw_transaction, tx_hash):
+        """
+        同时提交给主节点和全部广播节点，任一节点接受后立即返回交易哈希
+        全部节点都拒绝时抛出主节点的异常
+        """
+        started = time.monotonic()
+        futures = [self._pool.submit(self._submit, target, raw_transaction, started)
+                   for target in [w3] + self.endpoints]
+        errors = {}
+        for future in as_completed(futures):
+            endpoint, error = future.result()
+            if error is None:
+                with self._lock:
+                    self._stat(endpoint).first += 1
+                    if len(self._pending) >= MAX_PENDING:
+                        self._pending.pop(next(iter(self._pending)))
+                    self._pending[_hex(tx_hash)] = (endpoint, time.monotonic())
+                return tx_hash
+            errors[endpoint] = error
+        raise errors.get(_endpoint(w3)) or next(iter(errors.values()))
+
+    def record_inclusion(self, receipt):
+        """交易上链后调用，记在最先接受该交易的节点名下"""
+        with self._lock:
+            entry = self._pending.pop(_hex(receipt['transactionHash']), None)
+            if entry is None:
+                return
+            endpoint, accepted_at = entry
+            stats = self._stat(endpoint)
+            stats.included += 1
+            stats.inclusion_seconds += time.monotonic() - accepted_at
+
+    def report(self):
+        """按上链数（最先接受的交易）和平均接受耗时输出节点排名"""
+        with self._lock:
+            items = list(self._stats.items())
+        items.sort(key=lambda item: (-item[1].included,
+                                     item[1].accept_seconds / item[1].accepted if item[1].accepted else float('inf')))
+        for rank, (endpoint, stats) in enumerate(items, start=1):
+            accept = stats.accept_seconds / stats.accepted if stats.accepted else 0
+            inclusion = stats.inclusion_seconds / stats.included if stats.included else 0
+            log.info(f"[广播] #{rank} {endpoint}: 提交 {stats.submitted}，接受 {stats.accepted}，失败 {stats.errors}，"
+                     f"最先接受 {stats.first}，其中已上链 {stats.included}，"
+                     f"平均接受 {accept:.3f} 秒，接受到拿到回执平均 {inclusion:.1f} 秒")
+
+
+_BROADCASTER = None
+
+
+def configure_broadcast(args):
+    """
+    根据 --broadcast-rpc 配置额外的广播节点，每个节点使用各自端点共享的限流器
+    需在 configure_cassette 之后调用（录制 / 回放同样覆盖广播节点）
+    """
+    global _BROADCASTER
+    if not args.broadcast_rpc:
+        return None
+    endpoints = []
+    for url in args.broadcast_rpc:
+        w3 = Web3(wrap_provider(create_provider(url)))
+        install_rate_limiter(w3, url, getattr(args, 'rpc_read_rate', None), getattr(args, 'rpc_write_rate', None))
+        endpoints.append(w3)
+    _BROADCASTER = Broadcaster(endpoints)
+    atexit.register(_BROADCASTER.report)
+    log.info(f"交易同时广播到主节点和 {len(endpoints)} 个额外节点")
+    return _BROADCASTER
+
+
+def send_raw_transaction(w3, raw_transaction, tx_hash):
+    """发送已签名的交易：配置了广播节点时同时提交给全部节点，否则只发给主节点"""
+    if _BROADCASTER is None:
+        return w3.eth.send_raw_transaction(raw_transaction)
+    return _BROADCASTER.send(w3, raw_transaction, tx_hash)
+
+
+def record_inclusion(receipt):
+    if _BROADCASTER is not None:
+        _BROADCASTER.record_inclusion(receipt)
+
+
+def add_broadcast_arguments(parser):
+    """向命令行解析器添加多节点广播相关参数"""
+    parser.add_argument('--broadcast-rpc', action='append', default=[], metavar='URL',
+                        help='额外的广播节点 HTTP RPC 地址（可重复指定），已签名的交易同时提交给主节点和这些节点')
@@ -0,0 +1,208 @@
+import argparse
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+log = logging.getLogger(__name__)
+
+# 常驻模式
+# 进程启动后保持 web3 连接、合约对象、已解析/解密的账户列表等状态，通过本地 Unix socket 接收控制命令，
+# 调度器每次触发执行时只需发送一条 run 命令，不必重新启动 Python 进程、解析配置和派生私钥
+# 支持的命令: run（开始一轮执行）、status（查询进度）、reload（重新加载账户列表）、stop（当前一轮结束后退出）
+# 本模块只依赖标准库，客户端命令 `python -m common.daemon SOCKET status` 启动很快
+# socket 文件权限为 0600；连接还需通过认证：常驻进程启动时生成随机密钥写入 <socket>.key（0600），
+# 客户端读取该文件作为 authkey，其他用户即使能连接 socket 也无法发送命令
+
+
+def authkey_path(socket_path):
+    """常驻进程认证密钥文件的路径"""
+    return f"{socket_path}.key"
+
+
+def _write_authkey(socket_path):
+    authkey = secrets.token_bytes(32)
+    fd = os.open(authkey_path(socket_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(authkey)
+    return authkey
+
+
+def _read_authkey(socket_path):
+    with open(authkey_path(socket_path), 'rb') as f:
+        return f.read()
+
+
+class RunProgress:
+    """一轮执行的进度，由各工作线程更新"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.started = time.time()
+        self.finished = None
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.current = set()
+        self.error = None
+        self._lock = threading.Lock()
+
+    def start(self, name):
+        with self._lock:
+            self.current.add(name)
+
+    def finish(self, name, success):
+        """success: True 成功 / False 失败 / None 跳过"""
+        with self._lock:
+            self.current.discard(name)
+            if success is None:
+                self.skipped += 1
+            elif success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "running": self.finished is None,
+                "started": self.started,
+                "finished": self.finished,
+                "processed": self.succeeded + self.failed + self.skipped,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "current": sorted(self.current),
+                "error": self.error
+            }
+
+
+class RunDaemon:
+    """
+    常驻执行器
+    load_accounts(): 返回账户列表（reload 时重新调用），失败时抛出异常
+    run_accounts(accounts, progress): 执行一轮，在后台线程中调用
+    accounts: 启动时已加载的账户（可选），不传时调用 load_accounts
+    """
+
+    def __init__(self, load_accounts, run_accounts, accounts=None):
+        self.load_accounts = load_accounts
+        self.run_accounts = run_accounts
+        self.accounts = list(accounts if accounts is not None else load_accounts())
+        self.progress = None
+        self._run_count = 0
+        self._thread = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def _running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self, progress):
+        try:
+            self.run_accounts(self.accounts, progress)
+        except Exception as e:
+            progress.error = str(e)
+            log.error(f"第 {progress.run_id} 轮执行出错: {str(e)}")
+        finally:
+            progress.finished = time.time()
+            log.info(f"第 {progress.run_id} 轮执行结束: {json.dumps(progress.as_dict(), ensure_ascii=False)}")
+
+    def handle(self, request):
+        """处理一条控制命令，返回 dict"""
+        command = request.get("cmd") if isinstance(request, dict) else request
+        with self._lock:
+            if command == "run":
+                if self._running():
+                    return {"ok": False, "error": "上一轮仍在执行", "run_id": self.progress.run_id}
+                if self._stopping:
+                    return {"ok": False, "error": "常驻进程正在退出"}
+                self._run_count += 1
+                self.progress = RunProgress(self._run_count)
+                self._thread = threading.Thread(target=self._run, args=(self.progress,), daemon=True)
+                self._thread.start()
+                return {"ok": True, "run_id": self._run_count}
+            if command == "status":
+                return {
+                    "ok": True,
+                    "accounts": len(self.accounts),
+                    "progress": self.progress.as_dict() if self.progress else None
+                }
+            if command == "reload":
+                if self._running():
+                    return {"ok": False, "error": "执行期间不能重新加载账户"}
+                self.accounts = list(self.load_accounts())
+                return {"ok": True, "accounts": len(self.accounts)}
+            if command == "stop":
+                self._stopping = True
+                return {"ok": True}
+        return {"ok": False, "error": f"未知命令: {command}"}
+
+    def serve(self, socket_path):
+        """监听控制 socket，直到收到 stop 且当前一轮执行结束"""
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        # 不修改进程级的 umask（会影响其他线程同时创建的文件），创建后显式设置权限；
+        # chmod 之前的短暂窗口内连接也要通过 authkey 认证
+        listener = Listener(socket_path, family='AF_UNIX', authkey=_write_authkey(socket_path))
+        os.chmod(socket_path, 0o600)
+        log.info(f"常驻模式已启动，已加载 {len(self.accounts)} 个账户，控制 socket: {socket_path}")
+
+        with listener:
+            while not self._stopping:
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    log.warning("拒绝了一个认证失败的控制连接")
+                    continue
+                with conn:
+                    try:
+                        request = conn.recv()
+                        try:
+                            response = self.handle(request)
+                        except Exception as e:
+                            response = {"ok": False, "error": str(e)}
+                        conn.send(response)
+                    except (EOFError, OSError) as e:
+                        log.warning(f"控制连接异常: {str(e)}")
+        if self._running():
+            log.info("等待当前一轮执行结束...")
+            self._thread.join()
+        for path in (socket_path, authkey_path(socket_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def send_command(socket_path, command):
+    """向常驻进程发送控制命令并返回结果（需要能读取 <socket>.key）"""
+    with Client(socket_path, family='AF_UNIX', authkey=_read_authkey(socket_path)) as conn:
+        conn.send({"cmd": command})
+        return conn.recv()
+
+
+def add_daemon_arguments(parser):
+    """向命令行解析器添加常驻模式参数"""
+    parser.add_argument('--daemon', default=None, metavar='SOCKET',
+                        help='常驻模式：保持连接和账户状态，通过该 Unix socket 接收 run / status / reload / stop 命令')
+
+
+if __name__ == "__main__":
+    # 用法（在仓库根目录执行）: python -m common.daemon /tmp/bera.sock run|status|reload|stop
+    parser = argparse.ArgumentParser(description='常驻进程控制客户端')
+    parser.add_argument('socket', help='常驻进程的控制 socket')
+    parser.add_argument('command', choices=['run', 'status', 'reload', 'stop'])
+    args = parser.parse_args()
+    try:
+        result = send_command(args.socket, args.command)
+    except (OSError, EOFError, AuthenticationError) as e:
+        print(f"连接常驻进程失败: {str(e)}")
+        sys.exit(1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    sys.exit(0 if result.get("ok") else 1)
@@ -0,0 +1,151 @@
+import argparse
+import getpass
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.connection import Client, Listener
+from multiprocessing import AuthenticationError
+
+# 以太坊标准 keystore（加密 JSON）支持
+# keystore 使用 scrypt 派生密钥，单个解密约 1 秒，这里用进程池把解密分摊到所有 CPU 核心；
+# 也可以启动一个常驻的 agent 进程，解密一次后通过本地 Unix socket 提供给后续运行，避免每次重复 KDF
+
+PASSWORD_ENV = "KEYSTORE_PASSWORD"
+
+log = logging.getLogger(__name__)
+
+
+def _decrypt_file(path, password):
+    """在子进程中解密单个 keystore 文件，返回账户 dict"""
+    from eth_account import Account
+
+    with open(path, 'r', encoding='utf-8') as f:
+        keyfile = json.load(f)
+    private_key = Account.decrypt(keyfile, password)
+    return {
+        "name": os.path.splitext(os.path.basename(path))[0],
+        "address": Account.from_key(private_key).address,
+        "private_key": private_key.hex()
+    }
+
+
+def keystore_files(directory):
+    """列出目录下的 keystore 文件（按文件名排序，保证每次顺序一致）"""
+    files = glob.glob(os.path.join(directory, '*.json'))
+    files += glob.glob(os.path.join(directory, 'UTC--*'))
+    return sorted(set(files))
+
+
+def iter_keystore_accounts(directory, password, workers=None):
+    """
+    并行解密目录下的全部 keystore，按文件顺序逐个产出账户
+    workers: 进程数，默认使用全部 CPU 核心
+    解密失败（密码错误 / 文件损坏）的文件会记录原因并跳过
+    """
+    files = keystore_files(directory)
+    if not files:
+        log.warning(f"目录 {directory} 中没有找到 keystore 文件")
+        return
+    workers = workers or os.cpu_count() or 1
+    log.info(f"开始解密 {len(files)} 个 keystore（{workers} 个进程）...")
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        futures = [pool.submit(_decrypt_file, path, password) for path in files]
+        for path, future in zip(files, futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                log.warning(f"解密 keystore 失败 {os.path.basename(path)}: {str(e)}")
+
+
+def resolve_password(password_file=None):
+    """获取 keystore 密码：优先密码文件，其次环境变量 KEYSTORE_PASSWORD，最后交互输入"""
+    if password_file:
+        with open(password_file, 'r', encoding='utf-8') as f:
+            return f.read().rstrip('\n')
+    if os.environ.get(PASSWORD_ENV):
+        return os.environ[PASSWORD_ENV]
+    return getpass.getpass("请输入 keystore 密码: ")
+
+
+def _agent_authkey(password):
+    # agent 与客户端用 keystore 密码的哈希做认证，不知道密码的进程无法取到私钥
+    return hashlib.sha256(f"keystore-agent:{password}".encode('utf-8')).digest()
+
+
+def serve_agent(directory, password, socket_path, workers=None):
+    """
+    启动常驻 agent：解密一次后常驻内存，通过 Unix socket 响应请求
+    支持的请求: "accounts"（返回全部账户）、"reload"（重新解密目录）
+    """
+    accounts = list(iter_keystore_accounts(directory, password, workers))
+    log.info(f"已解密 {len(accounts)} 个账户，agent 监听 {socket_path}")
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    old_umask = os.umask(0o177)  # socket 文件仅当前用户可访问
+    try:
+        listener = Listener(socket_path, family='AF_UNIX', authkey=_agent_authkey(password))
+    finally:
+        os.umask(old_umask)
+
+    with listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                log.warning("拒绝了一个认证失败的连接")
+                continue
+            with conn:
+                try:
+                    request = conn.recv()
+                    if request == "accounts":
+                        conn.send(accounts)
+                    elif request == "reload":
+                        accounts = list(iter_keystore_accounts(directory, password, workers))
+                        conn.send(len(accounts))
+                    else:
+                        conn.send(None)
+                except (EOFError, OSError) as e:
+                    log.warning(f"agent 连接异常: {str(e)}")
+
+
+def fetch_agent_accounts(socket_path, password):
+    """从常驻 agent 获取已解密的账户列表，agent 不可用时抛出异常"""
+    with Client(socket_path, family='AF_UNIX', authkey=_agent_authkey(password)) as conn:
+        conn.send("accounts")
+        return conn.recv()
+
+
+def load_keystore_accounts(directory, password, agent_socket=None):
+    """
+    加载 keystore 目录中的账户
+    指定 agent_socket 且 agent 可用时直接从 agent 获取，否则在本进程并行解密
+    """
+    if agent_socket:
+        try:
+            accounts = fetch_agent_accounts(agent_socket, password)
+            log.info(f"从 keystore agent 获取到 {len(accounts)} 个账户")
+            return iter(accounts)
+        except (OSError, EOFError, AuthenticationError) as e:
+            log.warning(f"连接 keystore agent 失败，改为本地解密: {str(e)}")
+    return iter_keystore_accounts(directory, password)
+
+
+if __name__ == "__main__":
+    # 用法（在仓库根目录执行）: python -m common.keystore agent <keystore目录> --socket /tmp/keystore.sock
+    parser = argparse.ArgumentParser(description='keystore 常驻解密 agent')
+    parser.add_argument('command', choices=['agent'])
+    parser.add_argument('directory', help='keystore 目录')
+    parser.add_argument('--socket', required=True, help='Unix socket 路径')
+    parser.add_argument('--password-file', default=None, help='keystore 密码文件')
+    parser.add_argument('--workers', type=int, default=None, help='解密进程数，默认全部 CPU 核心')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    if not os.path.isdir(args.directory):
+        log.error(f"找不到 keystore 目录: {args.directory}")
+        sys.exit(1)
+    serve_agent(args.directory, resolve_password(args.password_file), args.socket, args.workers)
@@ -0,0 +1,67 @@
+import threading
+
+from web3 import Web3
+
+from .abi_loader import load_abi
+from .tx_builder import function_encoder
+
+# Multicall3 批量只读调用
+# 把多个合约的 view 调用合并为一次 eth_call，Multicall3 在各主流链和测试网上部署在同一地址
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MAX_CALLS_PER_BATCH = 500  # 单次 eth_call 包含的最大调用数，避免超出节点 gas 上限
+
+_CONTRACTS = {}
+_lock = threading.Lock()
+
+
+def multicall_contract(w3):
+    """Multicall3 合约对象，每个 Web3 实例只创建一次（创建合约对象约需数毫秒，批量构造调用项时不能每次新建）"""
+    cached = _CONTRACTS.get(id(w3))
+    if cached is None:
+        # 同时保存 Web3 引用，避免实例被回收后 id 被复用
+        cached = (w3, w3.eth.contract(address=MULTICALL3_ADDRESS, abi=load_abi('multicall3')))
+        with _lock:
+            _CONTRACTS[id(w3)] = cached
+    return cached[1]
+
+
+def batch_call(w3, calls, block_identifier='latest'):
+    """
+    批量执行只读调用
+    calls: [(contract, 函数名, 参数列表), ...]
+    返回与 calls 顺序一致的结果列表：单个输出直接返回值，多个输出返回元组，调用失败的位置为 None
+    """
+    # aggregate3 的参数和返回值也直接编码 / 解码，不经过 contract.functions 的逐层格式化（每批数百个元组时很慢）
+    aggregate3 = function_encoder(multicall_contract(w3).abi, 'aggregate3')
+    results = []
+    for start in range(0, len(calls), MAX_CALLS_PER_BATCH):
+        chunk = calls[start:start + MAX_CALLS_PER_BATCH]
+        # 调用数据用预先解析的函数编码器生成，比 contract.encodeABI 快一个数量级以上
+        payload = [
+            (contract.address, True, function_encoder(contract.abi, fn_name).encode_bytes(list(args)))
+            for contract, fn_name, args in chunk
+        ]
+        raw = w3.eth.call({'to': MULTICALL3_ADDRESS, 'data': aggregate3.encode([payload])}, block_identifier)
+        raw_results = w3.codec.decode(aggregate3.output_types, raw)[0]
+        for (contract, fn_name, _), (success, data) in zip(chunk, raw_results):
+            if not success or not data:
+                results.append(None)
+                continue
+            try:
+                decoded = w3.codec.decode(function_encoder(contract.abi, fn_name).output_types, data)
+            except Exception:
+                results.append(None)
+                continue
+            results.append(decoded[0] if len(decoded) == 1 else tuple(decoded))
+    return results
+
+
+def eth_balance_call(w3, address):
+    """构造查询原生代币余额的批量调用项"""
+    return (multicall_contract(w3), 'getEthBalance', [Web3.to_checksum_address(address)])
+
+
+def block_number_call(w3):
+    """构造查询当前区块号的批量调用项（与其他调用在同一区块执行）"""
+    return (multicall_contract(w3), 'getBlockNumber', [])
@@ -0,0 +1,59 @@
+import threading
+from contextlib import contextmanager
+
+# 本地 nonce 管理
+# 同一地址的多笔交易可能由不同线程并发发送（例如 Berachain 的 Bend 和 BERPS 两个分支同时执行），
+# 每次都查询 get_transaction_count 会拿到相同的 nonce，这里改为本地分配：
+# 首次使用时从链上读取 pending nonce，之后在本地递增；发送失败时归还，下次重新从链上同步
+
+
+class NonceManager:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._address_locks = {}
+        self._next = {}
+
+    def _address_lock(self, address):
+        with self._lock:
+            return self._address_locks.setdefault(address.lower(), threading.RLock())
+
+    @contextmanager
+    def reserve(self, w3, address):
+        """
+        预留下一个 nonce（上下文管理器）
+        with 块内完成签名和发送：正常退出则确认占用，抛出异常则归还并在下次从链上重新同步
+        同一地址的预留互斥，保证 nonce 顺序与发送顺序一致
+        """
+        key = address.lower()
+        with self._address_lock(address):
+            nonce = self._next.get(key)
+            if nonce is None:
+                nonce = w3.eth.get_transaction_count(address, 'pending')
+            try:
+                yield nonce
+            except BaseException:
+                self._next.pop(key, None)
+                raise
+            self._next[key] = nonce + 1
+
+    def allocate(self, w3, address):
+        """
+        分配下一个 nonce 并在本地递增（适用于同一账户的交易按顺序发送、需要用同一 nonce 重发替换的场景）
+        交易没有被节点接受时调用方需要调用 resync
+        """
+        key = address.lower()
+        with self._address_lock(address):
+            nonce = self._next.get(key)
+            if nonce is None:
+                nonce = w3.eth.get_transaction_count(address, 'pending')
+            self._next[key] = nonce + 1
+            return nonce
+
+    def resync(self, address):
+        """丢弃本地记录，下次分配时从链上重新读取"""
+        with self._address_lock(address):
+            self._next.pop(address.lower(), None)
+
+
+# 进程内共享的 nonce 管理器
+NONCES = NonceManager()
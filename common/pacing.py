@@ -0,0 +1,121 @@
+import logging
+import random
+import threading
+import time
+
+from .ws_heads import block_number, current_watcher
+
+log = logging.getLogger(__name__)
+
+# 步骤节奏控制
+# 上一笔交易达到指定确认数后即可进入下一步，不再固定 sleep；
+# 防止行为模式过于规律的随机抖动单独配置，抖动期间下一笔交易照常查询、构建、签名，只在发送前等待剩余时间；
+# 每个账户有自己的节奏器，账户在各自的工作线程中等待，不会阻塞其他账户
+
+
+def parse_jitter(spec):
+    """
+    解析抖动分布
+    spec: "none" / "uniform:最小:最大" / "expo:均值[:上限]" / 单个数字（固定秒数）
+    返回无参函数，每次调用返回一个等待秒数
+    """
+    if spec is None or spec in ('none', '0'):
+        return lambda: 0.0
+    parts = spec.split(':')
+    try:
+        if parts[0] == 'uniform' and len(parts) == 3:
+            low, high = float(parts[1]), float(parts[2])
+            return lambda: random.uniform(low, high)
+        if parts[0] == 'expo' and len(parts) in (2, 3):
+            mean = float(parts[1])
+            cap = float(parts[2]) if len(parts) == 3 else mean * 5
+            return lambda: min(random.expovariate(1 / mean), cap)
+        if len(parts) == 1:
+            fixed = float(parts[0])
+            return lambda: fixed
+    except (ValueError, ZeroDivisionError):
+        pass
+    raise ValueError(f"抖动分布格式错误: {spec}，应为 none / uniform:a:b / expo:均值[:上限] / 秒数")
+
+
+class StepPacer:
+    """
+    单个账户的步骤节奏器
+    record(receipt): 上一步完成时调用，开始计算确认数和抖动窗口
+    wait(): 下一笔交易发送前调用，等到上一笔交易确认数足够且抖动窗口结束
+    """
+
+    def __init__(self, w3, confirmations=1, jitter=None, poll_interval=1.0):
+        self.w3 = w3
+        self.confirmations = confirmations
+        self.jitter = jitter or (lambda: 0.0)
+        self.poll_interval = poll_interval
+        self._block = None
+        self._not_before = 0.0
+
+    def record(self, receipt=None, jitter=True):
+        """
+        记录上一步的交易回执（没有交易时传 None，只开始抖动窗口）
+        jitter: 为 False 时下一笔交易只等待确认数，不加抖动（同一账户内相互依赖的交易）
+        """
+        self._block = receipt['blockNumber'] if receipt else None
+        self._not_before = time.monotonic() + self.jitter() if jitter else 0.0
+
+    def wait(self):
+        """等待上一笔交易达到确认数，并等到抖动窗口结束"""
+        if self._block is not None and self.confirmations > 1:
+            target = self._block + self.confirmations - 1
+            watcher = current_watcher()
+            while block_number(self.w3) < target:
+                if watcher and watcher.connected:
+                    watcher.wait_for_block(target, self.poll_interval * 10)
+                else:
+                    time.sleep(self.poll_interval)
+            log.info(f"上一笔交易已达到 {self.confirmations} 个确认")
+        self._block = None
+
+        remaining = self._not_before - time.monotonic()
+        if remaining > 0:
+            log.info(f"交易已准备好，等待剩余抖动时间 {remaining:.2f} 秒...")
+            time.sleep(remaining)
+        self._not_before = 0.0
+
+
+def run_concurrently(items, func, workers=1):
+    """
+    用 workers 个线程并发处理 items（可以是生成器，按需取用，不会一次性展开）
+    func(item) 在工作线程中执行，单个任务的异常会记录日志后继续处理后续任务
+    """
+    iterator = iter(items)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            try:
+                func(item)
+            except Exception as e:
+                log.error(f"处理任务时发生错误: {str(e)}")
+
+    if workers <= 1:
+        worker()
+        return
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def add_pacing_arguments(parser, default_jitter):
+    """向命令行解析器添加节奏控制相关参数"""
+    parser.add_argument('--confirmations', type=int, default=1,
+                        help='上一笔交易达到多少个确认后进入下一步，默认 1（回执所在区块）')
+    parser.add_argument('--jitter', type=parse_jitter, default=parse_jitter(default_jitter),
+                        help=f'步骤间随机抖动分布：none / uniform:a:b / expo:均值[:上限] / 秒数，默认 {default_jitter}')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='并发处理的账户数，默认 1')
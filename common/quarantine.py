@@ -0,0 +1,321 @@
+import argparse
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from .structured_log import current_context
+
+log = logging.getLogger(__name__)
+
+# 失败账户隔离
+# 同一账户反复失败（没有 gas、Swap 一直回滚、地址与私钥不匹配等）时，每轮仍然完整执行一遍只会浪费 RPC 配额和时间窗口；
+# 每个账户处理期间收集其 ERROR 日志，失败后按日志记录上的 failure 字段分类（出错处通过 failure_fields 按异常类型填写，不依赖日志文字）：
+#   - 永久性失败（gas 不足、地址 / 私钥不匹配、未注册）：立即隔离，隔离时长按连续失败次数指数增长
+#   - 临时性失败（交易回滚、超时、网络错误等）：连续失败达到阈值后才隔离，同样指数退避
+#     （回滚往往由滑点、报价过期、流动性等暂时状态引起，不能一次就判为永久）
+# 隔离记录持久化到 JSON 文件，跨运行生效；多个进程（分片 / 租约）共用同一文件时，每次写入先加文件锁并重新读取，
+# 只改动本进程处理的账户，不会覆盖其他进程写入的记录；账户成功一次即清除记录；没有 ERROR 日志的未成功（例如本周期已领取）不计为失败
+
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+
+# 失败原因（日志记录的 failure 字段）
+KEY_MISMATCH = 'key_mismatch'   # 地址与私钥不匹配
+NO_GAS = 'no_gas'               # 余额不足以支付 gas
+UNREGISTERED = 'unregistered'   # 账户未注册
+REVERTED = 'reverted'           # 交易或调用被合约回滚
+TIMEOUT = 'timeout'             # 超时 / 网络错误
+ERROR = 'error'                 # 其他错误
+
+# 永久性失败的原因，按优先级排列
+PERMANENT_REASONS = (KEY_MISMATCH, NO_GAS, UNREGISTERED)
+
+# 临时性失败连续多少次后开始隔离
+DEFAULT_THRESHOLD = 3
+# 首次隔离时长（秒）：临时性 / 永久性
+DEFAULT_TRANSIENT_BACKOFF = 10 * 60
+DEFAULT_PERMANENT_BACKOFF = 6 * 60 * 60
+# 隔离时长上限（秒）
+DEFAULT_MAX_BACKOFF = 7 * 24 * 60 * 60
+# 每个账户最多保留多少条错误日志用于分类
+MAX_MESSAGES = 20
+
+
+def failure_reason(error):
+    """按异常类型判断失败原因"""
+    from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+    from web3.exceptions import ContractLogicError, TimeExhausted
+
+    if isinstance(error, ContractLogicError):
+        return REVERTED
+    if isinstance(error, (TimeExhausted, Timeout, RequestsConnectionError, TimeoutError, ConnectionError)):
+        return TIMEOUT
+    # 节点返回的 JSON-RPC 错误：web3 以 ValueError({"code", "message"}) 抛出
+    if isinstance(error, ValueError) and error.args and isinstance(error.args[0], dict):
+        message = str(error.args[0].get('message', '')).lower()
+        if 'insufficient funds' in message or 'gas required exceeds allowance' in message:
+            return NO_GAS
+    return ERROR
+
+
+def failure_fields(error=None, reason=None):
+    """
+    出错时写入日志 extra 的字段，供失败隔离分类
+    用法: log.error(..., extra=failure_fields(e)) 或 extra=failure_fields(reason=REVERTED)
+    """
+    return {"failure": reason or failure_reason(error)}
+
+
+def classify(failures):
+    """按 [(原因, 错误信息)] 分类，返回 (类型, 原因, 代表性的错误信息)"""
+    for reason in PERMANENT_REASONS:
+        for failure, message in failures:
+            if failure == reason:
+                return PERMANENT, reason, message
+    # 临时性失败取最近一条有明确原因的记录（一次失败往往还伴随"终止执行"之类的泛化日志）
+    for failure, message in reversed(failures):
+        if failure != ERROR:
+            return TRANSIENT, failure, message
+    return TRANSIENT, ERROR, failures[-1][1] if failures else ''
+
+
+class FailureCollector(logging.Handler):
+    """
+    收集正在处理的账户的 ERROR 日志及其 failure 字段
+    在产生日志的线程中执行，按日志上下文中的 account 字段归属（步骤线程通过 bind_context 带上账户字段）
+    """
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self._messages = {}
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        account = getattr(record, 'account', None) or current_context().get('account')
+        if not account:
+            return
+        with self._lock:
+            messages = self._messages.get(account.lower())
+            if messages is not None and len(messages) < MAX_MESSAGES:
+                messages.append((getattr(record, 'failure', None) or ERROR, record.getMessage()))
+
+    def start(self, address):
+        with self._lock:
+            self._messages[address.lower()] = []
+
+    def pop(self, address):
+        with self._lock:
+            return self._messages.pop(address.lower(), [])
+
+
+class FailureStore:
+    """
+    失败账户的持久化记录 {小写地址: {kind, reason, message, failures, last_failed, until}}
+    threshold: 临时性失败连续多少次后开始隔离
+    transient_backoff / permanent_backoff: 首次隔离时长（秒），之后每次失败翻倍，不超过 max_backoff
+    """
+
+    def __init__(self, path, threshold=DEFAULT_THRESHOLD, transient_backoff=DEFAULT_TRANSIENT_BACKOFF,
+                 permanent_backoff=DEFAULT_PERMANENT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF):
+        self.path = path
+        self.threshold = threshold
+        self.transient_backoff = transient_backoff
+        self.permanent_backoff = permanent_backoff
+        self.max_backoff = max_backoff
+        self.collector = FailureCollector()
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def blocked(self, address, now=None):
+        """账户仍在隔离期内时返回其记录，否则返回 None"""
+        entry = self._entries.get(address.lower())
+        if entry and entry.get('until') and entry['until'] > (now or time.time()):
+            return entry
+        return None
+
+    def filter(self, accounts):
+        """跳过隔离中的账户（生成器），跳过的账户不占用工作线程和调度时间"""
+        for account in accounts:
+            entry = self.blocked(account['address'])
+            if entry:
+                with self._lock:
+                    self.skipped += 1
+                log.debug(f"账户 {account['address']} 隔离中（{entry['reason']}），"
+                          f"{_format_time(entry['until'])} 前跳过")
+                continue
+            yield account
+
+    def watch(self, address):
+        """开始处理账户前调用，收集本次处理期间的错误日志"""
+        self.collector.start(address)
+
+    def _backoff(self, kind, failures):
+        if kind == PERMANENT:
+            delay = self.permanent_backoff * 2 ** (failures - 1)
+        elif failures >= self.threshold:
+            delay = self.transient_backoff * 2 ** (failures - self.threshold)
+        else:
+            return 0
+        return min(delay, self.max_backoff)
+
+    def record(self, address, success):
+        """
+        处理结束后调用：成功时清除记录；失败且有错误日志时按分类更新记录和隔离时长
+        返回更新后的记录（未记录时返回 None）
+        """
+        key = address.lower()
+        failures = self.collector.pop(address)
+        if success:
+            # 分片后同一账户只由一个进程处理，按本进程看到的记录判断即可，不必每个成功账户都读写文件
+            with self._lock:
+                if key in self._entries:
+                    self._update(lambda entries: entries.pop(key, None))
+            return None
+        if not failures:
+            return None
+
+        kind, reason, message = classify(failures)
+        now = time.time()
+
+        def update(entries):
+            previous = entries.get(key, {})
+            # 类型改变时重新计数，临时性失败不会把永久性失败的隔离时长拉长
+            count = previous.get('failures', 0) + 1 if previous.get('kind') == kind else 1
+            delay = self._backoff(kind, count)
+            entries[key] = {"kind": kind, "reason": reason, "message": message[:300], "failures": count,
+                            "last_failed": int(now), "until": int(now + delay) if delay else None}
+
+        with self._lock:
+            self._update(update)
+            entry = self._entries[key]
+        if entry['until']:
+            log.warning(f"账户 {address} 连续失败 {entry['failures']} 次（{kind}: {reason}），"
+                        f"隔离到 {_format_time(entry['until'])}")
+        return entry
+
+    def release(self, addresses=None):
+        """解除隔离：指定地址，或不传时清空全部记录"""
+        def update(entries):
+            if addresses is None:
+                entries.clear()
+            else:
+                for address in addresses:
+                    entries.pop(address.lower(), None)
+
+        with self._lock:
+            self._update(update)
+
+    def entries(self):
+        with self._lock:
+            return dict(self._entries)
+
+    def report(self, top=20):
+        """输出隔离统计（每轮结束时调用）：本轮跳过的账户数，按原因汇总，并列出最近失败的账户"""
+        now = time.time()
+        entries = self.entries()
+        quarantined = {address: entry for address, entry in entries.items()
+                       if entry.get('until') and entry['until'] > now}
+        with self._lock:
+            skipped, self.skipped = self.skipped, 0
+        if skipped:
+            log.info(f"本轮跳过 {skipped} 个隔离中的账户")
+        if not quarantined:
+            return
+        counts = {}
+        for entry in quarantined.values():
+            label = f"{entry['kind']}:{entry['reason']}"
+            counts[label] = counts.get(label, 0) + 1
+        log.info(f"隔离中的账户 {len(quarantined)} 个: " +
+                 "，".join(f"{label} {count}" for label, count in sorted(counts.items(), key=lambda item: -item[1])))
+        recent = sorted(quarantined.items(), key=lambda item: -item[1]['last_failed'])[:top]
+        for address, entry in recent:
+            log.info(f"  {address}  {entry['reason']} ×{entry['failures']}  "
+                     f"到 {_format_time(entry['until'])}  {entry['message'][:120]}")
+
+    def _update(self, update):
+        """
+        加文件锁后重新读取记录，调用 update(entries) 原地修改后写回（调用方须持有 self._lock）
+        其他进程在本进程启动后写入的记录会一并读入，不会被覆盖
+        """
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            entries = self._load()
+            update(entries)
+            # 顺便清理过期且只失败过一次的临时性记录；先写临时文件再替换，中途崩溃不会留下损坏的文件
+            now = time.time()
+            self._entries = {address: entry for address, entry in entries.items()
+                             if entry['kind'] == PERMANENT or entry['failures'] > 1
+                             or now - entry['last_failed'] < self.max_backoff}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+
+
+def _format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M') if timestamp else '-'
+
+
+def open_quarantine(args):
+    """
+    根据命令行参数打开失败记录，--no-quarantine 时返回 None
+    收集错误日志的 handler 挂在根 logger 上，需在 setup_logging 之后调用
+    """
+    if args.no_quarantine:
+        return None
+    store = FailureStore(args.quarantine_file, args.quarantine_threshold,
+                         args.quarantine_backoff, args.quarantine_permanent_backoff, args.quarantine_max_backoff)
+    if args.quarantine_release:
+        store.release(None if 'all' in args.quarantine_release else args.quarantine_release)
+        log.info(f"已解除隔离: {', '.join(args.quarantine_release)}")
+    logging.getLogger().addHandler(store.collector)
+    return store
+
+
+def add_quarantine_arguments(parser, default_path):
+    """向命令行解析器添加失败隔离相关参数"""
+    parser.add_argument('--quarantine-file', default=default_path,
+                        help=f'失败账户记录文件，默认 {default_path}')
+    parser.add_argument('--no-quarantine', action='store_true', help='不记录失败，也不跳过隔离中的账户')
+    parser.add_argument('--quarantine-threshold', type=int, default=DEFAULT_THRESHOLD,
+                        help=f'临时性失败连续多少次后开始隔离，默认 {DEFAULT_THRESHOLD}')
+    parser.add_argument('--quarantine-backoff', type=int, default=DEFAULT_TRANSIENT_BACKOFF,
+                        help=f'临时性失败的首次隔离时长（秒），之后每次翻倍，默认 {DEFAULT_TRANSIENT_BACKOFF}')
+    parser.add_argument('--quarantine-permanent-backoff', type=int, default=DEFAULT_PERMANENT_BACKOFF,
+                        help=f'永久性失败的首次隔离时长（秒），之后每次翻倍，默认 {DEFAULT_PERMANENT_BACKOFF}')
+    parser.add_argument('--quarantine-max-backoff', type=int, default=DEFAULT_MAX_BACKOFF,
+                        help=f'隔离时长上限（秒），默认 {DEFAULT_MAX_BACKOFF}')
+    parser.add_argument('--quarantine-release', action='append', default=[], metavar='ADDRESS',
+                        help='启动时解除指定地址的隔离（可重复指定），all 表示全部')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='失败账户隔离报告')
+    parser.add_argument('path', help='失败账户记录文件')
+    parser.add_argument('--all', action='store_true', help='同时列出未在隔离期内的记录')
+    args = parser.parse_args()
+
+    store = FailureStore(args.path)
+    now = time.time()
+    for address, entry in sorted(store.entries().items(), key=lambda item: -item[1]['last_failed']):
+        active = entry.get('until') and entry['until'] > now
+        if active or args.all:
+            print(f"{address}  {entry['kind']:<9}  {entry['reason']:<12}  ×{entry['failures']:<3}  "
+                  f"{'到 ' + _format_time(entry['until']) if active else '未隔离':<20}  {entry['message'][:120]}")
+
+
+if __name__ == "__main__":
+    # 用法（在仓库根目录执行）: python -m common.quarantine berachain/quarantine.json --all
+    main()
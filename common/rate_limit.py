@@ -0,0 +1,231 @@
+import email.utils
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# 全局 RPC 限流
+# 每个 RPC 端点一组令牌桶，读请求和写请求（发送交易）分开限流；
+# 遇到 HTTP 429 或 JSON-RPC 限流错误时按 Retry-After 暂停并把速率减半，之后成功请求逐步恢复速率（AIMD），
+# 在不触发封禁的前提下尽量保持最大持续吞吐
+
+WRITE_METHODS = {'eth_sendRawTransaction', 'eth_sendTransaction'}
+RATE_LIMIT_CODES = {-32005, -32029, 429}  # 常见节点实现的限流错误码
+RATE_LIMIT_MESSAGES = ('rate limit', 'too many requests', 'limit exceeded', 'exceeded the quota')
+
+DEFAULT_READ_RATE = 20.0   # 每秒读请求数
+DEFAULT_WRITE_RATE = 5.0   # 每秒写请求数
+MAX_RETRIES = 5            # 单个请求因限流重试的最大次数
+
+
+class TokenBucket:
+    """
+    自适应令牌桶
+    rate: 初始速率（每秒令牌数），遇到限流减半，持续成功后线性恢复，不超过 max_rate
+    """
+
+    def __init__(self, rate, burst=None, min_rate=0.5, max_rate=None):
+        self.rate = float(rate)
+        self.max_rate = float(max_rate or rate)
+        self.min_rate = min(float(min_rate), self.rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.tokens = self.burst
+        self.blocked_until = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        # 统计信息
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """取一个令牌，没有令牌或处于限流暂停期时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.requests += 1
+                    return
+                delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+                self.waited += delay
+            time.sleep(delay)
+
+    def penalize(self, retry_after=None):
+        """被限流：速率减半，并暂停到 Retry-After 指定的时间（没有时按当前速率退避一个令牌间隔）"""
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def reward(self):
+        """请求成功：速率线性恢复（大约每 max_rate 个成功请求恢复 1 req/s）"""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 1 / self.max_rate)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 2),
+                "max_rate": self.max_rate,
+                "tokens": round(self.tokens, 2),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "waited_seconds": round(self.waited, 2),
+                "paused": self.blocked_until > time.monotonic()
+            }
+
+
+class EndpointLimiter:
+    """单个 RPC 端点的限流器，读写分开两个令牌桶"""
+
+    def __init__(self, endpoint, read_rate=DEFAULT_READ_RATE, write_rate=DEFAULT_WRITE_RATE):
+        self.endpoint = endpoint
+        self.read = TokenBucket(read_rate)
+        self.write = TokenBucket(write_rate)
+
+    def bucket_for(self, method):
+        return self.write if method in WRITE_METHODS else self.read
+
+    def stats(self):
+        return {"endpoint": self.endpoint, "read": self.read.stats(), "write": self.write.stats()}
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(endpoint, read_rate=None, write_rate=None):
+    """
+    获取端点对应的全局限流器（同一进程内所有 Web3 实例、所有线程共享）
+    首次创建时使用传入的速率，之后传入速率会更新最大速率
+    """
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(endpoint)
+        if limiter is None:
+            limiter = EndpointLimiter(endpoint,
+                                      read_rate or DEFAULT_READ_RATE,
+                                      write_rate or DEFAULT_WRITE_RATE)
+            _LIMITERS[endpoint] = limiter
+        else:
+            for bucket, rate in ((limiter.read, read_rate), (limiter.write, write_rate)):
+                if rate:
+                    bucket.max_rate = float(rate)
+                    bucket.rate = min(bucket.rate, bucket.max_rate)
+        return limiter
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或 HTTP 日期），返回秒数，无法解析返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited_response(response):
+    """判断 JSON-RPC 响应是否是限流错误"""
+    error = response.get('error') if isinstance(response, dict) else None
+    if not error:
+        return False
+    if isinstance(error, dict):
+        if error.get('code') in RATE_LIMIT_CODES:
+            return True
+        message = str(error.get('message', '')).lower()
+    else:
+        message = str(error).lower()
+    return any(text in message for text in RATE_LIMIT_MESSAGES)
+
+
+def rate_limit_middleware(limiter):
+    """
+    web3 中间件：每个请求先从对应令牌桶取令牌，
+    遇到 HTTP 429 / JSON-RPC 限流错误时退避后重试，最多重试 MAX_RETRIES 次
+    """
+    def middleware(make_request, w3):
+        def inner(method, params):
+            bucket = limiter.bucket_for(method)
+            for attempt in range(MAX_RETRIES + 1):
+                bucket.acquire()
+                try:
+                    response = make_request(method, params)
+                except Exception as e:
+                    http_response = getattr(e, 'response', None)
+                    if getattr(http_response, 'status_code', None) != 429 or attempt == MAX_RETRIES:
+                        raise
+                    retry_after = parse_retry_after(http_response.headers.get('Retry-After'))
+                    bucket.penalize(retry_after)
+                    log.warning(f"RPC 限流 (HTTP 429)，{method} 暂停 {retry_after or 0:.1f} 秒后重试，当前速率 {bucket.rate:.2f}/s")
+                    continue
+                if is_rate_limited_response(response) and attempt < MAX_RETRIES:
+                    bucket.penalize()
+                    log.warning(f"RPC 限流 ({response['error']})，{method} 退避后重试，当前速率 {bucket.rate:.2f}/s")
+                    continue
+                bucket.reward()
+                return response
+        return inner
+    return middleware
+
+
+def install_rate_limiter(w3, endpoint, read_rate=None, write_rate=None):
+    """给 Web3 实例安装端点共享的限流中间件（放在最内层，每个真实请求都计数）"""
+    limiter = get_limiter(endpoint, read_rate, write_rate)
+    w3.middleware_onion.inject(rate_limit_middleware(limiter), 'rate_limit', layer=0)
+    return limiter
+
+
+def limiter_stats():
+    """全部端点的限流器状态，用于指标输出"""
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.values())
+    return [limiter.stats() for limiter in limiters]
+
+
+def print_limiter_stats():
+    """输出全部端点的限流器状态（写入日志）"""
+    for item in limiter_stats():
+        for kind in ('read', 'write'):
+            s = item[kind]
+            log.info(f"[限流] {item['endpoint']} {kind}: 速率 {s['rate']}/{s['max_rate']} req/s, "
+                  f"请求 {s['requests']}, 被限流 {s['throttled']}, 累计等待 {s['waited_seconds']} 秒"
+                  f"{', 暂停中' if s['paused'] else ''}")
+
+
+def start_stats_reporter(interval):
+    """后台线程每 interval 秒输出一次限流器状态，interval <= 0 时不启动"""
+    if not interval or interval <= 0:
+        return None
+
+    def report():
+        while True:
+            time.sleep(interval)
+            print_limiter_stats()
+
+    thread = threading.Thread(target=report, daemon=True)
+    thread.start()
+    return thread
+
+
+def add_rate_limit_arguments(parser):
+    """向命令行解析器添加限流相关参数"""
+    parser.add_argument('--rpc-read-rate', type=float, default=DEFAULT_READ_RATE,
+                        help=f'每个 RPC 端点每秒最多读请求数，默认 {DEFAULT_READ_RATE}')
+    parser.add_argument('--rpc-write-rate', type=float, default=DEFAULT_WRITE_RATE,
+                        help=f'每个 RPC 端点每秒最多发送交易数，默认 {DEFAULT_WRITE_RATE}')
+    parser.add_argument('--rate-stats-interval', type=float, default=0,
+                        help='每隔多少秒打印一次限流器状态，默认只在结束时打印')
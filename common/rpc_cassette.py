@@ -0,0 +1,291 @@
+import atexit
+import gzip
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from web3.providers.base import JSONBaseProvider
+
+from .pacing import parse_jitter
+
+log = logging.getLogger(__name__)
+
+# RPC 录制 / 回放
+# 录制：在 provider 层（所有中间件之下）记录真实的 JSON-RPC 请求 / 响应和耗时，写入 gzip 压缩的 JSON Lines 文件（cassette）；
+# 回放：用 cassette 代替节点响应请求，不需要网络，可以注入延迟和错误（限流、超时），
+# 用于在没有网络的机器上快速、可重复地回归测试 RPC 访问模式的优化（请求数、限流重试、启动时间等）
+#
+# 匹配规则：同一 (方法, 参数) 的请求按录制顺序依次返回，用完后一直返回最后一次的响应
+# （例如回执轮询：录制时先返回若干次 null 再返回回执）；参数不同时（随机金额导致交易数据不同）
+# 退回到同一方法的下一个未使用响应，--replay-strict 时直接报错
+
+CASSETTE_VERSION = 1
+
+# 注入的限流错误（与 rate_limit 识别的错误码一致）
+RATE_LIMIT_ERROR = {"code": -32005, "message": "rate limit exceeded (injected)"}
+
+_CONFIG = {"mode": None}
+_lock = threading.Lock()
+
+
+def _key(method, params):
+    return method, json.dumps(params, sort_keys=True, separators=(',', ':'), default=_json_default)
+
+
+def _json_default(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return str(value)
+
+
+class CassetteWriter:
+    """录制文件：首行为头信息，之后每行一个请求 / 响应对，进程退出前调用 close() 写完"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._lock = threading.Lock()
+        self.count = 0
+        self._write({"version": CASSETTE_VERSION, "created": time.time()})
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, separators=(',', ':'), default=_json_default) + '\n')
+
+    def record(self, endpoint, method, params, response, elapsed):
+        with self._lock:
+            self._write({"e": endpoint, "m": method, "p": params, "r": response, "t": round(elapsed, 4)})
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                log.info(f"已录制 {self.count} 个 RPC 请求到 {self.path}")
+
+
+def load_cassette(path):
+    """读取 cassette，返回 [(endpoint, method, params, response, elapsed)]"""
+    entries = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"不支持的 cassette 版本: {header.get('version')}")
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries.append((entry["e"], entry["m"], entry["p"], entry["r"], entry.get("t", 0.0)))
+    return entries
+
+
+class RecordingProvider(JSONBaseProvider):
+    """转发请求到真实 provider，同时把请求 / 响应写入 cassette"""
+
+    def __init__(self, provider, writer):
+        super().__init__()
+        self.provider = provider
+        self.writer = writer
+        self.endpoint_uri = getattr(provider, 'endpoint_uri', None)
+
+    def make_request(self, method, params):
+        started = time.monotonic()
+        response = self.provider.make_request(method, params)
+        self.writer.record(self.endpoint_uri, method, params, response, time.monotonic() - started)
+        return response
+
+
+class Cassette:
+    """按端点分组的已录制响应，线程安全地按顺序取用"""
+
+    def __init__(self, entries):
+        self._exact = defaultdict(lambda: defaultdict(deque))
+        self._by_method = defaultdict(lambda: defaultdict(deque))
+        self._last = defaultdict(dict)
+        for endpoint, method, params, response, elapsed in entries:
+            item = [response, elapsed, False]
+            self._exact[endpoint][_key(method, params)].append(item)
+            self._by_method[endpoint][method].append(item)
+        self.hits = 0
+        self.fallbacks = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _take(self, queue):
+        while queue:
+            item = queue.popleft()
+            if not item[2]:
+                item[2] = True
+                return item
+        return None
+
+    def lookup(self, endpoint, method, params, strict=False):
+        """返回 (响应, 录制时的耗时)，找不到时返回 (None, 0)"""
+        key = _key(method, params)
+        with self._lock:
+            item = self._take(self._exact[endpoint][key])
+            if item is not None:
+                self.hits += 1
+            elif key in self._last[endpoint]:
+                item = self._last[endpoint][key]
+                self.hits += 1
+            elif not strict:
+                item = self._take(self._by_method[endpoint][method])
+                if item is not None:
+                    self.fallbacks += 1
+            if item is None:
+                self.misses += 1
+                return None, 0.0
+            self._last[endpoint][key] = item
+            return item[0], item[1]
+
+
+class ReplayProvider(JSONBaseProvider):
+    """
+    用 cassette 响应请求，不访问网络
+    latency: 'recorded' 按录制时的耗时等待，否则为 parse_jitter 返回的函数（或 None 不等待）
+    errors: {'ratelimit': 概率, 'timeout': 概率}，按概率注入限流错误响应或超时异常
+    """
+
+    def __init__(self, cassette, endpoint_uri, latency=None, errors=None, strict=False):
+        super().__init__()
+        self.cassette = cassette
+        self.endpoint_uri = endpoint_uri
+        self.latency = latency
+        self.errors = errors or {}
+        self.strict = strict
+
+    def make_request(self, method, params):
+        response, elapsed = self.cassette.lookup(self.endpoint_uri, method, params, self.strict)
+        delay = elapsed if self.latency == 'recorded' else (self.latency() if self.latency else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        if random.random() < self.errors.get('timeout', 0):
+            raise TimeoutError(f"{method} 超时（回放注入）")
+        if random.random() < self.errors.get('ratelimit', 0):
+            return {"jsonrpc": "2.0", "id": None, "error": RATE_LIMIT_ERROR}
+        if response is None:
+            raise ValueError(f"cassette 中没有 {method} {json.dumps(params, default=_json_default)[:200]} 的录制响应")
+        return response
+
+
+def parse_error_profile(spec):
+    """解析错误注入配置: "ratelimit:0.05,timeout:0.01" """
+    errors = {}
+    if not spec:
+        return errors
+    for part in spec.split(','):
+        kind, sep, rate = part.partition(':')
+        if kind not in ('ratelimit', 'timeout') or not sep:
+            raise ValueError(f"错误注入格式错误: {part}，应为 ratelimit:概率 / timeout:概率")
+        errors[kind] = float(rate)
+    return errors
+
+
+def wrap_provider(provider):
+    """按当前的录制 / 回放设置包装 provider（未开启时原样返回）"""
+    mode = _CONFIG["mode"]
+    endpoint = getattr(provider, 'endpoint_uri', None)
+    if mode == 'record':
+        return RecordingProvider(provider, _CONFIG["writer"])
+    if mode == 'replay':
+        return ReplayProvider(_CONFIG["cassette"], endpoint, _CONFIG["latency"], _CONFIG["errors"], _CONFIG["strict"])
+    return provider
+
+
+def isolated_path(path, suffix):
+    """
+    录制 / 回放时持久化状态文件的实际路径
+    录制：改写到 cassette 旁边的 <cassette>.<suffix>；回放：返回 None（只在内存中使用，不读写文件）；未开启时原样返回
+    """
+    mode = _CONFIG["mode"]
+    if mode == 'record':
+        return f"{_CONFIG['path']}.{suffix}"
+    if mode == 'replay' or not path:
+        return None
+    return path
+
+
+def _isolate_state(args, replay):
+    """
+    录制 / 回放时不读写正式运行的交易日志、失败记录、租约和持久缓存
+    回放：交易是离线签名的（哈希与录制时不同，回执靠按方法匹配），写入正式日志会在下次核对时被真的广播出去，
+        回放出的失败也会把真实账户隔离，全部关闭；
+        报价历史（--quote-history）和未注册地址缓存（--unregistered-cache）只在内存中使用，
+        回放出的报价不会成为正式运行的保底兑换比例，回放出的"未注册"也不会让正式运行跳过真实账户；
+    录制：交易真实发送，交易日志、失败记录、报价历史和未注册地址缓存改写到 cassette 旁边的文件（保留本次运行的崩溃恢复），
+        租约保持不变，仍然避免与其他进程同时操作同一账户
+    """
+    if replay:
+        if hasattr(args, 'tx_journal'):
+            args.tx_journal = None
+        if hasattr(args, 'no_quarantine'):
+            args.no_quarantine = True
+        for name in ('lease_db', 'lease_dir', 'quote_history', 'unregistered_cache'):
+            if hasattr(args, name):
+                setattr(args, name, None)
+        log.info("回放模式不使用交易日志、失败隔离和租约，报价历史和未注册地址缓存不写入文件")
+        return
+    if getattr(args, 'tx_journal', None):
+        args.tx_journal = isolated_path(args.tx_journal, 'tx_journal.jsonl')
+        log.info(f"录制模式的交易日志写入 {args.tx_journal}")
+    for name, suffix, label in (('quarantine_file', 'quarantine.json', '失败记录'),
+                                ('quote_history', 'quote_history.json', '报价历史'),
+                                ('unregistered_cache', 'unregistered_cache.json', '未注册地址缓存')):
+        if hasattr(args, name):
+            setattr(args, name, isolated_path(getattr(args, name), suffix))
+            log.info(f"录制模式的{label}写入 {getattr(args, name)}")
+
+
+def configure_cassette(args):
+    """
+    根据命令行参数开启录制或回放，需在建立 Web3 连接、打开交易日志 / 租约 / 失败记录之前调用
+    回放时不能订阅新区块（cassette 中没有 WebSocket 推送），会清除 args.ws_url
+    录制 / 回放时交易日志、失败记录、租约和持久缓存的处理见 _isolate_state
+    """
+    with _lock:
+        if args.record_rpc:
+            _CONFIG.update(mode='record', path=args.record_rpc, writer=CassetteWriter(args.record_rpc))
+            atexit.register(close_cassette)
+            log.info(f"录制 RPC 请求到 {args.record_rpc}")
+            _isolate_state(args, replay=False)
+        elif args.replay_rpc:
+            latency = args.replay_latency
+            if latency != 'recorded':
+                latency = parse_jitter(latency)
+            entries = load_cassette(args.replay_rpc)
+            _CONFIG.update(mode='replay', cassette=Cassette(entries), latency=latency,
+                           errors=parse_error_profile(args.replay_errors), strict=args.replay_strict)
+            atexit.register(close_cassette)
+            log.info(f"回放 {args.replay_rpc}（{len(entries)} 个录制响应），不访问网络")
+            if getattr(args, 'ws_url', None):
+                log.warning("回放模式不支持 WebSocket 新区块订阅，已忽略 --ws-url")
+                args.ws_url = None
+            _isolate_state(args, replay=True)
+
+
+def close_cassette():
+    """结束录制（写完文件）或输出回放命中统计（进程退出时自动调用）"""
+    with _lock:
+        mode, _CONFIG["mode"] = _CONFIG["mode"], None
+    if mode == 'record':
+        _CONFIG["writer"].close()
+    elif mode == 'replay':
+        cassette = _CONFIG["cassette"]
+        log.info(f"回放统计: 命中 {cassette.hits}，按方法匹配 {cassette.fallbacks}，未找到 {cassette.misses}")
+
+
+def add_cassette_arguments(parser):
+    """向命令行解析器添加 RPC 录制 / 回放相关参数"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record-rpc', default=None, metavar='PATH',
+                       help='把本次运行的全部 RPC 请求 / 响应录制到 cassette 文件（gzip JSON Lines）')
+    group.add_argument('--replay-rpc', default=None, metavar='PATH',
+                       help='用 cassette 文件回放 RPC 响应，不访问网络')
+    parser.add_argument('--replay-latency', default='none',
+                        help='回放时每个请求的延迟：recorded（按录制耗时）/ none / uniform:a:b / expo:均值[:上限] / 秒数，默认 none')
+    parser.add_argument('--replay-errors', default=None,
+                        help='回放时按概率注入错误，例如 ratelimit:0.05,timeout:0.01')
+    parser.add_argument('--replay-strict', action='store_true',
+                        help='回放时参数不完全一致的请求直接报错，不按方法退回匹配')
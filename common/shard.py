@@ -0,0 +1,334 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# 账户分片与租约
+# 多台机器 / 多个进程共同处理同一份账户列表时使用：
+# 1、--shard i/N 按地址哈希确定性地把账户分到 N 个分片，每个进程只处理自己的分片
+# 2、租约存储（本地 SQLite 文件或共享存储上的文件锁目录）保证同一账户同一时间只有一个进程在发交易，
+#    避免重复领取和 nonce 冲突；持有期间后台线程每 1/3 有效期续期一次，单个账户处理超过有效期也不会被其他进程接手
+
+DEFAULT_LEASE_TTL = 600  # 租约有效期（秒），进程崩溃后超过该时间租约自动失效
+
+
+def parse_shard(value):
+    """
+    解析分片参数
+    value: 形如 "i/N" 的字符串，0 <= i < N
+    返回 (i, N)
+    """
+    try:
+        index, total = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"分片参数格式错误: {value}，应为 i/N")
+    if total < 1 or not 0 <= index < total:
+        raise ValueError(f"分片参数超出范围: {value}，要求 0 <= i < N")
+    return index, total
+
+
+def account_shard(address, total):
+    """根据地址哈希计算账户所属分片（与大小写无关，每台机器结果一致）"""
+    digest = hashlib.sha256(address.lower().encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % total
+
+
+def filter_shard(accounts, shard):
+    """
+    只保留属于当前分片的账户
+    accounts: 账户可迭代对象，每个账户 dict 至少包含 address
+    shard: parse_shard 的返回值，为 None 时不分片
+    """
+    if shard is None:
+        yield from accounts
+        return
+    index, total = shard
+    for account in accounts:
+        if account_shard(account['address'], total) == index:
+            yield account
+
+
+def lease_owner():
+    """当前进程的租约持有者标识"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseHeartbeat:
+    """
+    租约心跳：后台线程定期调用 store.renew(key) 延长本进程持有的租约
+    第一次 add 时才启动线程，不使用租约的运行不会多出线程
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.interval = max(store.ttl / 3, 1)
+        self._keys = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, key):
+        with self._lock:
+            self._keys.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='lease-heartbeat', daemon=True)
+                self._thread.start()
+
+    def discard(self, key):
+        with self._lock:
+            self._keys.discard(key)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                keys = list(self._keys)
+            for key in keys:
+                try:
+                    if not self.store.renew(key):
+                        log.warning(f"租约 {key} 已不属于本进程，续期失败")
+                        self.discard(key)
+                except Exception as e:
+                    log.warning(f"租约 {key} 续期出错: {str(e)}")
+
+
+class SqliteLeaseStore:
+    """
+    基于本地 SQLite 文件的租约存储
+    适合同一台机器上的多个进程，不要放在网络文件系统上
+    """
+
+    def __init__(self, path, ttl=DEFAULT_LEASE_TTL, owner=None):
+        self.path = path
+        self.ttl = ttl
+        self.owner = owner or lease_owner()
+        self._lock = threading.Lock()  # 同一连接会被多个工作线程共用
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " key TEXT PRIMARY KEY,"
+            " owner TEXT NOT NULL,"
+            " expires REAL NOT NULL,"
+            " done INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._heartbeat = LeaseHeartbeat(self)
+
+    def acquire(self, key):
+        """尝试获取租约，成功返回 True；已被其他进程持有或已完成返回 False"""
+        with self._lock:
+            acquired = self._acquire(key)
+        if acquired:
+            self._heartbeat.add(key)
+        return acquired
+
+    def renew(self, key):
+        """延长本进程持有的租约，租约已不属于本进程时返回 False"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE leases SET expires = ? WHERE key = ? AND owner = ? AND done = 0",
+                (time.time() + self.ttl, key, self.owner)
+            )
+            return cur.rowcount > 0
+
+    def _acquire(self, key):
+        now = time.time()
+        cur = self._conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            row = cur.execute(
+                "SELECT owner, expires, done FROM leases WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                owner, expires, done = row
+                if done or (owner != self.owner and expires > now):
+                    cur.execute("ROLLBACK")
+                    return False
+            cur.execute(
+                "INSERT OR REPLACE INTO leases (key, owner, expires, done) VALUES (?, ?, ?, 0)",
+                (key, self.owner, now + self.ttl)
+            )
+            cur.execute("COMMIT")
+            return True
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+
+    def release(self, key, done=False):
+        """
+        释放租约
+        done: 为 True 时记录该账户已处理完成，同一作用域内不会再被任何进程领取
+        """
+        self._heartbeat.discard(key)
+        with self._lock:
+            if done:
+                self._conn.execute(
+                    "UPDATE leases SET done = 1 WHERE key = ? AND owner = ?", (key, self.owner)
+                )
+            else:
+                self._conn.execute(
+                    "DELETE FROM leases WHERE key = ? AND owner = ?", (key, self.owner)
+                )
+
+    def close(self):
+        self._heartbeat.stop()
+        self._conn.close()
+
+
+class FileLeaseStore:
+    """
+    基于文件锁目录的租约存储
+    每个租约是目录下的一个 .lock 文件（O_EXCL 原子创建），可放在多台机器共享的存储上
+    """
+
+    def __init__(self, directory, ttl=DEFAULT_LEASE_TTL, owner=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.owner = owner or lease_owner()
+        self._heartbeat = LeaseHeartbeat(self)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{name}{suffix}")
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, path, key):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"key": key, "owner": self.owner, "expires": time.time() + self.ttl}, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _held(self, path, info):
+        """租约文件是否仍被其他进程有效持有"""
+        if info is None:
+            # 读不到内容：可能是其他进程刚用 O_EXCL 创建、还没写完，按文件修改时间判断是否过期
+            try:
+                return time.time() - os.path.getmtime(path) < self.ttl
+            except FileNotFoundError:
+                return False
+        return info['expires'] > time.time() and info['owner'] != self.owner
+
+    def _take_stale(self, lock_path, info):
+        """
+        抢占过期的租约文件，成功返回 True
+        先原子地改名，再核对改名得到的正是判断为过期的那份（同一持有者、同一到期时间）：
+        两个进程同时判断过期时，后改名的一方拿到的可能是先改名的一方刚创建的新租约，此时改回原名并放弃
+        """
+        stale_path = f"{lock_path}.stale.{os.getpid()}.{socket.gethostname()}"
+        try:
+            os.rename(lock_path, stale_path)
+        except FileNotFoundError:
+            return True
+        taken = self._read(stale_path)
+        if taken == info:
+            os.remove(stale_path)
+            return True
+        # 改回原名：用 link 而不是 rename，原路径已被第三个进程重新创建时不会覆盖它
+        try:
+            os.link(stale_path, lock_path)
+        except FileExistsError:
+            pass
+        os.remove(stale_path)
+        return False
+
+    def acquire(self, key):
+        """尝试获取租约，成功返回 True；已被其他进程持有或已完成返回 False"""
+        if os.path.exists(self._path(key, '.done')):
+            return False
+
+        lock_path = self._path(key, '.lock')
+        for _ in range(2):
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                info = self._read(lock_path)
+                if self._held(lock_path, info):
+                    return False
+                # 租约已过期（持有者大概率已崩溃）：改名抢占后重新创建
+                if not self._take_stale(lock_path, info):
+                    return False
+                continue
+            os.close(fd)
+            self._write(lock_path, key)
+            self._heartbeat.add(key)
+            return True
+        return False
+
+    def renew(self, key):
+        """延长本进程持有的租约（写临时文件后替换），租约已不属于本进程时返回 False"""
+        lock_path = self._path(key, '.lock')
+        info = self._read(lock_path)
+        if info is None or info['owner'] != self.owner:
+            return False
+        tmp_path = f"{lock_path}.{os.getpid()}.tmp"
+        self._write(tmp_path, key)
+        os.replace(tmp_path, lock_path)
+        return True
+
+    def release(self, key, done=False):
+        """
+        释放租约
+        done: 为 True 时记录该账户已处理完成，同一作用域内不会再被任何进程领取
+        """
+        self._heartbeat.discard(key)
+        lock_path = self._path(key, '.lock')
+        info = self._read(lock_path)
+        if info is None or info['owner'] != self.owner:
+            return
+        if done:
+            with open(self._path(key, '.done'), 'w', encoding='utf-8') as f:
+                json.dump({"key": key, "owner": self.owner, "finished": time.time()}, f)
+        os.remove(lock_path)
+
+    def close(self):
+        self._heartbeat.stop()
+
+
+def open_lease_store(lease_db=None, lease_dir=None, ttl=DEFAULT_LEASE_TTL):
+    """根据命令行参数创建租约存储，都未指定时返回 None（不使用租约）"""
+    if lease_db:
+        return SqliteLeaseStore(lease_db, ttl)
+    if lease_dir:
+        return FileLeaseStore(lease_dir, ttl)
+    return None
+
+
+def lease_key(scope, address):
+    """租约键：作用域 + 小写地址，作用域默认为当天日期，第二天同一账户可以重新领取"""
+    return f"{scope}:{address.lower()}"
+
+
+def default_lease_scope():
+    """默认租约作用域（UTC 日期）"""
+    return time.strftime('%Y%m%d', time.gmtime())
+
+
+def add_shard_arguments(parser):
+    """向命令行解析器添加分片与租约相关参数"""
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help='只处理指定分片的账户，格式 i/N（0 <= i < N），按地址哈希分片')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--lease-db', default=None,
+                       help='租约 SQLite 文件路径（同一台机器上多个进程共享）')
+    group.add_argument('--lease-dir', default=None,
+                       help='租约文件锁目录（可放在多台机器共享的存储上）')
+    parser.add_argument('--lease-ttl', type=int, default=DEFAULT_LEASE_TTL,
+                        help=f'租约有效期（秒），默认 {DEFAULT_LEASE_TTL}')
+    parser.add_argument('--lease-scope', default=None,
+                        help='租约作用域，同一作用域内已完成的账户不会重复处理，默认为当天 UTC 日期')
@@ -0,0 +1,133 @@
+import logging
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .pacing import StepPacer
+from .quarantine import failure_fields
+from .structured_log import bind_context
+
+log = logging.getLogger(__name__)
+
+# 步骤依赖图执行器
+# 每个步骤声明自己的输入 / 输出（例如 Mint 需要 stgUSDC，产出 HONEY），依赖关系由输入输出推导；
+# 依赖都完成的步骤立即并发执行，互不依赖的分支（Bend 与 BERPS）同时进行，缩短整条流水线的关键路径
+
+
+class StepNode:
+    """
+    依赖图中的一个步骤
+    number: 步骤编号（对应 --step），None 表示不对外编号的辅助步骤
+    func: func(pacer) -> 交易回执 / True（成功）或 False（失败）
+    inputs / outputs: 该步骤需要 / 产出的资源名
+    """
+
+    def __init__(self, number, name, func, inputs=(), outputs=()):
+        self.number = number
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+    @property
+    def label(self):
+        return f"步骤{self.number}" if self.number is not None else self.name
+
+
+def resolve_dependencies(nodes):
+    """根据输入输出推导每个步骤依赖的前置步骤，返回 {步骤: [前置步骤]}"""
+    producers = {}
+    for node in nodes:
+        for output in node.outputs:
+            if output in producers:
+                raise ValueError(f"资源 {output} 被多个步骤产出")
+            producers[output] = node
+    deps = {}
+    for node in nodes:
+        missing = [name for name in node.inputs if name not in producers]
+        if missing:
+            raise ValueError(f"{node.label} 的输入 {missing} 没有步骤产出")
+        deps[node] = [producers[name] for name in node.inputs]
+    return deps
+
+
+def _skipped_nodes(nodes, deps, start_step):
+    """从 start_step 开始执行时需要跳过的步骤：编号小于 start_step 的步骤，以及只服务于被跳过步骤的辅助步骤"""
+    skipped = {node for node in nodes if node.number is not None and node.number < start_step}
+    changed = True
+    while changed:
+        changed = False
+        for node in nodes:
+            if node in skipped or node.number is not None:
+                continue
+            consumers = [other for other in nodes if node in deps[other]]
+            if consumers and all(other in skipped for other in consumers):
+                skipped.add(node)
+                changed = True
+    return skipped
+
+
+def _latest_receipt(receipts):
+    """返回区块号最大的交易回执，没有回执时返回 None"""
+    receipts = [receipt for receipt in receipts if isinstance(receipt, Mapping)]
+    if not receipts:
+        return None
+    return max(receipts, key=lambda receipt: receipt['blockNumber'])
+
+
+def run_dag(w3, nodes, start_step=1, confirmations=1, jitter=None):
+    """
+    按依赖关系并发执行步骤
+    每个步骤发送交易前等待其前置步骤交易达到确认数，并经过独立的随机抖动
+    任一步骤失败后不再启动新步骤，等待已启动的步骤结束后返回 False
+    步骤在线程池中执行时沿用调用线程的日志上下文（账户），并附加 step 字段；每个步骤结束时记录耗时
+    """
+    deps = resolve_dependencies(nodes)
+    done = _skipped_nodes(nodes, deps, start_step)
+    receipts = {}
+    running = {}
+    started = {}
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=max(1, len(nodes))) as pool:
+        while True:
+            if not failed:
+                for node in nodes:
+                    if node in done or node in running.values():
+                        continue
+                    if all(dep in done for dep in deps[node]):
+                        pacer = StepPacer(w3, confirmations, jitter)
+                        receipt = _latest_receipt(receipts.get(dep) for dep in deps[node])
+                        if receipt:
+                            pacer.record(receipt)
+                        title = f"{node.label}: {node.name}" if node.number is not None else node.name
+                        log.info(f"--- {title} ---", extra={"step": node.label})
+                        started[node] = time.monotonic()
+                        running[pool.submit(bind_context(node.func, step=node.label), pacer)] = node
+
+            if not running:
+                break
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                node = running.pop(future)
+                duration = round(time.monotonic() - started.pop(node), 3)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    log.error(f"{node.label} 执行出错: {str(e)}", extra={"step": node.label, **failure_fields(e)})
+                    result = False
+                if not result:
+                    log.error(f"{node.label} 失败，终止执行",
+                              extra={"step": node.label, "duration": duration, "success": False})
+                    failed = True
+                    continue
+                log.info(f"{node.label} 完成，用时 {duration:.1f} 秒",
+                         extra={"step": node.label, "duration": duration, "success": True})
+                # 不发交易的步骤（如拆分 HONEY）沿用前置步骤的最新回执，后续步骤仍会等待其确认
+                if not isinstance(result, Mapping):
+                    result = _latest_receipt(receipts.get(dep) for dep in deps[node])
+                receipts[node] = result
+                done.add(node)
+
+    return not failed
@@ -0,0 +1,219 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# 结构化日志
+# 各模块通过 logging.getLogger(__name__) 记录日志，记录只放入内存队列，由后台线程统一写出，
+# 并发账户的工作线程不会阻塞在 stdout / 文件写入上；
+# 每条记录带有 chain / account / step / tx_hash / duration 等字段，写入按大小轮转的 JSON Lines 文件，
+# 控制台默认只显示一行不断刷新的进度（警告和错误仍单独成行），非终端输出时每条记录一行
+
+# 写入 JSON 的结构化字段
+FIELDS = ('chain', 'account', 'step', 'cycle', 'tx_hash', 'duration', 'event', 'success', 'failure')
+
+# 账户处理结束的事件名，控制台进度行按此计数
+ACCOUNT_DONE = 'account_done'
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+
+_context = threading.local()
+_LISTENER = None
+
+
+def current_context():
+    """当前线程的日志上下文字段"""
+    return dict(getattr(_context, 'fields', {}))
+
+
+@contextmanager
+def log_context(**fields):
+    """在 with 块内为当前线程的所有日志记录附加字段（可嵌套）"""
+    previous = current_context()
+    _context.fields = {**previous, **fields}
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+
+def bind_context(func, **fields):
+    """把当前线程的日志上下文（及额外字段）带到线程池中执行的函数"""
+    captured = {**current_context(), **fields}
+
+    def run(*args, **kwargs):
+        with log_context(**captured):
+            return func(*args, **kwargs)
+    return run
+
+
+class _ContextFilter(logging.Filter):
+    """在产生日志的线程中把上下文字段复制到记录上（extra 中显式传入的字段优先）"""
+
+    def filter(self, record):
+        for key, value in current_context().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonLineFormatter(logging.Formatter):
+    """每条记录一行 JSON"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        for key in FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _short_address(address):
+    if isinstance(address, str) and address.startswith('0x') and len(address) > 14:
+        return f"{address[:6]}…{address[-4:]}"
+    return address
+
+
+class ConsoleHandler(logging.Handler):
+    """
+    控制台输出（在后台线程中执行）
+    mode='lines': 每条记录一行，带时间、账户和步骤
+    mode='progress': 普通记录只刷新同一行进度（已完成账户数 / 最近一条消息），警告和错误单独成行
+    """
+
+    def __init__(self, mode='lines', stream=None):
+        super().__init__()
+        self.mode = mode
+        self.stream = stream or sys.stdout
+        self.succeeded = 0
+        self.failed = 0
+        self._progress_shown = False
+
+    def _prefix(self, record):
+        account = _short_address(getattr(record, 'account', None))
+        step = getattr(record, 'step', None)
+        cycle = getattr(record, 'cycle', None)
+        if cycle is not None:
+            step = f"{step or ''}#{cycle}"
+        return ' '.join(str(part) for part in (getattr(record, 'chain', None), account, step) if part)
+
+    def _line(self, record):
+        prefix = self._prefix(record)
+        level = '' if record.levelno == logging.INFO else f"{record.levelname} "
+        time_text = datetime.fromtimestamp(record.created).strftime('%H:%M:%S')
+        return f"{time_text} {level}{f'[{prefix}] ' if prefix else ''}{record.getMessage()}"
+
+    def _clear_progress(self):
+        if self._progress_shown:
+            self.stream.write('\r\033[K')
+            self._progress_shown = False
+
+    def emit(self, record):
+        try:
+            if getattr(record, 'event', None) == ACCOUNT_DONE:
+                if getattr(record, 'success', None):
+                    self.succeeded += 1
+                elif getattr(record, 'success', None) is False:
+                    self.failed += 1
+
+            if self.mode != 'progress' or record.levelno >= logging.WARNING:
+                self._clear_progress()
+                self.stream.write(self._line(record) + '\n')
+            if self.mode == 'progress':
+                prefix = self._prefix(record)
+                message = record.getMessage().replace('\n', ' ')
+                line = (f"[完成 {self.succeeded + self.failed} | 成功 {self.succeeded} 失败 {self.failed}] "
+                        f"{f'{prefix}: ' if prefix else ''}{message}")
+                width = shutil.get_terminal_size().columns - 1
+                self.stream.write('\r\033[K' + line[:width])
+                self._progress_shown = True
+            self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self.mode == 'progress' and self._progress_shown:
+            self.stream.write('\n')
+            self.stream.flush()
+        super().close()
+
+
+def setup_logging(log_file=None, level='INFO', console='auto',
+                  max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT):
+    """
+    安装队列日志：根 logger 只把记录放入队列，后台线程写入控制台和 JSON Lines 文件
+    log_file: 日志文件路径，为空时不写文件
+    console: progress / lines / quiet，auto 时终端上为 progress，否则为 lines
+    重复调用会先停止之前的后台线程
+    """
+    global _LISTENER
+    shutdown_logging()
+
+    if console == 'auto':
+        console = 'progress' if sys.stdout.isatty() else 'lines'
+    handlers = []
+    if console != 'quiet':
+        handlers.append(ConsoleHandler(console))
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+        file_handler.setFormatter(JsonLineFormatter())
+        handlers.append(file_handler)
+
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _LISTENER = logging.handlers.QueueListener(records, *handlers)
+    _LISTENER.start()
+    return _LISTENER
+
+
+def shutdown_logging():
+    """写出队列中剩余的记录并停止后台线程（进程退出时自动调用）"""
+    global _LISTENER
+    if _LISTENER is None:
+        return
+    listener, _LISTENER = _LISTENER, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+atexit.register(shutdown_logging)
+
+
+def add_logging_arguments(parser, default_file):
+    """向命令行解析器添加日志相关参数"""
+    parser.add_argument('--log-file', default=default_file,
+                        help=f'结构化日志文件（JSON Lines，按大小轮转），默认 {default_file}')
+    parser.add_argument('--no-log-file', dest='log_file', action='store_const', const=None,
+                        help='不写日志文件')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='日志级别，DEBUG 时包含交易参数等详细信息，默认 INFO')
+    parser.add_argument('--console', default='auto', choices=['auto', 'progress', 'lines', 'quiet'],
+                        help='控制台输出：progress 只显示一行进度，lines 每条日志一行，quiet 不输出；'
+                             '默认 auto（终端上为 progress）')
@@ -0,0 +1,208 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+
+from .pacing import run_concurrently
+from .shard import lease_key
+from .step_dag import StepNode, run_dag
+from .structured_log import ACCOUNT_DONE, log_context
+
+log = logging.getLogger(__name__)
+
+# 统一任务运行时
+# 各链的协议操作（swap / mint / supply / deposit / stake、claimReward / claimBuffer 等）注册为任务，
+# 任务之间的依赖由输入 / 输出资源推导，执行时复用 step_dag 的依赖图执行器、本地 nonce、交易组装和回执等待；
+# 调度器把多条链的账户交错放入同一个工作线程池，每条链一个 web3 连接，同一端点共享限流器；
+# 新的协议只需要在自己的任务模块里调用 register_chain / register_task，不需要重复实现交易发送流程
+
+# 各链的任务模块：链名 -> (项目目录, 模块名)，模块导入时完成注册
+CHAIN_MODULES = {
+    'berachain': ('berachain', 'bera_tasks'),
+    'humanity': ('humanity', 'humanity_tasks'),
+}
+
+_CHAINS = {}
+_TASKS = {}
+
+
+class Task:
+    """
+    一个已注册的任务
+    func(ctx, pacer): 返回交易回执 / True（成功）或 False（失败）
+    number: 对外的步骤编号（可选）
+    inputs / outputs: 该任务需要 / 产出的资源名
+    """
+
+    def __init__(self, chain, name, func, title=None, number=None, inputs=(), outputs=()):
+        self.chain = chain
+        self.name = name
+        self.func = func
+        self.title = title or name
+        self.number = number
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+
+class ChainSpec:
+    """
+    一条链的接入方式
+    connect(read_rate, write_rate): 返回已安装限流器的 Web3 实例
+    setup(w3): 返回链级共享对象 dict（合约、周期跟踪器等），每次运行只调用一次
+    prepare(ctx): 每个账户开始执行前调用，向 ctx.state 放入账户级状态（如余额账本）
+    """
+
+    def __init__(self, name, connect, setup=None, prepare=None):
+        self.name = name
+        self.connect = connect
+        self.setup = setup
+        self.prepare = prepare
+
+
+def register_chain(name, connect, setup=None, prepare=None):
+    _CHAINS[name] = ChainSpec(name, connect, setup, prepare)
+    _TASKS.setdefault(name, [])
+    return _CHAINS[name]
+
+
+def register_task(chain, name, title=None, number=None, inputs=(), outputs=()):
+    """注册任务的装饰器，任务按注册顺序排列"""
+    def decorator(func):
+        tasks = _TASKS.setdefault(chain, [])
+        tasks[:] = [task for task in tasks if task.name != name]
+        tasks.append(Task(chain, name, func, title, number, inputs, outputs))
+        return func
+    return decorator
+
+
+def chain_tasks(chain):
+    """链上已注册的全部任务"""
+    return list(_TASKS.get(chain, []))
+
+
+def load_chain(name):
+    """导入链的任务模块（跨项目目录时把该目录加入模块搜索路径），返回 ChainSpec"""
+    if name not in _CHAINS:
+        if name not in CHAIN_MODULES:
+            raise ValueError(f"未知的链: {name}，可选 {', '.join(CHAIN_MODULES)}")
+        directory, module = CHAIN_MODULES[name]
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), directory)
+        if path not in sys.path:
+            sys.path.append(path)
+        importlib.import_module(module)
+    return _CHAINS[name]
+
+
+class TaskContext:
+    """
+    一个账户在一条链上执行任务时共享的上下文
+    shared: 链级共享对象；state: 账户级状态；receipts: 各任务的结果（任务名 -> 回执）
+    cycle: 多轮执行时的轮次，None 表示单轮
+    """
+
+    def __init__(self, chain, w3, account, shared=None, state=None, receipts=None, cycle=None):
+        self.chain = chain
+        self.w3 = w3
+        self.account = account
+        self.shared = shared if shared is not None else {}
+        self.state = state if state is not None else {}
+        self.receipts = receipts if receipts is not None else {}
+        self.cycle = cycle
+
+
+def task_nodes(ctx, tasks=None):
+    """把任务转换为依赖图节点，任务结果记录到 ctx.receipts"""
+    nodes = []
+    for task in tasks if tasks is not None else chain_tasks(ctx.chain):
+        def run(pacer, task=task):
+            result = task.func(ctx, pacer)
+            ctx.receipts[task.name] = result
+            return result
+        nodes.append(StepNode(task.number, task.title, run, task.inputs, task.outputs))
+    return nodes
+
+
+class ChainRuntime:
+    """已连接的链：web3 实例和链级共享对象"""
+
+    def __init__(self, spec, read_rate=None, write_rate=None):
+        self.spec = spec
+        self.name = spec.name
+        self.w3 = spec.connect(read_rate, write_rate)
+        self.shared = spec.setup(self.w3) if spec.setup else {}
+
+    def context(self, account):
+        ctx = TaskContext(self.name, self.w3, account, self.shared)
+        if self.spec.prepare:
+            self.spec.prepare(ctx)
+        return ctx
+
+
+class Scheduler:
+    """
+    多链共享的调度器
+    各链的账户交错进入同一个线程池，某条链的账户较多时不会让其他链一直等待；
+    每个账户按依赖图执行该链的全部任务，任务之间等待确认数和抖动
+    """
+
+    def __init__(self, workers=1, confirmations=1, jitter=None, lease_store=None, lease_scope=None):
+        self.workers = workers
+        self.confirmations = confirmations
+        self.jitter = jitter
+        self.lease_store = lease_store
+        self.lease_scope = lease_scope
+        self._sources = []
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def add(self, runtime, accounts):
+        """加入一条链的账户（可以是生成器）"""
+        self._sources.append((runtime, iter(accounts)))
+
+    def _jobs(self):
+        sources = list(self._sources)
+        while sources:
+            for source in list(sources):
+                runtime, accounts = source
+                try:
+                    yield runtime, next(accounts)
+                except StopIteration:
+                    sources.remove(source)
+
+    def _run_job(self, job):
+        runtime, account = job
+        with log_context(chain=runtime.name, account=account['address']):
+            # 租约按链区分：同一地址在不同链上的 nonce 互不影响，可以同时处理
+            key = lease_key(f"{self.lease_scope}:{runtime.name}", account['address'])
+            if self.lease_store and not self.lease_store.acquire(key):
+                log.info(f"{runtime.name} 账户 {account['address']} 已被其他进程处理，跳过")
+                with self._lock:
+                    self.skipped += 1
+                return
+            started = time.monotonic()
+            success = False
+            try:
+                ctx = runtime.context(account)
+                success = run_dag(runtime.w3, task_nodes(ctx), 1, self.confirmations, self.jitter)
+            finally:
+                if self.lease_store:
+                    self.lease_store.release(key, done=success)
+                with self._lock:
+                    if success:
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
+                done = {"event": ACCOUNT_DONE, "success": success, "duration": round(time.monotonic() - started, 3)}
+                if success:
+                    log.info(f"{runtime.name} 账户 {account['address']} 全部任务完成", extra=done)
+                else:
+                    log.error(f"{runtime.name} 账户 {account['address']} 任务执行失败", extra=done)
+
+    def run(self):
+        """执行全部账户，返回 (成功数, 失败数)"""
+        run_concurrently(self._jobs(), self._run_job, self.workers)
+        return self.succeeded, self.failed
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+from collections.abc import Mapping
+
+from eth_abi import encode as abi_encode
+from eth_account import Account
+from web3 import Web3
+
+# 本地交易组装
+# contract.functions.xxx().build_transaction() 每次都会重新解析 ABI、编码参数，并可能补充查询 chainId 等字段；
+# 这里每个合约函数只解析一次 ABI（预先算好函数选择器和参数类型），chainId 按 RPC 端点缓存，
+# nonce / gas 价格由本地的 nonce 管理器和新区块驱动的 gas 价格缓存提供，
+# 组装和签名交易都是纯本地计算，不发送 RPC 请求
+
+_CHAIN_IDS = {}
+_ENCODERS = {}
+_SIGNERS = {}
+_lock = threading.Lock()
+
+
+def _abi_type(item):
+    """把 ABI 参数描述转换为 eth_abi 类型字符串（支持 tuple / tuple[]）"""
+    if item['type'].startswith('tuple'):
+        inner = ','.join(_abi_type(component) for component in item['components'])
+        return f"({inner}){item['type'][len('tuple'):]}"
+    return item['type']
+
+
+def _normalize(item, value, type_suffix=None):
+    """把以 dict 传入的结构体参数按 ABI 中的字段顺序转换为元组（eth_abi 只接受元组）"""
+    type_name = item['type'] if type_suffix is None else type_suffix
+    if type_name.endswith(']'):
+        element = type_name[:type_name.rindex('[')]
+        return [_normalize(item, element_value, element) for element_value in value]
+    if type_name == 'tuple':
+        if isinstance(value, Mapping):
+            value = [value[component['name']] for component in item['components']]
+        return tuple(_normalize(component, element_value)
+                     for component, element_value in zip(item['components'], value))
+    return value
+
+
+class FunctionEncoder:
+    """单个合约函数的调用数据编码器，函数选择器和参数 / 返回值类型只计算一次"""
+
+    def __init__(self, fn_abi):
+        self.fn_abi = fn_abi
+        self.types = [_abi_type(item) for item in fn_abi['inputs']]
+        self.output_types = [_abi_type(item) for item in fn_abi.get('outputs', [])]
+        self.selector = bytes(Web3.keccak(text=f"{fn_abi['name']}({','.join(self.types)})")[:4])
+
+    def encode_bytes(self, args):
+        values = [_normalize(item, value) for item, value in zip(self.fn_abi['inputs'], args)]
+        return self.selector + abi_encode(self.types, values)
+
+    def encode(self, args):
+        return Web3.to_hex(self.encode_bytes(args))
+
+
+def function_encoder(abi, fn_name):
+    """返回 ABI 中 fn_name 函数的编码器（按 ABI 对象缓存，ABI 为模块级常量或 load_abi 的缓存结果）"""
+    key = (id(abi), fn_name)
+    cached = _ENCODERS.get(key)
+    if cached is None:
+        items = [item for item in abi if item.get('type') == 'function' and item.get('name') == fn_name]
+        if not items:
+            raise ValueError(f"合约 ABI 中没有函数 {fn_name}")
+        # 同时保存 ABI 引用，避免 ABI 对象被回收后 id 被复用
+        cached = (abi, FunctionEncoder(items[0]))
+        with _lock:
+            _ENCODERS[key] = cached
+    return cached[1]
+
+
+def chain_id(w3):
+    """链 ID，每个 RPC 端点只查询一次"""
+    endpoint = getattr(w3.provider, 'endpoint_uri', None) or id(w3.provider)
+    value = _CHAIN_IDS.get(endpoint)
+    if value is None:
+        value = w3.eth.chain_id
+        with _lock:
+            _CHAIN_IDS[endpoint] = value
+    return value
+
+
+def assemble(w3, contract, fn_name, args, gas, gas_price, value=0):
+    """
+    组装合约调用交易（不含 nonce），与 build_transaction 的结果等价
+    gas / gas_price: 由调用方提供，不会估算或查询
+    """
+    return {
+        'to': contract.address,
+        'data': function_encoder(contract.abi, fn_name).encode(args),
+        'value': value,
+        'gas': gas,
+        'gasPrice': gas_price,
+        'chainId': chain_id(w3)
+    }
+
+
+def _signer_key(private_key):
+    # 按私钥的哈希缓存：同一地址的私钥被更正（账户文件重新加载、keystore agent reload）后不会沿用旧的签名对象，
+    # 缓存键里也不保存私钥本身
+    if isinstance(private_key, bytes):
+        private_key = private_key.hex()
+    return hashlib.sha256(private_key.lower().removeprefix('0x').encode('utf-8')).digest()
+
+
+def sign(account, transaction):
+    """用账户私钥签名交易，私钥对应的本地账户对象按私钥哈希缓存"""
+    key = _signer_key(account['private_key'])
+    signer = _SIGNERS.get(key)
+    if signer is None:
+        signer = Account.from_key(account['private_key'])
+        with _lock:
+            _SIGNERS[key] = signer
+    return signer.sign_transaction(transaction)
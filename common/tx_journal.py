@@ -0,0 +1,273 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from web3 import Web3
+
+from .shard import lease_owner
+
+log = logging.getLogger(__name__)
+
+# 交易预写日志
+# 每笔交易签名后、广播前先把 原始交易 / nonce / 哈希 追加写入日志并 fsync，拿到回执后再追加一条结束记录；
+# 进程在广播和回执之间崩溃时，下次启动先对照链上状态核对日志中未结束的交易：
+# 已上链的补记结果，仍在交易池中的继续等待回执，被丢弃且 nonce 未被占用的重新广播，nonce 已被其他交易占用的标记为已替换
+#
+# 多进程（分片 / 租约）从同一目录启动时默认路径相同：每个进程在存活期间用 flock 独占自己写入的日志文件，
+# 默认文件已被其他存活进程占用时改写 <日志名>.<主机>-<pid>.jsonl；核对时只处理自己的日志和
+# 没有存活进程持有的同组日志（进程已退出或崩溃），不会动其他进程正在进行的交易，重写日志时也不会丢失其他进程追加的记录
+
+# 结束状态
+MINED = 'mined'        # 已上链（成功）
+FAILED = 'failed'      # 已上链（执行失败）
+REJECTED = 'rejected'  # 节点拒绝，未进入交易池
+REPLACED = 'replaced'  # 同一 nonce 的其他交易已上链
+
+
+class TxJournal:
+    """
+    仅追加的交易日志（JSON Lines）
+    交易记录: {"hash", "address", "nonce", "raw", "label", "time"}
+    结束记录: {"hash", "status", "time"}
+    """
+
+    def __init__(self, path, base=None):
+        self.path = path
+        self.base = base or path
+        self._lock = threading.Lock()
+        self._lock_file = None
+
+    def try_lock(self):
+        """非阻塞地独占本日志文件（直到 unlock 或进程退出），已被其他进程持有时返回 False"""
+        lock_file = open(f"{self.path}.lock", 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def unlock(self):
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def orphans(self):
+        """同组（同一默认路径派生）中没有存活进程持有的其他日志，返回时已加锁，用完后调用 unlock"""
+        root, ext = os.path.splitext(self.base)
+        for path in sorted(set(glob.glob(f"{glob.escape(root)}.*{ext}")) | {self.base}):
+            if path == self.path or not os.path.exists(path):
+                continue
+            other = TxJournal(path, self.base)
+            if other.try_lock():
+                yield other
+
+    def discard(self):
+        """删除已核对完的进程专用日志（默认路径的日志保留）"""
+        if self.path != self.base:
+            for path in (self.path, f"{self.path}.lock"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record(self, address, nonce, tx_hash, raw_transaction, label=None):
+        """广播前调用，记录已签名的原始交易"""
+        self._append({
+            "hash": Web3.to_hex(tx_hash),
+            "address": address.lower(),
+            "nonce": nonce,
+            "raw": Web3.to_hex(raw_transaction),
+            "label": label,
+            "time": int(time.time())
+        })
+
+    def finish(self, tx_hash, status):
+        """记录交易的结束状态"""
+        self._append({"hash": Web3.to_hex(tx_hash), "status": status, "time": int(time.time())})
+
+    def finish_receipt(self, receipt):
+        self.finish(receipt['transactionHash'], MINED if receipt['status'] == 1 else FAILED)
+
+    def open_entries(self):
+        """返回所有没有结束记录的交易（按写入顺序）"""
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时可能留下写了一半的最后一行
+                        continue
+                    if 'status' in record:
+                        entries.pop(record['hash'], None)
+                    else:
+                        entries[record['hash']] = record
+        except FileNotFoundError:
+            pass
+        return list(entries.values())
+
+    def compact(self):
+        """重写日志，只保留未结束的交易（调用方须持有本日志的文件锁，其他进程不会同时追加）"""
+        with self._lock:
+            entries = self.open_entries()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+
+def reconcile(w3, journal, timeout=120):
+    """
+    启动时核对本进程的日志，以及同组中已没有存活进程持有的日志（其他进程退出或崩溃后留下的）
+    返回 {状态: 交易数}
+    """
+    summary = {}
+    for other in journal.orphans():
+        try:
+            for status, count in _reconcile_journal(w3, other, timeout).items():
+                summary[status] = summary.get(status, 0) + count
+            if not other.open_entries():
+                other.discard()
+        finally:
+            other.unlock()
+    for status, count in _reconcile_journal(w3, journal, timeout).items():
+        summary[status] = summary.get(status, 0) + count
+    return summary
+
+
+def _reconcile_journal(w3, journal, timeout):
+    """
+    核对一个日志文件中未结束的交易（调用方须持有该日志的文件锁）
+    同一地址同一 nonce 可能有多笔（提高 gas 后重发），任意一笔上链则其余标记为已替换
+    """
+    from web3.exceptions import TransactionNotFound
+    from .ws_heads import wait_for_transaction_receipt
+    from .broadcast import send_raw_transaction
+
+    groups = {}
+    for entry in journal.open_entries():
+        groups.setdefault((entry['address'], entry['nonce']), []).append(entry)
+    if not groups:
+        journal.compact()
+        return {}
+
+    log.info(f"交易日志 {journal.path} 中有 {sum(len(group) for group in groups.values())} 笔未完成的交易，开始核对...")
+    summary = {}
+
+    def close(entry, status):
+        journal.finish(entry['hash'], status)
+        summary[status] = summary.get(status, 0) + 1
+        log.info(f"{entry['label'] or ''} {entry['hash']} (nonce {entry['nonce']}): {status}",
+                 extra={"tx_hash": entry['hash']})
+
+    for (address, nonce), group in groups.items():
+        mined = None
+        pending = []
+        for entry in group:
+            try:
+                mined = w3.eth.get_transaction_receipt(entry['hash'])
+                mined_entry = entry
+                break
+            except TransactionNotFound:
+                pass
+            try:
+                w3.eth.get_transaction(entry['hash'])
+                pending.append(entry)
+            except TransactionNotFound:
+                pass
+
+        if mined is None and pending:
+            # 仍在交易池中，继续等待回执
+            for entry in pending:
+                log.info(f"{entry['label'] or ''} {entry['hash']} 仍在交易池中，等待回执...",
+                         extra={"tx_hash": entry['hash']})
+                try:
+                    mined = wait_for_transaction_receipt(w3, entry['hash'], timeout=timeout)
+                    mined_entry = entry
+                    break
+                except Exception as e:
+                    log.warning(f"等待回执失败: {str(e)}")
+
+        if mined is None:
+            confirmed_nonce = w3.eth.get_transaction_count(Web3.to_checksum_address(address), 'latest')
+            if confirmed_nonce > nonce:
+                for entry in group:
+                    close(entry, REPLACED)
+                continue
+            if pending:
+                # 仍在交易池中但超时未上链，保留记录，下次启动再核对
+                continue
+            # 交易被丢弃且 nonce 未被占用：重新广播最后一次签名的交易（gas 价格最高）
+            entry = group[-1]
+            try:
+                send_raw_transaction(w3, entry['raw'], entry['hash'])
+                log.warning(f"{entry['label'] or ''} {entry['hash']} 已被丢弃，重新广播",
+                            extra={"tx_hash": entry['hash']})
+                mined = wait_for_transaction_receipt(w3, entry['hash'], timeout=timeout)
+                mined_entry = entry
+            except Exception as e:
+                log.error(f"重新广播失败: {str(e)}")
+                if 'nonce too low' in str(e):
+                    for entry in group:
+                        close(entry, REPLACED)
+                continue
+
+        close(mined_entry, MINED if mined['status'] == 1 else FAILED)
+        for entry in group:
+            if entry is not mined_entry:
+                close(entry, REPLACED)
+
+    journal.compact()
+    return summary
+
+
+_JOURNAL = None
+
+
+def open_journal(path):
+    """
+    打开全局交易日志，path 为空时不记录
+    默认文件已被其他存活进程独占时，本进程改写 <日志名>.<主机>-<pid>.jsonl
+    """
+    global _JOURNAL
+    if not path:
+        _JOURNAL = None
+        return None
+    journal = TxJournal(path)
+    if not journal.try_lock():
+        root, ext = os.path.splitext(path)
+        journal = TxJournal(f"{root}.{lease_owner().replace(':', '-')}{ext}", base=path)
+        journal.try_lock()
+        log.info(f"交易日志 {path} 正被其他进程使用，本进程写入 {journal.path}")
+    _JOURNAL = journal
+    return _JOURNAL
+
+
+def current_journal():
+    return _JOURNAL
+
+
+def add_journal_arguments(parser, default_path):
+    """向命令行解析器添加交易日志相关参数"""
+    parser.add_argument('--tx-journal', default=default_path,
+                        help=f'交易预写日志路径，启动时核对并重新广播未完成的交易，默认 {default_path}')
+    parser.add_argument('--no-tx-journal', dest='tx_journal', action='store_const', const=None,
+                        help='不记录交易日志')
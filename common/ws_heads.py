@@ -0,0 +1,212 @@
+import json
+import logging
+import threading
+import time
+
+from web3 import Web3
+
+log = logging.getLogger(__name__)
+
+# WebSocket 新区块订阅
+# 通过 eth_subscribe newHeads 实时获取新区块，由新区块驱动交易回执查询、gas 价格更新等，
+# 回执在所在区块出现后立即被发现，不再按固定间隔轮询；连接断开时自动指数退避重连。
+# 没有配置 WebSocket 时所有函数自动回退到原有的 HTTP 轮询方式
+
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
+
+class HeadWatcher:
+    """
+    newHeads 订阅器（后台线程）
+    latest: 最新区块头 dict（number / timestamp / baseFeePerGas 均已转换为 int）
+    """
+
+    def __init__(self, ws_url):
+        self.ws_url = ws_url
+        self.latest = None
+        self.connected = False
+        self._cond = threading.Condition()
+        self._listeners = []
+        self._gas_price = (None, None)  # (区块号, gas 价格)
+        self._gas_lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+
+    def on_head(self, callback):
+        """注册新区块回调 callback(head)，在订阅线程中调用"""
+        self._listeners.append(callback)
+
+    def _run(self):
+        from websockets.sync.client import connect
+
+        delay = RECONNECT_MIN_DELAY
+        while not self._stopped:
+            try:
+                with connect(self.ws_url, open_timeout=10) as ws:
+                    ws.send(json.dumps({
+                        "jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]
+                    }))
+                    self.connected = True
+                    delay = RECONNECT_MIN_DELAY
+                    log.info(f"已订阅新区块: {self.ws_url}")
+                    for message in ws:
+                        if self._stopped:
+                            return
+                        self._handle(json.loads(message))
+            except Exception as e:
+                log.warning(f"新区块订阅断开: {str(e)}，{delay} 秒后重连")
+            self.connected = False
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    def _handle(self, message):
+        if message.get('method') != 'eth_subscription':
+            if 'error' in message:
+                log.error(f"订阅 newHeads 失败: {message['error']}")
+            return
+        raw = message['params']['result']
+        head = {
+            "number": int(raw['number'], 16),
+            "timestamp": int(raw['timestamp'], 16),
+            "hash": raw.get('hash'),
+            "baseFeePerGas": int(raw['baseFeePerGas'], 16) if raw.get('baseFeePerGas') else None
+        }
+        with self._cond:
+            if self.latest and head['number'] <= self.latest['number']:
+                return
+            self.latest = head
+            self._cond.notify_all()
+        for callback in self._listeners:
+            try:
+                callback(head)
+            except Exception as e:
+                log.error(f"新区块回调出错: {str(e)}")
+
+    def wait_for_block(self, number, timeout=None):
+        """等待区块高度达到 number，返回最新区块头；超时返回 None"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self.latest or self.latest['number'] < number:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining if remaining is not None else 5)
+            return self.latest
+
+    def wait_for_next_block(self, timeout):
+        """等待下一个新区块，超时返回 None"""
+        with self._cond:
+            current = self.latest['number'] if self.latest else -1
+        return self.wait_for_block(current + 1, timeout)
+
+    def wait_for_receipt(self, w3, tx_hash, timeout=120, poll_latency=5):
+        """
+        每出现一个新区块查询一次回执；订阅断开期间按 poll_latency 轮询
+        超时抛出与 web3 相同的 TimeExhausted 异常
+        """
+        from web3.exceptions import TimeExhausted, TransactionNotFound
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeExhausted(
+                    f"Transaction {Web3.to_hex(tx_hash)} is not in the chain after {timeout} seconds"
+                )
+            if self.connected:
+                self.wait_for_next_block(min(remaining, poll_latency * 3))
+            else:
+                time.sleep(min(remaining, poll_latency))
+
+    def gas_price(self, w3):
+        """每个区块最多查询一次 gas 价格，同一区块内所有交易共用"""
+        block = self.latest['number'] if self.latest else None
+        with self._gas_lock:
+            cached_block, price = self._gas_price
+            if block is None or cached_block != block:
+                price = w3.eth.gas_price
+                self._gas_price = (block, price)
+            return price
+
+
+_WATCHER = None
+
+
+def start_head_watcher(ws_url):
+    """启动全局新区块订阅，之后本模块的回执等待、gas 价格等函数都会使用它"""
+    global _WATCHER
+    if ws_url:
+        _WATCHER = HeadWatcher(ws_url).start()
+    return _WATCHER
+
+
+def current_watcher():
+    return _WATCHER
+
+
+def wait_for_transaction_receipt(w3, tx_hash, timeout=120, poll_latency=0.1):
+    """有新区块订阅时由新区块驱动查询回执，否则使用 web3 的轮询实现"""
+    if _WATCHER:
+        return _WATCHER.wait_for_receipt(w3, tx_hash, timeout, poll_latency)
+    return w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout, poll_latency=poll_latency)
+
+
+def gas_price(w3):
+    """有新区块订阅时每个区块只查询一次 gas 价格，否则每次都查询"""
+    if _WATCHER:
+        return _WATCHER.gas_price(w3)
+    return w3.eth.gas_price
+
+
+def block_number(w3):
+    """最新区块号，有新区块订阅时直接读取本地缓存"""
+    if _WATCHER and _WATCHER.connected and _WATCHER.latest:
+        return _WATCHER.latest['number']
+    return w3.eth.block_number
+
+
+class LockedWebsocketProvider:
+    """
+    用 WebSocket 发送 RPC 请求的 provider 工厂
+    web3 的同步 WebsocketProvider 在一条连接上收发，多线程并发请求会串包，这里加锁保证一次只有一个请求在途
+    """
+
+    @staticmethod
+    def create(ws_url):
+        from web3.providers.websocket import WebsocketProvider
+
+        class _Provider(WebsocketProvider):
+            _request_lock = threading.Lock()
+
+            def make_request(self, method, params):
+                with self._request_lock:
+                    return super().make_request(method, params)
+
+        return _Provider(ws_url, websocket_timeout=30)
+
+
+def create_provider(http_url, ws_url=None, ws_transport=False):
+    """根据参数选择 HTTP 或 WebSocket provider"""
+    if ws_url and ws_transport:
+        return LockedWebsocketProvider.create(ws_url)
+    return Web3.HTTPProvider(http_url)
+
+
+def add_ws_arguments(parser, default_ws_url=None):
+    """向命令行解析器添加 WebSocket 相关参数"""
+    parser.add_argument('--ws-url', default=default_ws_url,
+                        help='WebSocket RPC 地址，配置后订阅 newHeads 驱动回执查询和 gas 价格更新')
+    parser.add_argument('--ws-transport', action='store_true',
+                        help='RPC 请求也通过 WebSocket 发送（默认仍使用 HTTP）')
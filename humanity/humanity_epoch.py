@@ -0,0 +1,60 @@
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# 周期（epoch）跟踪
+# 合约的周期由 cycleStartTimestamp 推算：(区块时间 - cycleStartTimestamp) / 1 天 + 1 + 上一轮最后周期，
+# 这里启动时读取一次 currentEpoch 和 cycleStartTimestamp，之后根据新区块时间（没有订阅时用本地时间）判断是否跨过周期边界，
+# 只在跨过边界时重新向合约确认，不再每个账户查询一次 currentEpoch
+
+EPOCH_LENGTH = 24 * 60 * 60
+
+
+class EpochTracker:
+    """
+    当前周期跟踪器
+    current(): 返回当前周期号
+    on_head(head): 新区块回调，跨过周期边界时刷新并打印提示
+    """
+
+    def __init__(self, w3, contract):
+        self.w3 = w3
+        self.contract = contract
+        self.epoch = None
+        self.cycle_start = None
+        self.next_boundary = None
+        self._lock = threading.Lock()
+
+    def refresh(self, block_identifier='latest'):
+        """从合约读取当前周期，并推算下一个周期边界的时间"""
+        block = self.w3.eth.get_block(block_identifier)
+        epoch = self.contract.functions.currentEpoch().call(block_identifier=block['number'])
+        cycle_start = self.contract.functions.cycleStartTimestamp().call(block_identifier=block['number'])
+        with self._lock:
+            previous = self.epoch
+            self.epoch = epoch
+            self.cycle_start = cycle_start
+            if cycle_start and block['timestamp'] >= cycle_start:
+                elapsed_days = (block['timestamp'] - cycle_start) // EPOCH_LENGTH
+                self.next_boundary = cycle_start + (elapsed_days + 1) * EPOCH_LENGTH
+            else:
+                # 合约未启动，一天后再确认
+                self.next_boundary = block['timestamp'] + EPOCH_LENGTH
+        if previous is not None and previous != epoch:
+            log.info(f"周期已切换: {previous} -> {epoch}")
+        return epoch
+
+    def _check(self, timestamp, block_identifier='latest'):
+        if self.next_boundary is None or timestamp >= self.next_boundary:
+            self.refresh(block_identifier)
+
+    def on_head(self, head):
+        self._check(head['timestamp'], head['number'])
+
+    def current(self):
+        """当前周期号，只在跨过周期边界时才查询合约"""
+        self._check(time.time())
+        return self.epoch
+
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from web3 import Web3
+
+from common.multicall import MULTICALL3_ADDRESS, batch_call
+
+log = logging.getLogger(__name__)
+
+# 领取前的全局预检
+# 合约未激活 / 账户未注册时 claimReward 会直接 revert，原先要等每个账户构建、签名交易后才从异常信息里发现，
+# 这里每轮开始时检查一次合约激活状态，未激活时整轮跳过；
+# 账户按批次通过 Multicall 批量查询 VC 合约的 isRegistered，未注册的地址写入持久化缓存，缓存有效期内不再查询和尝试
+
+DEFAULT_UNREGISTERED_TTL = 24 * 60 * 60
+REGISTRATION_BATCH = 200
+UNREGISTERED_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "unregistered_cache.json")
+
+# VC 合约 ABI（注册状态和计算奖励用到的用户数）
+VC_ABI = [
+    {
+        "inputs": [{"internalType": "address", "name": "user", "type": "address"}],
+        "name": "isRegistered",
+        "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "totalUsers",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [{"internalType": "address", "name": "user", "type": "address"}],
+        "name": "getUsersCountOnRegistration",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    }
+]
+
+
+def _storage_int(w3, address, slot):
+    return int.from_bytes(bytes(w3.eth.get_storage_at(address, slot)), 'big')
+
+
+def read_contract_state(w3, contract):
+    """
+    读取 Rewards 合约的激活状态和 VC 合约地址
+    两者都是私有变量且打包在同一个存储槽中（bool _contractActive 在最低字节，其后 20 字节为 address _vcContract），
+    存储布局通过相邻槽位的 _cycleStartTimestamp 与 cycleStartTimestamp() 对比确认（兼容 OpenZeppelin v4 / v5 的 Initializable）
+    布局无法确认时返回 (None, None)
+    """
+    cycle_start = contract.functions.cycleStartTimestamp().call()
+    if not cycle_start:
+        return None, None
+    for start_slot in (2, 3):
+        if _storage_int(w3, contract.address, start_slot) != cycle_start:
+            continue
+        packed = _storage_int(w3, contract.address, start_slot + 1)
+        active = bool(packed & 0xff)
+        vc_address = Web3.to_checksum_address(f"0x{(packed >> 8) & ((1 << 160) - 1):040x}")
+        return active, vc_address
+    return None, None
+
+
+def simulate_active(contract, probe_address):
+    """用 eth_call 模拟 claimReward 判断合约是否激活（合约首先检查激活状态）"""
+    try:
+        contract.functions.claimReward().call({'from': Web3.to_checksum_address(probe_address)})
+    except Exception as e:
+        if "contract not active" in str(e):
+            return False
+    return True
+
+
+class UnregisteredCache:
+    """
+    未注册地址的持久化缓存 {小写地址: 查询时间}
+    path: 缓存文件，为 None 时只在内存中缓存（RPC 回放时使用）
+    ttl: 有效期（秒），过期后重新查询
+    """
+
+    def __init__(self, path=UNREGISTERED_CACHE_FILE, ttl=DEFAULT_UNREGISTERED_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (FileNotFoundError, ValueError):
+                pass
+
+    def contains(self, address):
+        checked_at = self._entries.get(address.lower())
+        return checked_at is not None and time.time() - checked_at < self.ttl
+
+    def add(self, addresses):
+        now = int(time.time())
+        with self._lock:
+            for address in addresses:
+                self._entries[address.lower()] = now
+            self._save()
+
+    def _save(self):
+        # 顺便清理过期记录；先写临时文件再替换，中途崩溃不会留下损坏的缓存
+        now = time.time()
+        self._entries = {address: checked_at for address, checked_at in self._entries.items()
+                         if now - checked_at < self.ttl}
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+
+
+class Preflight:
+    """
+    每轮执行前的预检
+    vc_address: VC 合约地址，不传时从 Rewards 合约存储中读取
+    """
+
+    def __init__(self, w3, contract, cache, vc_address=None):
+        self.w3 = w3
+        self.contract = contract
+        self.cache = cache
+        self.vc_address = vc_address
+        self._use_multicall = None
+
+    def contract_active(self, probe_address=None):
+        """检查合约是否激活，顺便确定 VC 合约地址"""
+        active, vc_address = read_contract_state(self.w3, self.contract)
+        if self.vc_address is None and vc_address is not None:
+            self.vc_address = vc_address
+            log.info(f"VC 合约地址: {vc_address}")
+        if active is None:
+            active = simulate_active(self.contract, probe_address or self.contract.address)
+        return active
+
+    def vc_contract(self):
+        """VC 合约实例，地址未知时返回 None"""
+        if self.vc_address is None:
+            return None
+        return self.w3.eth.contract(address=self.vc_address, abi=VC_ABI)
+
+    def read_calls(self, calls):
+        """
+        批量只读调用 [(contract, 函数名, 参数列表), ...]
+        链上有 Multicall3 时合并为一次 eth_call，否则逐个调用；失败的位置为 None
+        """
+        if self._use_multicall is None:
+            self._use_multicall = len(self.w3.eth.get_code(MULTICALL3_ADDRESS)) > 0
+        if self._use_multicall:
+            return batch_call(self.w3, calls)
+        results = []
+        for contract, fn_name, args in calls:
+            try:
+                results.append(getattr(contract.functions, fn_name)(*args).call())
+            except Exception:
+                results.append(None)
+        return results
+
+    def _registered_flags(self, vc_contract, addresses):
+        return self.read_calls([(vc_contract, 'isRegistered', [address]) for address in addresses])
+
+    def filter_registered(self, accounts, batch_size=REGISTRATION_BATCH):
+        """
+        过滤掉未注册的账户（生成器，按批次查询）
+        缓存中的未注册地址直接跳过；查询失败的账户照常处理
+        """
+        if self.vc_address is None:
+            log.warning("无法确定 VC 合约地址，跳过注册状态预检（可以通过 --vc-contract 指定）")
+            yield from accounts
+            return
+        vc_contract = self.vc_contract()
+        skipped_cached = 0
+
+        batch = []
+        for account in accounts:
+            if self.cache.contains(account['address']):
+                skipped_cached += 1
+                continue
+            batch.append(account)
+            if len(batch) >= batch_size:
+                yield from self._check_batch(vc_contract, batch)
+                batch = []
+        if batch:
+            yield from self._check_batch(vc_contract, batch)
+        if skipped_cached:
+            log.info(f"跳过缓存中未注册的账户 {skipped_cached} 个")
+
+    def _check_batch(self, vc_contract, batch):
+        addresses = [Web3.to_checksum_address(account['address']) for account in batch]
+        flags = self._registered_flags(vc_contract, addresses)
+        unregistered = [account for account, flag in zip(batch, flags) if flag is False]
+        if unregistered:
+            log.info(f"本批 {len(batch)} 个账户中有 {len(unregistered)} 个未在 VC 合约中注册，已跳过并缓存")
+            self.cache.add(account['address'] for account in unregistered)
+        return [account for account, flag in zip(batch, flags) if flag is not False]
+
+
+def add_preflight_arguments(parser):
+    """向命令行解析器添加预检相关参数"""
+    parser.add_argument('--vc-contract', default=None,
+                        help='VC 合约地址，默认从 Rewards 合约存储中读取')
+    parser.add_argument('--unregistered-cache', default=UNREGISTERED_CACHE_FILE,
+                        help=f'未注册地址缓存文件，默认 {UNREGISTERED_CACHE_FILE}')
+    parser.add_argument('--unregistered-ttl', type=int, default=DEFAULT_UNREGISTERED_TTL,
+                        help=f'未注册地址缓存有效期（秒），默认 {DEFAULT_UNREGISTERED_TTL}')
@@ -0,0 +1,141 @@
+import heapq
+import logging
+import time
+
+from web3 import Web3
+
+from humanity_rewards import FleetState, claim_value
+
+log = logging.getLogger(__name__)
+
+# 按预期收益调度账户
+# 按文件顺序领取时，领取窗口或 RPC 预算用尽后 userBuffer 很大、尚未领取创世奖励的账户可能排在后面来不及处理；
+# 这里每轮开始时批量读取全部账户的链上状态，用 humanity_rewards 计算本周期领取一次的预期收益，
+# 放入优先队列，收益高的账户先处理，本周期已领取的账户直接跳过；
+# 周期结束是排序的截止时间：跨过周期边界后队列中剩余账户的状态已经过期（上一周期的 buffer 作废、可以再次领取），
+# 重新读取后再排序；指定时间预算时，预算用尽后不再开始新的账户
+
+STATE_BATCH = 200
+WEI = 10 ** 18
+
+
+def _read_batch(preflight, calls):
+    try:
+        return preflight.read_calls(calls)
+    except Exception as e:
+        log.warning(f"批量读取账户状态失败: {str(e)}")
+        return [None] * len(calls)
+
+
+def read_claim_values(preflight, contract, accounts, epoch):
+    """
+    批量读取账户在 epoch 周期的状态，计算领取一次的预期收益（HUM）
+    返回 (values, claimed)：values 中状态读取失败的账户为 None，claimed 表示本周期是否已领取
+    """
+    vc_contract = preflight.vc_contract()
+    total_users = 0
+    if vc_contract is None:
+        log.warning("无法确定 VC 合约地址，预期收益按最高的创世奖励 / 每日奖励估算")
+    else:
+        total_users = _read_batch(preflight, [(vc_contract, 'totalUsers', [])])[0] or 0
+
+    rows = []
+    for start in range(0, len(accounts), STATE_BATCH):
+        addresses = [Web3.to_checksum_address(account['address']) for account in accounts[start:start + STATE_BATCH]]
+        calls = []
+        for address in addresses:
+            calls.append((contract, 'userGenesisClaimStatus', [address]))
+            calls.append((contract, 'userBuffer', [address]))
+            calls.append((contract, 'userClaimStatus', [address, epoch]))
+            if vc_contract is not None:
+                calls.append((vc_contract, 'getUsersCountOnRegistration', [address]))
+        width = 4 if vc_contract is not None else 3
+        results = _read_batch(preflight, calls)
+        rows.extend(results[i:i + width] for i in range(0, len(results), width))
+
+    ok = [all(value is not None for value in row) for row in rows]
+    row_values = [row if good else [False, 0, (False, 0), 0] for row, good in zip(rows, ok)]
+    state = FleetState(
+        [account['address'] for account in accounts],
+        [row[0] for row in row_values],
+        [row[3] if len(row) > 3 else 0 for row in row_values],
+        [row[1] / WEI for row in row_values],
+        [row[2][1] / WEI for row in row_values],
+        [row[2][0] for row in row_values]
+    )
+    values = claim_value(state, total_users)
+    return ([float(value) if good else None for value, good in zip(values, ok)],
+            [bool(claimed) and good for claimed, good in zip(state.claimed_current, ok)])
+
+
+class ClaimScheduler:
+    """
+    按预期收益排序的账户调度器
+    preflight: 预检对象，提供批量只读调用和 VC 合约
+    epochs: 周期跟踪器，提供当前周期号和下一个周期边界
+    time_budget: 时间预算（秒），None 表示不限制
+    """
+
+    def __init__(self, preflight, contract, epochs, time_budget=None):
+        self.preflight = preflight
+        self.contract = contract
+        self.epochs = epochs
+        self.time_budget = time_budget
+
+    def _build_queue(self, accounts, epoch):
+        """读取状态并建立优先队列 [(-预期收益, 原顺序, 账户)]，状态读取失败的账户排在最后"""
+        values, claimed = read_claim_values(self.preflight, self.contract, accounts, epoch)
+        queue = []
+        for index, (account, value, done) in enumerate(zip(accounts, values, claimed)):
+            if done:
+                continue
+            queue.append((-value if value is not None else float('inf'), index, account))
+        heapq.heapify(queue)
+
+        known = [value for value, done in zip(values, claimed) if value is not None and not done]
+        deadline = ''
+        if self.epochs.next_boundary:
+            deadline = f"（距结束 {max(self.epochs.next_boundary - time.time(), 0) / 3600:.1f} 小时）"
+        log.info(f"周期 {epoch}{deadline}按预期收益排序 {len(queue)} 个账户："
+                 f"合计 {sum(known):.2f} HUM，最高 {max(known, default=0):.2f} HUM，"
+                 f"本周期已领取跳过 {sum(claimed)} 个，状态读取失败 {values.count(None)} 个")
+        return queue
+
+    def schedule(self, accounts):
+        """
+        按预期收益从高到低依次产出账户（生成器，交给 run_concurrently 按需取用）
+        排序需要全部账户的状态，账户列表会一次性展开
+        """
+        started = time.monotonic()
+        epoch = self.epochs.current()
+        queue = self._build_queue(list(accounts), epoch)
+        while queue:
+            if self.time_budget is not None and time.monotonic() - started >= self.time_budget:
+                value = sum(-key for key, _, _ in queue if key != float('inf'))
+                log.warning(f"时间预算已用尽，剩余 {len(queue)} 个账户未处理（预期收益合计 {value:.2f} HUM）")
+                return
+            current = self.epochs.current()
+            if current != epoch:
+                # 跨过周期边界，剩余账户按新周期的状态重新排序
+                epoch = current
+                queue = self._build_queue([account for _, _, account in queue], epoch)
+                continue
+            yield heapq.heappop(queue)[2]
+
+
+def within_time_budget(accounts, time_budget):
+    """按原顺序产出账户，时间预算（秒）用尽后停止"""
+    started = time.monotonic()
+    for count, account in enumerate(accounts):
+        if time.monotonic() - started >= time_budget:
+            log.warning(f"时间预算已用尽，已开始处理 {count} 个账户，其余账户本轮不再处理")
+            return
+        yield account
+
+
+def add_priority_arguments(parser):
+    """向命令行解析器添加调度相关参数"""
+    parser.add_argument('--prioritize', action='store_true',
+                        help='按本周期预期收益（奖励 + buffer）从高到低处理账户，跳过本周期已领取的账户')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='本轮的时间预算（秒），用尽后不再开始新的账户（配合 --prioritize 先处理高收益账户）')
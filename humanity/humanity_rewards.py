@@ -0,0 +1,199 @@
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+# 离线奖励计算器
+# 按 source.txt 中 Rewards 合约的逻辑（_calculateDailyReward / _calculateGenesisReward / _increaseBuffer）
+# 用 NumPy 对所有账户、多个周期向量化计算每日奖励、创世奖励和推荐 buffer，不发送任何 RPC 请求，
+# 输入为事先索引好的链上状态（见 load_state），可用于按预期收益排序、跳过或安排领取
+# 金额以 ether 为单位的 float64 表示；合约按 wei 整数逐层减半，层数超过 18 后每层有不足 1 wei 的取整差异
+
+# 推荐人层级上限（推荐树更深的部分分到的 buffer 可以忽略）
+MAX_REFERRAL_DEPTH = 64
+
+
+def daily_reward(total_users):
+    """
+    每日奖励（ether），total_users 为 VC 合约的 totalUsers()，可以是标量或数组
+    与合约一致：10000001、100000001、500000001 三个边界值不落在任何区间，奖励为 0
+    """
+    users = np.asarray(total_users, dtype=np.int64)
+    conditions = [
+        users <= 500000,
+        (500000 < users) & (users <= 1000000),
+        (1000000 < users) & (users <= 5000000),
+        (5000000 < users) & (users <= 10000000),
+        (10000001 < users) & (users <= 50000000),
+        (50000000 < users) & (users <= 100000000),
+        (100000001 < users) & (users <= 500000000),
+        users > 500000001,
+    ]
+    return np.select(conditions, [100, 75, 50, 25, 10, 5, 2, 1], default=0).astype(np.float64)
+
+
+def genesis_reward(users_count_on_registration):
+    """创世奖励（ether），参数为 VC 合约的 getUsersCountOnRegistration(user)，可以是标量或数组"""
+    users = np.asarray(users_count_on_registration, dtype=np.int64)
+    conditions = [
+        users <= 10000,
+        (10000 < users) & (users <= 100000),
+        (100000 < users) & (users <= 1000000),
+        (1000000 < users) & (users <= 10000000),
+        (10000000 < users) & (users <= 100000000),
+        (100000000 < users) & (users <= 1000000000),
+        users > 1000000000,
+    ]
+    return np.select(conditions, [10000, 1000, 250, 120, 60, 30, 10], default=0).astype(np.float64)
+
+
+class FleetState:
+    """
+    已索引的账户状态（每个字段都是长度为账户数的数组）
+    genesis_claimed: userGenesisClaimStatus
+    registration_users: getUsersCountOnRegistration
+    buffer: userBuffer（ether）
+    pending_buffer: 当前周期 userClaimStatus.buffer（ether），本周期领取时转入 userBuffer
+    claimed_current: 当前周期 userClaimStatus.claimStatus
+    referral_edges: (被推荐人下标, 推荐人下标, 层级) 三个数组，只包含双方都在账户列表中的推荐关系，层级从 0 开始
+    """
+
+    def __init__(self, addresses, genesis_claimed, registration_users, buffer, pending_buffer,
+                 claimed_current, referral_edges=None):
+        self.addresses = list(addresses)
+        self.genesis_claimed = np.asarray(genesis_claimed, dtype=bool)
+        self.registration_users = np.asarray(registration_users, dtype=np.int64)
+        self.buffer = np.asarray(buffer, dtype=np.float64)
+        self.pending_buffer = np.asarray(pending_buffer, dtype=np.float64)
+        self.claimed_current = np.asarray(claimed_current, dtype=bool)
+        if referral_edges is None:
+            referral_edges = ([], [], [])
+        self.referees, self.referrers, self.depths = (np.asarray(values, dtype=np.int64) for values in referral_edges)
+
+    def __len__(self):
+        return len(self.addresses)
+
+
+def load_state(path):
+    """
+    读取索引好的链上状态（JSON）
+    {"total_users": 整数, "user_growth": 每周期新增用户数（可选）,
+     "accounts": [{"address", "genesis_claimed", "registration_users_count", "buffer", "pending_buffer",
+                   "claimed_current", "referrers": [推荐人地址，按层级从近到远]}, ...]}
+    返回 (FleetState, total_users, user_growth)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    accounts = data['accounts']
+    index = {account['address'].lower(): i for i, account in enumerate(accounts)}
+    edges = ([], [], [])
+    for i, account in enumerate(accounts):
+        for depth, referrer in enumerate(account.get('referrers', [])[:MAX_REFERRAL_DEPTH]):
+            j = index.get(referrer.lower())
+            if j is not None:
+                edges[0].append(i)
+                edges[1].append(j)
+                edges[2].append(depth)
+    state = FleetState(
+        [account['address'] for account in accounts],
+        [account.get('genesis_claimed', False) for account in accounts],
+        [account.get('registration_users_count', 0) for account in accounts],
+        [float(account.get('buffer', 0)) for account in accounts],
+        [float(account.get('pending_buffer', 0)) for account in accounts],
+        [account.get('claimed_current', False) for account in accounts],
+        edges
+    )
+    return state, int(data['total_users']), int(data.get('user_growth', 0))
+
+
+def claim_value(state, total_users):
+    """
+    当前周期领取一次的预期收益（ether）：claimReward 的奖励 + 领取后 claimBuffer 可取出的 buffer
+    本周期已领取的账户只剩 userBuffer
+    """
+    reward = np.where(state.genesis_claimed, daily_reward(total_users), genesis_reward(state.registration_users))
+    reward = np.where(state.claimed_current, 0.0, reward)
+    pending = np.where(state.claimed_current, 0.0, state.pending_buffer)
+    return reward + pending + state.buffer
+
+
+def forecast(state, total_users, epochs=1, user_growth=0, claim_mask=None):
+    """
+    预测未来 epochs 个周期（第 0 个为当前周期）的收益
+    claim_mask: 形状 (账户数, epochs) 的布尔数组，表示每个账户在各周期是否领取，默认全部领取
+                （当前周期已领取的账户在第 0 个周期不会再次领取）
+    推荐 buffer 按合约逻辑：被推荐人领取 X 时第 d 层推荐人得到 X / 2^(d+1)，
+    推荐人在同一周期内领取才会计入其 userBuffer，否则留在当周期的记录中无法取出
+    返回 dict: genesis / daily / referral 为 (账户数, epochs) 的数组，buffer 为周期结束后可通过 claimBuffer 取出的总额
+    """
+    n = len(state)
+    if claim_mask is None:
+        claim_mask = np.ones((n, epochs), dtype=bool)
+    claim_mask = np.asarray(claim_mask, dtype=bool).copy()
+    claim_mask[:, 0] &= ~state.claimed_current
+
+    genesis = np.zeros((n, epochs))
+    daily = np.zeros((n, epochs))
+    referral = np.zeros((n, epochs))
+    genesis_done = state.genesis_claimed.copy()
+    genesis_amount = genesis_reward(state.registration_users)
+    shares = 0.5 ** (state.depths + 1)
+
+    for epoch in range(epochs):
+        claims = claim_mask[:, epoch]
+        first = claims & ~genesis_done
+        genesis[first, epoch] = genesis_amount[first]
+        daily[claims & genesis_done, epoch] = daily_reward(total_users + user_growth * epoch)
+        genesis_done |= claims
+
+        # 推荐人本周期领取（或当前周期已领取）时 buffer 才能进入 userBuffer
+        amount = genesis[:, epoch] + daily[:, epoch]
+        credited = (claims | state.claimed_current) if epoch == 0 else claims
+        inflow = np.zeros(n)
+        np.add.at(inflow, state.referrers, amount[state.referees] * shares * credited[state.referrers])
+        referral[:, epoch] = inflow
+
+    pending = np.where(claim_mask[:, 0], state.pending_buffer, 0.0)
+    return {
+        "genesis": genesis,
+        "daily": daily,
+        "referral": referral,
+        "buffer": state.buffer + pending + referral.sum(axis=1)
+    }
+
+
+if __name__ == "__main__":
+    # 用法: python humanity_rewards.py state.json --epochs 7 [--csv forecast.csv]
+    parser = argparse.ArgumentParser(description='Humanity 奖励离线预测')
+    parser.add_argument('state', help='索引好的链上状态 JSON 文件')
+    parser.add_argument('--epochs', type=int, default=1, help='预测的周期数（含当前周期），默认 1')
+    parser.add_argument('--csv', default=None, help='把每个账户的预测结果写入 CSV 文件')
+    parser.add_argument('--top', type=int, default=20, help='打印预期收益最高的前 N 个账户，默认 20')
+    args = parser.parse_args()
+
+    try:
+        state, total_users, user_growth = load_state(args.state)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"读取状态文件失败: {str(e)}")
+        sys.exit(1)
+
+    result = forecast(state, total_users, args.epochs, user_growth)
+    rewards = result["genesis"].sum(axis=1) + result["daily"].sum(axis=1)
+    total = rewards + result["buffer"]
+
+    print(f"账户数: {len(state)}，totalUsers: {total_users}，预测周期数: {args.epochs}")
+    print(f"当前每日奖励: {daily_reward(total_users):g}，未领取创世奖励的账户: {int((~state.genesis_claimed).sum())}")
+    print(f"合计: 奖励 {rewards.sum():.4f}，buffer {result['buffer'].sum():.4f}，总计 {total.sum():.4f}")
+    for i in np.argsort(-total)[:args.top]:
+        print(f"{state.addresses[i]}  奖励 {rewards[i]:.4f}  buffer {result['buffer'][i]:.4f}  总计 {total[i]:.4f}")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['address', 'genesis', 'daily', 'referral', 'buffer', 'total'])
+            for i, address in enumerate(state.addresses):
+                writer.writerow([address, result['genesis'][i].sum(), result['daily'][i].sum(),
+                                 result['referral'][i].sum(), result['buffer'][i], total[i]])
+        print(f"已写入 {args.csv}")
@@ -0,0 +1,134 @@
+import logging
+import math
+import threading
+import time
+
+from humanity_epoch import EPOCH_LENGTH
+
+log = logging.getLogger(__name__)
+
+# 按周期窗口分散领取
+# 周期切换后立即开始全部账户时，几千笔交易会在几分钟内集中发出，打满 RPC 限额，也会推高整个账户群自己的 gas 价格；
+# 这里把账户的开始时间均匀分散到周期开始（cycleStartTimestamp 推算的边界）后的前 N 小时，
+# 或者按指定的每分钟交易数匀速开始；交易从发送到上链的耗时变长（拥堵）时放慢开始节奏，
+# 但无论怎样放慢，都保证最后一个账户能在周期结束前（留出安全余量和预计的上链耗时）完成
+
+# 每个账户发送的交易数估计（claimReward + claimBuffer）
+TXS_PER_ACCOUNT = 2
+# 拥堵时最多放慢的倍数
+MAX_SLOWDOWN = 4.0
+# 上链耗时的指数移动平均系数
+LATENCY_ALPHA = 0.2
+
+
+class InclusionLatency:
+    """
+    交易上链耗时统计（从发送到拿到回执的秒数），所有线程共用
+    observe(seconds): 每笔交易拿到回执时调用
+    average: 指数移动平均，没有样本时为 None
+    baseline: 观察到的最小耗时，作为未拥堵时的参照
+    """
+
+    def __init__(self):
+        self.average = None
+        self.baseline = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            if self.average is None:
+                self.average = seconds
+            else:
+                self.average += LATENCY_ALPHA * (seconds - self.average)
+            self.baseline = seconds if self.baseline is None else min(self.baseline, seconds)
+
+    def slowdown(self):
+        """当前相对未拥堵时的放慢倍数（1 ~ MAX_SLOWDOWN）"""
+        with self._lock:
+            if not self.average or not self.baseline:
+                return 1.0
+            return min(max(self.average / self.baseline, 1.0), MAX_SLOWDOWN)
+
+
+LATENCY = InclusionLatency()
+
+
+class LoadSpreader:
+    """
+    把账户的开始时间分散到周期窗口内
+    epochs: 周期跟踪器，提供下一个周期边界
+    spread_hours: 周期开始后用于分散的小时数，None 表示不按窗口分散
+    tx_rate: 目标每分钟交易数，None 表示按窗口平均分配
+    margin: 周期结束前保留的安全余量（秒）
+    workers: 并发账户数，用于检查并发是否足以维持目标节奏
+    """
+
+    def __init__(self, epochs, spread_hours=None, tx_rate=None, margin=1800, workers=1, latency=LATENCY):
+        self.epochs = epochs
+        self.spread_hours = spread_hours
+        self.tx_rate = tx_rate
+        self.margin = margin
+        self.workers = workers
+        self.latency = latency
+
+    def _deadline(self):
+        """最后一个账户最晚的开始时间：周期结束 - 安全余量 - 预计处理一个账户的上链耗时"""
+        expected = TXS_PER_ACCOUNT * (self.latency.average or 0)
+        return self.epochs.next_boundary - self.margin - expected
+
+    def _interval(self, remaining, now):
+        """下一个账户与上一个账户开始时间的间隔（秒）"""
+        deadline = self._deadline()
+        if self.tx_rate:
+            interval = 60.0 * TXS_PER_ACCOUNT / self.tx_rate
+        else:
+            window_end = self.epochs.next_boundary - EPOCH_LENGTH + self.spread_hours * 3600
+            # 启动时已过窗口则按剩余时间分散
+            end = window_end if window_end > now else deadline
+            interval = max(min(end, deadline) - now, 0) / remaining
+        interval *= self.latency.slowdown()
+        # 无论目标节奏和拥堵情况如何，剩余账户都要在截止时间前开始
+        return min(interval, max(deadline - now, 0) / remaining)
+
+    def schedule(self, accounts):
+        """
+        按计划的开始时间依次产出账户（生成器，交给 run_concurrently 按需取用）
+        需要知道账户总数，账户列表会一次性展开
+        """
+        accounts = list(accounts)
+        self.epochs.current()
+        if self.epochs.next_boundary is None:
+            yield from accounts
+            return
+
+        warned = False
+        next_start = time.time()
+        for index, account in enumerate(accounts):
+            now = time.time()
+            if next_start > now:
+                time.sleep(next_start - now)
+                now = time.time()
+            remaining = len(accounts) - index
+            interval = self._interval(remaining, now)
+            if index == 0:
+                log.info(f"分散开始 {len(accounts)} 个账户：间隔 {interval:.1f} 秒"
+                         f"（约 {60 * TXS_PER_ACCOUNT / interval if interval else float('inf'):.0f} 笔交易/分钟），"
+                         f"距周期结束 {(self.epochs.next_boundary - now) / 3600:.1f} 小时")
+            if not warned and self.latency.average and interval > 0:
+                needed = math.ceil(TXS_PER_ACCOUNT * self.latency.average / interval)
+                if needed > self.workers:
+                    log.warning(f"上链耗时约 {self.latency.average:.0f} 秒，维持当前节奏需要约 {needed} 个并发，"
+                                f"当前 --workers {self.workers}，账户开始时间会晚于计划")
+                    warned = True
+            next_start = now + interval
+            yield account
+
+
+def add_spread_arguments(parser):
+    """向命令行解析器添加分散领取相关参数"""
+    parser.add_argument('--spread-hours', type=float, default=None,
+                        help='把账户的开始时间均匀分散到周期开始后的前 N 小时（已过窗口时按剩余时间分散）')
+    parser.add_argument('--spread-rate', type=float, default=None,
+                        help='目标每分钟交易数（每个账户按 2 笔估算），与 --spread-hours 同时指定时以此为准')
+    parser.add_argument('--spread-margin', type=float, default=1800,
+                        help='周期结束前保留的安全余量（秒），所有账户保证在此之前完成，默认 1800')
@@ -0,0 +1,45 @@
+import logging
+
+from humanity_epoch import EpochTracker
+from humanity_test_claimreward import (
+    ABI, CONTRACT_ADDRESS, check_buffer, check_claim_status, execute_transaction, setup_web3, verify_account
+)
+from common.task_runtime import register_chain, register_task
+
+log = logging.getLogger(__name__)
+
+# Humanity 任务注册
+# 把 claimReward / claimBuffer 注册到统一任务运行时，可以和 Berachain 的账户放在同一个调度器中执行；
+# 合约对象和周期跟踪器在链级共享，claimBuffer 依赖 claimReward 的结果
+
+CHAIN = 'humanity'
+
+
+def setup(w3):
+    """创建合约实例，读取一次当前周期（跨过周期边界时自动刷新）"""
+    contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=ABI)
+    epochs = EpochTracker(w3, contract)
+    epochs.refresh()
+    return {'contract': contract, 'epochs': epochs}
+
+
+register_chain(CHAIN, setup_web3, setup)
+
+
+@register_task(CHAIN, 'claimReward', outputs=['claimed'])
+def claim_reward_task(ctx, pacer):
+    if not verify_account(ctx.w3, ctx.account):
+        log.error(f"账户 {ctx.account['name']} 验证失败，跳过处理")
+        return False
+    if not check_claim_status(ctx.w3, ctx.account, ctx.shared['contract'], ctx.shared['epochs']):
+        log.info(f"账户 {ctx.account['name']} 当前无法领取奖励")
+        return False
+    return execute_transaction(ctx.w3, ctx.account, ctx.shared['contract'], 'claimReward', pacer)
+
+
+@register_task(CHAIN, 'claimBuffer', inputs=['claimed'])
+def claim_buffer_task(ctx, pacer):
+    if not check_buffer(ctx.w3, ctx.account, ctx.shared['contract']):
+        return True
+    log.info(f"账户 {ctx.account['name']} 检测到buffer，执行claimBuffer...")
+    return execute_transaction(ctx.w3, ctx.account, ctx.shared['contract'], 'claimBuffer', pacer)
@@ -2,11 +2,34 @@
 from web3 import Web3
 import yaml
 import time
-import random
-import json
 import os
 import argparse
 import sys
+import threading
+import logging
+
+import repo_path  # noqa: F401  仓库根目录加入模块搜索路径（共享包 common）
+from common.shard import add_shard_arguments, filter_shard, open_lease_store, lease_key, default_lease_scope
+from common.account_source import add_source_arguments, iter_accounts
+from common.pacing import StepPacer, add_pacing_arguments, run_concurrently
+from common.rate_limit import add_rate_limit_arguments, install_rate_limiter, print_limiter_stats, start_stats_reporter
+from common.ws_heads import add_ws_arguments, create_provider, start_head_watcher, wait_for_transaction_receipt
+from common.ws_heads import gas_price as current_gas_price
+from humanity_epoch import EpochTracker
+from common.tx_journal import add_journal_arguments, open_journal, reconcile, REJECTED
+from common.daemon import RunDaemon, add_daemon_arguments
+from common.rpc_cassette import add_cassette_arguments, configure_cassette, wrap_provider
+from common.broadcast import add_broadcast_arguments, configure_broadcast, record_inclusion, send_raw_transaction
+from common.quarantine import (KEY_MISMATCH, REVERTED, UNREGISTERED, add_quarantine_arguments, failure_fields,
+                               open_quarantine)
+from humanity_preflight import Preflight, UnregisteredCache, add_preflight_arguments
+from humanity_priority import ClaimScheduler, add_priority_arguments, within_time_budget
+from humanity_spread import LATENCY, LoadSpreader, add_spread_arguments
+from common.nonce import NONCES
+from common.tx_builder import assemble, sign
+from common.structured_log import ACCOUNT_DONE, add_logging_arguments, log_context, setup_logging
+
+log = logging.getLogger('humanity')
 
 # 固定配置
 RPC_URL = "https://rpc.testnet.humanity.org"
@@ -48,6 +71,20 @@ ABI = [
         "stateMutability": "view",
         "type": "function"
     },
+    {
+        "inputs": [],
+        "name": "cycleStartTimestamp",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [{"internalType": "address", "name": "user", "type": "address"}],
+        "name": "userGenesisClaimStatus",
+        "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
     {
         "inputs": [{"internalType": "address", "name": "", "type": "address"}],
         "name": "userBuffer",
@@ -64,40 +101,65 @@ ABI = [
     }
 ]
 
-def load_config(config_path):
-    """加载配置文件"""
+def load_accounts(args):
+    """
+    加载账户（生成器，按需逐条读取）
+    支持 YAML 配置、JSONL、CSV、编译后的 .acct 缓存以及 keystore 目录
+    """
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return iter_accounts(args.config, args.account_cache,
+                             args.keystore_password_file, args.keystore_agent)
     except FileNotFoundError:
-        print(f"错误: 找不到配置文件 '{config_path}'")
+        log.error(f"错误: 找不到配置文件 '{args.config}'")
         sys.exit(1)
     except yaml.YAMLError as e:
-        print(f"错误: 配置文件格式不正确 - {str(e)}")
+        log.error(f"错误: 配置文件格式不正确 - {str(e)}")
         sys.exit(1)
     except Exception as e:
-        print(f"错误: 读取配置文件时出错 - {str(e)}")
+        log.error(f"错误: 读取配置文件时出错 - {str(e)}")
         sys.exit(1)
 
 def parse_arguments():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description='Humanity测试网每日自动领取奖励脚本')
-    parser.add_argument('config', help='配置文件路径 (yaml格式)')
+    parser.add_argument('config', help='配置文件路径 (yaml / jsonl / csv / acct) 或 keystore 目录')
+    add_shard_arguments(parser)
+    add_source_arguments(parser)
+    add_pacing_arguments(parser, default_jitter='uniform:30:50')
+    add_rate_limit_arguments(parser)
+    add_ws_arguments(parser)
+    add_journal_arguments(parser, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tx_journal.jsonl'))
+    add_daemon_arguments(parser)
+    add_cassette_arguments(parser)
+    add_broadcast_arguments(parser)
+    add_quarantine_arguments(parser, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quarantine.json'))
+    add_preflight_arguments(parser)
+    add_priority_arguments(parser)
+    add_spread_arguments(parser)
+    add_logging_arguments(parser, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'humanity.jsonl'))
     return parser.parse_args()
 
-def setup_web3():
-    """初始化 Web3"""
-    w3 = Web3(Web3.HTTPProvider(RPC_URL))
+def setup_web3(read_rate=None, write_rate=None, ws_url=None, ws_transport=False):
+    """
+    初始化 Web3，并安装端点共享的 RPC 限流器
+    ws_url / ws_transport: 指定 WebSocket 地址且开启 ws_transport 时 RPC 请求改走 WebSocket
+    开启 --record-rpc / --replay-rpc 时 provider 被替换为录制 / 回放 provider
+    """
+    w3 = Web3(wrap_provider(create_provider(RPC_URL, ws_url, ws_transport)))
+    install_rate_limiter(w3, ws_url if ws_url and ws_transport else RPC_URL, read_rate, write_rate)
     return w3
 
-def check_claim_status(w3, account, contract):
-    """检查是否可以领取奖励"""
+def check_claim_status(w3, account, contract, epochs=None):
+    """
+    检查是否可以领取奖励
+    epochs: 周期跟踪器（可选），不传时每次向合约查询当前周期
+    """
     try:
         checksum_address = Web3.to_checksum_address(account['address'])
         
         # 获取当前周期
-        current_epoch = contract.functions.currentEpoch().call()
-        print(f"当前周期: {current_epoch}")
+        current_epoch = epochs.current() if epochs else contract.functions.currentEpoch().call()
+        log.debug(f"当前周期: {current_epoch}")
         
         # 获取用户在当前周期的领取状态
         claim_info = contract.functions.userClaimStatus(
@@ -111,15 +173,11 @@ def check_claim_status(w3, account, contract):
         buffer = claim_info[0]
         claim_status = not claim_info[1]  # 如果 claimStatus 为 False，表示可以领取
         
-        print(f"账户 {account['name']} 在当前周期的状态:")
-        print(f"- 领取状态: {'已领取' if not claim_status else '未领取'}")
-        print(f"- Buffer: {buffer}")
+        log.info(f"账户 {account['name']} 在当前周期的状态: {'已领取' if not claim_status else '未领取'}，Buffer: {buffer}")
         
         return claim_status
     except Exception as e:
-        print(f"检查领取状态失败：{str(e)}")
-        if hasattr(e, 'args'):
-            print(f"错误详情: {e.args}")
+        log.error(f"检查领取状态失败：{str(e)}", extra=failure_fields(e))
         return False
 
 def check_buffer(w3, account, contract):
@@ -129,7 +187,7 @@ def check_buffer(w3, account, contract):
         buffer = contract.functions.userBuffer(checksum_address).call()
         return buffer > 0
     except Exception as e:
-        print(f"检查buffer失败：{str(e)}")
+        log.error(f"检查buffer失败：{str(e)}", extra=failure_fields(e))
         return False
 
 def verify_account(w3, account):
@@ -143,166 +201,297 @@ def verify_account(w3, account):
         provided_address = Web3.to_checksum_address(account['address'])
         
         if expected_address.lower() != provided_address.lower():
-            print(f"地址验证失败:")
-            print(f"配置文件中的地址: {provided_address}")
-            print(f"私钥对应的地址: {expected_address}")
+            log.error(f"地址验证失败: 配置文件中的地址 {provided_address}，私钥对应的地址 {expected_address}",
+                      extra=failure_fields(reason=KEY_MISMATCH))
             return False
             
         return True
     except Exception as e:
-        print(f"地址验证出错: {str(e)}")
+        log.error(f"地址验证出错: {str(e)}", extra=failure_fields(reason=KEY_MISMATCH))
         return False
 
-def execute_transaction(w3, account, contract, func_name):
-    """执行合约交易"""
+def execute_transaction(w3, account, contract, func_name, pacer=None, journal=None):
+    """
+    执行合约交易
+    pacer: 节奏器（可选），发送前等待上一笔交易的确认数和抖动窗口，期间交易已构建并签名
+    journal: 交易日志（可选），广播前记录已签名的交易，拿到回执后记录结果
+    成功返回交易回执，失败返回 False
+    """
     try:
         # 首先验证账户
         if not verify_account(w3, account):
-            print("账户验证失败，终止交易")
+            log.error("账户验证失败，终止交易")
             return False
             
         # 使用私钥对应的地址
         acct = w3.eth.account.from_key(account['private_key'])
         checksum_address = acct.address
-        print(f"使用地址: {checksum_address}")
-        
-        # 获取合约函数
-        contract_function = getattr(contract.functions, func_name)
+        log.debug(f"使用地址: {checksum_address}")
         
         # 获取当前 gas 价格，设置最小值
-        gas_price = int(w3.eth.gas_price * 1.2)
-        print(f"当前 gas 价格: {w3.from_wei(gas_price, 'gwei')} gwei")
+        gas_price = int(current_gas_price(w3) * 1.2)
+        log.debug(f"当前 gas 价格: {w3.from_wei(gas_price, 'gwei')} gwei")
         
         max_attempts = 3  # 最大重试次数
+        nonce = None
         for attempt in range(max_attempts):
             try:
-                # 获取当前 nonce
-                nonce = w3.eth.get_transaction_count(checksum_address)
+                # nonce 在本地分配（首次从链上读取），超时重试时沿用同一 nonce，以更高的 gas 价格替换原交易
+                if nonce is None:
+                    nonce = NONCES.allocate(w3, checksum_address)
                 
-                # 构建交易
-                transaction = contract_function().build_transaction({
-                    'from': checksum_address,
-                    'nonce': nonce,
-                    'gas': 300000,
-                    'gasPrice': gas_price
-                })
-
-                # 签名交易
-                signed_txn = w3.eth.account.sign_transaction(
-                    transaction,
-                    account['private_key']
-                )
+                # 在本地组装并签名交易，不发送 RPC 请求
+                transaction = dict(assemble(w3, contract, func_name, [], gas=300000, gas_price=gas_price), nonce=nonce)
+                signed_txn = sign(account, transaction)
 
                 try:
                     # 发送交易
-                    tx_hash = w3.eth.send_raw_transaction(signed_txn.rawTransaction)
-                    print(f"交易已发送，哈希: {tx_hash.hex()}")
+                    if pacer:
+                        pacer.wait()
+                    if journal:
+                        journal.record(checksum_address, nonce, signed_txn.hash, signed_txn.rawTransaction, func_name)
+                    tx_hash = send_raw_transaction(w3, signed_txn.rawTransaction, signed_txn.hash)
+                    sent_at = time.monotonic()
+                    log.info(f"交易已发送，哈希: {tx_hash.hex()}", extra={"tx_hash": tx_hash.hex()})
                 except Exception as send_error:
                     if "already known" in str(send_error):
-                        print("交易已在交易池中，等待确认...")
+                        log.info("交易已在交易池中，等待确认...")
                         # 从错误信息中提取交易哈希
                         tx_hash = signed_txn.hash
+                        sent_at = None
                     else:
+                        if journal:
+                            journal.finish(signed_txn.hash, REJECTED)
                         raise send_error
                 
                 # 等待交易确认，增加超时时间和检查间隔
-                receipt = w3.eth.wait_for_transaction_receipt(
+                receipt = wait_for_transaction_receipt(
+                    w3,
                     tx_hash,
                     timeout=120,  # 5分钟超时
                     poll_latency=10  # 每10秒检查一次
                 )
+                record_inclusion(receipt)
+                if journal:
+                    journal.finish_receipt(receipt)
+                if sent_at is not None:
+                    # 上链耗时用于分散领取时判断拥堵
+                    LATENCY.observe(time.monotonic() - sent_at)
                 
                 if receipt['status'] == 1:
-                    print(f"账户 {account['name']} {func_name} 调用成功！交易哈希: {tx_hash.hex()}")
-                    print(f"Gas 使用: {receipt['gasUsed']}")
-                    return True
+                    log.info(f"账户 {account['name']} {func_name} 调用成功！交易哈希: {tx_hash.hex()}，Gas 使用: {receipt['gasUsed']}",
+                             extra={"tx_hash": tx_hash.hex()})
+                    return receipt
                 else:
-                    print(f"账户 {account['name']} {func_name} 调用失败！")
+                    log.error(f"账户 {account['name']} {func_name} 调用失败！",
+                              extra={"tx_hash": tx_hash.hex(), **failure_fields(reason=REVERTED)})
                     return False
                     
             except Exception as e:
                 if "already known" in str(e):
-                    print("交易已在交易池中，等待30秒后继续...")
+                    log.warning("交易已在交易池中，等待30秒后继续...")
                     time.sleep(5)
                     continue
                 elif "not in the chain after" in str(e):
                     if attempt < max_attempts - 1:
                         # 增加 gas 价格 20%
                         gas_price = int(gas_price * 1.2)
-                        print(f"交易超时，增加 gas 价格到 {w3.from_wei(gas_price, 'gwei')} gwei")
-                        print(f"等待 5  秒后重试... (尝试 {attempt + 2}/{max_attempts})")
+                        log.warning(f"交易超时，增加 gas 价格到 {w3.from_wei(gas_price, 'gwei')} gwei，"
+                                    f"等待 5  秒后重试... (尝试 {attempt + 2}/{max_attempts})")
                         time.sleep(5)
                         continue
-                print(f"账户 {account['name']} {func_name} 调用失败：{str(e)}")
+                log.error(f"账户 {account['name']} {func_name} 调用失败：{str(e)}", extra=failure_fields(e))
+                # 交易可能没有被节点接受，下次从链上重新同步 nonce
+                NONCES.resync(checksum_address)
                 return False
             
     except Exception as e:
         error_msg = str(e)
         if "contract not active" in error_msg:
-            print(f"账户 {account['name']} {func_name} 调用失败：合约当前未激活")
+            log.error(f"账户 {account['name']} {func_name} 调用失败：合约当前未激活", extra=failure_fields(reason=REVERTED))
         elif "user not registered" in error_msg:
-            print(f"账户 {account['name']} {func_name} 调用失败：用户未在 VC 合约中注册")
+            log.error(f"账户 {account['name']} {func_name} 调用失败：用户未在 VC 合约中注册",
+                      extra=failure_fields(reason=UNREGISTERED))
         elif "no rewards available" in error_msg:
-            print(f"账户 {account['name']} {func_name} 调用失败：当前没有可领取的奖励")
+            log.error(f"账户 {account['name']} {func_name} 调用失败：当前没有可领取的奖励", extra=failure_fields(reason=REVERTED))
         else:
-            print(f"账户 {account['name']} {func_name} 调用失败：{error_msg}")
+            log.error(f"账户 {account['name']} {func_name} 调用失败：{error_msg}", extra=failure_fields(e))
         return False
 
-def process_account(w3, account, contract):
-    """处理单个账户的所有操作"""
-    print(f"\n开始处理账户 {account['name']}...")
+def process_account(w3, account, contract, pacer=None, epochs=None, journal=None):
+    """
+    处理单个账户的所有操作
+    pacer: 节奏器（可选），claimBuffer 只等待 claimReward 达到确认数，抖动窗口只加在账户之间
+    epochs: 周期跟踪器（可选），所有账户共用，避免每个账户查询当前周期
+    journal: 交易日志（可选）
+    """
+    log.info(f"开始处理账户 {account['name']}...")
     
     # 首先验证账户
     if not verify_account(w3, account):
-        print(f"账户 {account['name']} 验证失败，跳过处理")
+        log.error(f"账户 {account['name']} 验证失败，跳过处理")
         return False
     
     # 检查是否可以领取奖励
-    if not check_claim_status(w3, account, contract):
-        print(f"账户 {account['name']} 当前无法领取奖励")
+    if not check_claim_status(w3, account, contract, epochs):
+        log.info(f"账户 {account['name']} 当前无法领取奖励")
         return False
     
     # 执行 claimReward
-    success = execute_transaction(w3, account, contract, 'claimReward')
+    with log_context(step='claimReward'):
+        receipt = execute_transaction(w3, account, contract, 'claimReward', pacer, journal)
+    claimed = bool(receipt)
+    if receipt and pacer:
+        # 同一账户内 claimBuffer 只等待 claimReward 达到确认数，不加抖动
+        pacer.record(receipt, jitter=False)
     
     # 如果 claimReward 成功，检查并执行 claimBuffer
-    if success and check_buffer(w3, account, contract):
-        print(f"账户 {account['name']} 检测到buffer，执行claimBuffer...")
-        success = execute_transaction(w3, account, contract, 'claimBuffer')
+    if receipt and check_buffer(w3, account, contract):
+        log.info(f"账户 {account['name']} 检测到buffer，执行claimBuffer...")
+        with log_context(step='claimBuffer'):
+            receipt = execute_transaction(w3, account, contract, 'claimBuffer', pacer, journal)
     
-    return success
+    if claimed and pacer:
+        # 抖动只加在账户之间：下一个账户发送前等待抖动窗口，不必等待本账户交易的确认数
+        pacer.record()
+    
+    return bool(receipt)
 
 def main():
     # 解析命令行参数
     args = parse_arguments()
     
-    # 加载配置
-    config = load_config(args.config)
+    # 日志由后台线程写出，工作线程不会阻塞在控制台 / 文件输出上
+    setup_logging(args.log_file, args.log_level, args.console)
+    
+    # 分散领取需要先展开全部账户来计算间隔，截止时间由周期结束保证，不能再叠加时间预算
+    if args.time_budget is not None and (args.spread_hours is not None or args.spread_rate is not None):
+        log.error("--time-budget 不能与 --spread-hours / --spread-rate 同时使用")
+        return
+    
+    # 加载账户（按需读取，不会一次性载入全部账户）
+    accounts = load_accounts(args)
     
-    # 设置 Web3
-    w3 = setup_web3()
+    # RPC 录制 / 回放（可选），离线回归测试和基准测试使用
+    configure_cassette(args)
+    
+    # 多节点广播（可选），已签名的交易同时提交给主节点和 --broadcast-rpc 指定的节点
+    configure_broadcast(args)
+    
+    # 设置 Web3（所有线程共享同一个端点限流器）
+    w3 = setup_web3(args.rpc_read_rate, args.rpc_write_rate, args.ws_url, args.ws_transport)
     
     # 检查连接
     if not w3.is_connected():
-        print("无法连接到区块链网络！")
+        log.error("无法连接到区块链网络！")
         return
+    start_stats_reporter(args.rate_stats_interval)
 
     # 创建合约实例
     contract = w3.eth.contract(address=CONTRACT_ADDRESS, abi=ABI)
 
-    # 遍历所有账户
-    for i, account in enumerate(config['accounts']):
-        success = process_account(w3, account, contract)
-        
-        # 如果不是最后一个账户，根据调用结果决定等待时间
-        if i < len(config['accounts']) - 1:
-            if success:
-                delay = random.randint(30, 50)
-                print(f"调用成功，等待 {delay} 秒后继续...")
-            else:
-                delay = random.randint(3, 5)
-                print(f"调用失败，等待 {delay} 秒后继续...")
-            time.sleep(delay)
+    # 周期跟踪：启动时读取一次当前周期，跨过周期边界时自动刷新；
+    # 订阅了新区块时由新区块时间判断周期切换，回执查询和 gas 价格也由新区块驱动
+    epochs = EpochTracker(w3, contract)
+    epochs.refresh()
+    watcher = start_head_watcher(args.ws_url)
+    if watcher:
+        watcher.on_head(epochs.on_head)
+
+    # 交易预写日志（可选）：先核对上次崩溃时未完成的交易，已上链的领取不会重复发送
+    journal = open_journal(args.tx_journal)
+    if journal:
+        reconcile(w3, journal)
+
+    # 租约存储（可选），保证多个进程/机器不会同时领取同一账户
+    lease_store = open_lease_store(args.lease_db, args.lease_dir, args.lease_ttl)
+
+    # 失败隔离（默认开启）：反复失败的账户按指数退避跳过，不占用预检、调度和领取的时间
+    quarantine = open_quarantine(args)
+
+    # 预检：合约激活状态每轮检查一次，未注册的地址批量查询并持久化缓存
+    preflight = Preflight(w3, contract, UnregisteredCache(args.unregistered_cache, args.unregistered_ttl),
+                          args.vc_contract)
+
+    def run_accounts(accounts, progress=None):
+        """执行一轮：领取属于当前分片的所有账户；progress 为常驻模式下的进度记录"""
+        # 每轮重新计算租约作用域，常驻模式下跨天后使用新的日期
+        lease_scope = args.lease_scope or default_lease_scope()
+
+        # 每个工作线程一个节奏器：同一线程内相邻两个账户的交易之间保持随机抖动，
+        # 抖动期间下一个账户照常检查状态、构建并签名交易，其他线程不受影响
+        local = threading.local()
+
+        def process(account):
+            # 本线程内的日志记录都带上账户字段
+            with log_context(account=account['address']):
+                claim(account)
+
+        def claim(account):
+            key = lease_key(lease_scope, account['address'])
+            if progress:
+                progress.start(account['name'])
+            if lease_store and not lease_store.acquire(key):
+                log.info(f"账户 {account['name']} 已被其他进程处理，跳过")
+                if progress:
+                    progress.finish(account['name'], None)
+                return
+
+            if not hasattr(local, 'pacer'):
+                local.pacer = StepPacer(w3, args.confirmations, args.jitter)
+            success = False
+            started = time.monotonic()
+            if quarantine:
+                quarantine.watch(account['address'])
+            try:
+                success = process_account(w3, account, contract, local.pacer, epochs, journal)
+            finally:
+                if lease_store:
+                    lease_store.release(key, done=success)
+                if quarantine:
+                    quarantine.record(account['address'], success)
+                if progress:
+                    progress.finish(account['name'], success)
+            log.info(f"账户 {account['name']} 处理结束：{'成功' if success else '未领取'}",
+                     extra={"event": ACCOUNT_DONE, "success": success,
+                            "duration": round(time.monotonic() - started, 3)})
+
+        if not preflight.contract_active():
+            log.warning("合约当前未激活，本轮跳过全部账户")
+            return
+
+        # 遍历属于当前分片、未被隔离且已注册的账户；开启 --prioritize 时按本周期预期收益从高到低处理
+        selected = filter_shard(accounts, args.shard)
+        if quarantine:
+            selected = quarantine.filter(selected)
+        selected = preflight.filter_registered(selected)
+        if args.prioritize:
+            selected = ClaimScheduler(preflight, contract, epochs, args.time_budget).schedule(selected)
+        elif args.time_budget is not None:
+            selected = within_time_budget(selected, args.time_budget)
+        # 开始时间分散到周期窗口内（--spread-hours / --spread-rate），保证周期结束前完成
+        if args.spread_hours is not None or args.spread_rate is not None:
+            selected = LoadSpreader(epochs, args.spread_hours, args.spread_rate, args.spread_margin,
+                                    args.workers).schedule(selected)
+        run_concurrently(selected, process, args.workers)
+        if quarantine:
+            quarantine.report()
+        if progress:
+            print_limiter_stats()
+
+    try:
+        if args.daemon:
+            # 常驻模式：连接、合约对象、账户列表等保持在内存中，由控制 socket 触发每一轮领取
+            def reload_accounts():
+                return iter_accounts(args.config, args.account_cache,
+                                     args.keystore_password_file, args.keystore_agent)
+            RunDaemon(reload_accounts, run_accounts, accounts).serve(args.daemon)
+        else:
+            run_accounts(accounts)
+    finally:
+        if lease_store:
+            lease_store.close()
+        print_limiter_stats()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 共享模块位于仓库根目录的 common 包中：直接运行本目录下的脚本时，sys.path 里只有脚本所在目录，
+# 入口脚本在导入 common 之前先导入本模块，把仓库根目录加入模块搜索路径
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
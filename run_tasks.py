@@ -0,0 +1,69 @@
+import argparse
+import logging
+import os
+import sys
+
+from common.account_source import add_source_arguments, iter_accounts
+from common.pacing import add_pacing_arguments
+from common.rate_limit import add_rate_limit_arguments, print_limiter_stats
+from common.rpc_cassette import add_cassette_arguments, configure_cassette
+from common.shard import add_shard_arguments, default_lease_scope, filter_shard, open_lease_store
+from common.structured_log import add_logging_arguments, setup_logging
+from common.task_runtime import CHAIN_MODULES, ChainRuntime, Scheduler, chain_tasks, load_chain
+
+log = logging.getLogger('run_tasks')
+
+# 多链统一任务运行器
+# 入口单独成脚本：common.task_runtime 作为普通模块导入，各链任务模块注册到的是同一份注册表
+# （直接运行 task_runtime.py 时，__main__ 和任务模块导入的 task_runtime 是两个不同的模块对象）；
+# 交易预写日志、多节点广播和失败隔离是各链入口脚本的功能，这里不使用，租约按链区分
+
+
+def parse_chain_argument(value):
+    """解析 --chain 参数: 链名=账户文件"""
+    name, sep, path = value.partition('=')
+    if not sep or not name or not path:
+        raise argparse.ArgumentTypeError("格式应为 链名=账户文件，例如 humanity=accounts.jsonl")
+    return name, path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多链统一任务运行器')
+    parser.add_argument('--chain', dest='chains', type=parse_chain_argument, action='append', required=True,
+                        metavar='NAME=CONFIG', help=f'要执行的链及其账户文件，可重复指定；可选的链: {", ".join(CHAIN_MODULES)}')
+    add_shard_arguments(parser)
+    add_source_arguments(parser)
+    add_pacing_arguments(parser, default_jitter='uniform:5:10')
+    add_rate_limit_arguments(parser)
+    add_cassette_arguments(parser)
+    add_logging_arguments(parser, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'tasks.jsonl'))
+    args = parser.parse_args()
+
+    setup_logging(args.log_file, args.log_level, args.console)
+    configure_cassette(args)
+
+    lease_store = open_lease_store(args.lease_db, args.lease_dir, args.lease_ttl)
+    scheduler = Scheduler(args.workers, args.confirmations, args.jitter,
+                          lease_store, args.lease_scope or default_lease_scope())
+    for name, config in args.chains:
+        try:
+            runtime = ChainRuntime(load_chain(name), args.rpc_read_rate, args.rpc_write_rate)
+            accounts = iter_accounts(config, args.account_cache, args.keystore_password_file, args.keystore_agent)
+        except Exception as e:
+            log.error(f"初始化 {name} 失败: {str(e)}")
+            sys.exit(1)
+        log.info(f"{name}: {', '.join(task.name for task in chain_tasks(name))}")
+        scheduler.add(runtime, filter_shard(accounts, args.shard))
+
+    try:
+        succeeded, failed = scheduler.run()
+    finally:
+        if lease_store:
+            lease_store.close()
+    print_limiter_stats()
+    log.info(f"全部完成：成功 {succeeded} 个账户，失败 {failed} 个账户，已被其他进程处理 {scheduler.skipped} 个账户")
+
+
+if __name__ == "__main__":
+    # 用法: python run_tasks.py --chain berachain=berachain/config.yaml --chain humanity=humanity/accounts.jsonl --workers 8
+    main()